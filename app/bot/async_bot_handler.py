@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Handler Assíncrono do Bot
+Mesmo fluxo do BotHandler, com extração, envio e cotação como corrotinas
+"""
+
+import asyncio
+import logging
+from typing import Dict
+
+from app.bot.swissre_automation import SwissReAutomation
+from app.utils.circuit_breaker import swissre_breaker
+from .bot_handler import BotHandler
+from .quotation_backlog import quotation_backlog
+from .conversation_flow import conversation_flow, ConversationState
+from .data_extractor import data_extractor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBotHandler(BotHandler):
+    """
+    Versão asyncio do BotHandler
+
+    A lógica de fluxo (plano de extração, merge, estados, resultado da
+    cotação) é a mesma do BotHandler; só o I/O muda:
+    - OpenAI via AsyncOpenAI
+    - UltraMsg via cliente assíncrono (ultramsg_api com métodos async)
+    - SwissRe em thread (a automação usa requests síncrono)
+    - Store de sessões, lock do telefone e gravação das mensagens em thread
+      (asyncio.to_thread): são síncronos (SQLite, pymongo, threading.Lock)
+    """
+
+    # Event loop do servidor (cotações adiadas voltam para ele)
+    _loop = None
+
+    async def process_message_async(self, phone: str, message: str, message_type: str = "text",
+                                    degraded: bool = False) -> Dict:
+        """
+        Processa mensagem recebida do usuário
+        """
+        self._loop = asyncio.get_running_loop()
+        try:
+            current_state = await asyncio.to_thread(self._start_processing, phone, message, message_type)
+
+            if current_state == ConversationState.ATENDENTE_ATIVO:
+                return self._agent_active_result()
+
+            for attempt in range(self.EXTRACTION_RETRIES + 1):
+                plan = await asyncio.to_thread(self._plan_extraction, phone, message)
+
+                extracted_data = {}
+                if plan["extract"]:
+                    extracted_data = await data_extractor.extract_data_async(
+                        message, plan["existing_data"], allow_ai=not degraded
+                    )
+
+                # Lock do telefone e gravação em thread: o event loop segue atendendo
+                result = await asyncio.to_thread(self._apply_if_current, phone, message, plan,
+                                                 extracted_data, attempt == self.EXTRACTION_RETRIES)
+                if result is not None:
+                    break
+            next_state, response = result
+
+            if next_state == ConversationState.COTACAO_PROCESSANDO:
+                data = await asyncio.to_thread(conversation_flow.get_conversation_data, phone)
+                return await self._process_quotation_async(phone, data, response)
+
+            await self._send_response_async(phone, response)
+            await asyncio.to_thread(self._save_bot_message, phone, response)
+
+            return await asyncio.to_thread(self._success_result, phone, next_state, response, extracted_data)
+
+        except Exception as e:
+            logger.error(f"Erro ao processar mensagem: {str(e)}", exc_info=True)
+            error_response = self._error_response()
+            await self._send_response_async(phone, error_response)
+            return self._error_result(e, error_response)
+
+    async def _process_quotation_async(self, phone: str, data: Dict, initial_response: str) -> Dict:
+        """
+        Processa a cotação sem bloquear o event loop
+        """
+        try:
+            if self.swissre_automation and not swissre_breaker.available:
+                return await self._defer_quotation_async(phone, data)
+
+            await self._send_response_async(phone, initial_response)
+            await asyncio.to_thread(self._save_bot_message, phone, initial_response)
+
+            return await self._run_quotation_async(phone, data)
+
+        except Exception as e:
+            logger.error(f"Erro ao processar cotação: {str(e)}", exc_info=True)
+            error_message = self._quotation_error_response()
+            await self._send_response_async(phone, error_message)
+            return self._quotation_error_result(e, error_message)
+
+    async def _run_quotation_async(self, phone: str, data: Dict, notify_deferral: bool = True) -> Dict:
+        result = None
+        if self.swissre_automation:
+            logger.info(f"Iniciando automação SwissRe para {phone}")
+            result = await asyncio.to_thread(SwissReAutomation.generate_quotation_pdf, data)
+
+            if result.get('unavailable'):
+                return await self._defer_quotation_async(phone, data, notify_deferral)
+
+        actions, outcome = await asyncio.to_thread(self._quotation_outcome, phone, data, result)
+
+        for kind, *args in actions:
+            if kind == "document":
+                await self.ultramsg_api.send_document(phone, *args)
+            else:
+                await self._send_response_async(phone, *args)
+
+        return outcome
+
+    async def _defer_quotation_async(self, phone: str, data: Dict, notify: bool = True) -> Dict:
+        quotation_backlog.add(phone, data, self._run_deferred_quotation)
+
+        message = self._deferred_quotation_response()
+        if notify:
+            await self._send_response_async(phone, message)
+            await asyncio.to_thread(self._save_bot_message, phone, message)
+
+        return self._deferred_quotation_result(message)
+
+    def _run_deferred_quotation(self, phone: str, data: Dict):
+        """Chamado pela thread do quotation_backlog: executa no event loop"""
+        if conversation_flow.get_conversation_state(phone) != ConversationState.COTACAO_PROCESSANDO:
+            logger.info(f"Cotação adiada de {phone} descartada (conversa mudou de estado)")
+            return
+
+        asyncio.run_coroutine_threadsafe(
+            self._run_quotation_async(phone, data, notify_deferral=False), self._loop
+        ).result()
+
+    async def _send_response_async(self, phone: str, message: str):
+        """Envia resposta via UltraMsg (assíncrono)"""
+        try:
+            if self.ultramsg_api:
+                await self.ultramsg_api.send_message(phone, message)
+                logger.info(f"Resposta enviada para {phone}")
+            else:
+                logger.warning(f"UltraMsg API não disponível, mensagem não enviada: {message[:50]}")
+        except Exception as e:
+            logger.error(f"Erro ao enviar resposta: {str(e)}")
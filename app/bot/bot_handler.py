@@ -5,12 +5,17 @@ Integra o fluxo de conversação com extração de dados e processamento
 """
 
 import logging
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 from app.bot.swissre_automation import SwissReAutomation
+from app.utils.circuit_breaker import swissre_breaker
+from app.utils.metrics import metrics
+from app.utils.striped_lock import session_locks
 from .conversation_flow import conversation_flow, ConversationState
-from .data_extractor import data_extractor, is_update_intent
+from .quotation_backlog import quotation_backlog
+from .data_extractor import data_extractor
+from .intent_classifier import CONTROL_WORDS, intent_classifier
 from parser_validacao import normaliza_e_valida
 
 logger = logging.getLogger(__name__)
@@ -21,92 +26,189 @@ class BotHandler:
     Handler principal que coordena todo o fluxo do bot
     """
 
+    # Mensagens de controle (menu/confirmação): não passam pela extração
+    CONTROL_MESSAGES = CONTROL_WORDS
+
+    # Extrações refeitas quando a sessão muda durante a chamada à IA
+    EXTRACTION_RETRIES = 2
+
+    # Estados em que mensagens seguidas podem ser agrupadas em uma só extração
+    COALESCE_STATES = frozenset([
+        ConversationState.COTACAO_INICIO,
+        ConversationState.COTACAO_COLETANDO
+    ])
+
     def __init__(self, db_manager=None, ultramsg_api=None, swissre_automation=None):
         self.db_manager = db_manager
         self.ultramsg_api = ultramsg_api
         self.swissre_automation = swissre_automation
         logger.info("BotHandler inicializado")
 
-    def process_message(self, phone: str, message: str, message_type: str = "text") -> Dict:
+    def process_message(self, phone: str, message: str, message_type: str = "text",
+                        degraded: bool = False) -> Dict:
         """
         Processa mensagem recebida do usuário
+
+        Com degraded=True (sistema sobrecarregado) a extração usa só regex
         """
         try:
-            logger.info(f"Processando mensagem de {phone}: {message[:50]}...")
-
-            # Salvar mensagem recebida no banco (se disponível)
-            if self.db_manager:
-                self.db_manager.save_message(
-                    phone=phone,
-                    sender="user",
-                    message=message,
-                    message_type=message_type,
-                    timestamp=datetime.now()
-                )
-
-            # Obter estado atual da conversa
-            current_state = conversation_flow.get_conversation_state(phone)
-            logger.info(f"Estado atual: {current_state.value}")
-
+            current_state = self._start_processing(phone, message, message_type)
 
             # Verificar se conversa está com atendente
             if current_state == ConversationState.ATENDENTE_ATIVO:
-                logger.info(f"Conversa com atendente ativo, não processar pelo bot")
-                return {
-                    "status": "agent_active",
-                    "message": "Conversa sendo atendida por humano",
-                    "should_reply": False
-                }
+                return self._agent_active_result()
 
             # Processar mensagem com extração de dados
-            return self._process_with_data_extraction(phone, message, current_state)
+            return self._process_with_data_extraction(phone, message, current_state, degraded)
 
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {str(e)}", exc_info=True)
-            error_response = (
-                "Desculpe, ocorreu um erro ao processar sua mensagem.\n\n"
-                "Por favor, tente novamente ou digite 'atendente' para falar com um humano."
-            )
+            error_response = self._error_response()
             self._send_response(phone, error_response)
-            return {
-                "status": "error",
-                "message": str(e),
-                "should_reply": True,
-                "response": error_response
-            }
+            return self._error_result(e, error_response)
+
+    def can_coalesce(self, phone: str, message: str) -> bool:
+        """
+        Indica se a mensagem pode esperar na janela de agrupamento
+        (apenas durante a coleta de dados e nunca para mensagens de controle)
+        """
+        if intent_classifier.classify(message).control:
+            return False
+        return conversation_flow.get_conversation_state(phone) in self.COALESCE_STATES
+
+    def _start_processing(self, phone: str, message: str, message_type: str) -> ConversationState:
+        """Salva a mensagem recebida e retorna o estado atual da conversa"""
+        logger.info(f"Processando mensagem de {phone}: {message[:50]}...")
+
+        # Salvar mensagem recebida no banco (se disponível)
+        if self.db_manager:
+            self.db_manager.save_message(
+                phone=phone,
+                sender="user",
+                message=message,
+                message_type=message_type,
+                timestamp=datetime.now()
+            )
+
+        # Obter estado atual da conversa
+        current_state = conversation_flow.get_conversation_state(phone)
+        logger.info(f"Estado atual: {current_state.value}")
+
+        if current_state == ConversationState.ATENDENTE_ATIVO:
+            logger.info(f"Conversa com atendente ativo, não processar pelo bot")
+
+        return current_state
 
     def _process_with_data_extraction(
         self,
         phone: str,
         message: str,
-        current_state: ConversationState
+        current_state: ConversationState,
+        degraded: bool = False
     ) -> Dict:
         """
         Processa mensagem com extração de dados
+
+        A extração (chamada à IA) roda fora do lock do telefone; a mescla e a
+        gravação rodam sob o lock e só se a sessão não mudou desde a leitura
+        """
+        for attempt in range(self.EXTRACTION_RETRIES + 1):
+            plan = self._plan_extraction(phone, message)
+
+            extracted_data = {}
+            if plan["extract"]:
+                extracted_data = data_extractor.extract_data(
+                    message, plan["existing_data"], allow_ai=not degraded
+                )
+
+            result = self._apply_if_current(phone, message, plan, extracted_data,
+                                            last_attempt=attempt == self.EXTRACTION_RETRIES)
+            if result is not None:
+                break
+        next_state, response = result
+
+        # Verificar se precisa processar cotação
+        if next_state == ConversationState.COTACAO_PROCESSANDO:
+            return self._process_quotation(phone, conversation_flow.get_conversation_data(phone), response)
+
+        # Enviar resposta
+        self._send_response(phone, response)
+
+        # Salvar resposta no banco
+        self._save_bot_message(phone, response)
+
+        return self._success_result(phone, next_state, response, extracted_data)
+
+    def _plan_extraction(self, phone: str, message: str) -> Dict:
         """
-        # Extrair dados da mensagem (apenas em estados de cotação)
+        Decide se a mensagem passa pela extração de dados (sem fazer I/O)
+        """
+        # Versão antes dos dados: se mudar até a gravação, _apply_if_current percebe
+        version = conversation_flow.get_conversation_version(phone)
+
         # Dados atuais
         existing_data = conversation_flow.get_conversation_data(phone)
 
-        # 🔥 Detecta se é edição
-        is_update = is_update_intent(message)
-
+        # Uma passada só: a mesma classificação é reaproveitada pelo ConversationFlow
+        intents = intent_classifier.classify(message)
 
-        message_lower = message.lower().strip()
+        # 🔥 Detecta se é edição
+        is_update = intents.update
 
         # 🔥 NÃO EXTRAI DADOS SE FOR CONTROLE
-        is_control = message_lower in ['0', '1', '2', '3', 'sim', 'nao', 'não']
+        is_control = intents.control
 
         current_state = conversation_flow.get_conversation_state(phone)
 
-        if current_state == ConversationState.COTACAO_EDITANDO:
-            extracted_data = {}
-        else:
-            if is_control:
-                extracted_data = {}
-            else:
-                extracted_data = data_extractor.extract_data(message, existing_data)
+        return {
+            "version": version,
+            "existing_data": existing_data,
+            "is_update": is_update,
+            "is_control": is_control,
+            "current_state": current_state,
+            "extract": current_state != ConversationState.COTACAO_EDITANDO and not is_control
+        }
 
+    def _apply_if_current(
+        self,
+        phone: str,
+        message: str,
+        plan: Dict,
+        extracted_data: Dict,
+        last_attempt: bool = False
+    ) -> Optional[Tuple[ConversationState, str]]:
+        """
+        Mescla e grava sob o lock do telefone, conferindo a versão da sessão
+
+        Se outra mensagem do mesmo telefone gravou depois da leitura, os dados
+        lidos estão velhos: retorna None para refazer a extração. Sem
+        extração a refazer (ou na última tentativa) relê os dados sob o lock
+        e mescla o que já foi extraído.
+
+        Returns:
+            (próximo estado, resposta) ou None para tentar de novo
+        """
+        with session_locks.hold(phone):
+            if conversation_flow.get_conversation_version(phone) != plan["version"]:
+                metrics.incr("sessions.stale_extractions")
+                if plan["extract"] and not last_attempt:
+                    return None
+                plan = self._plan_extraction(phone, message)
+            return self._apply_extraction(phone, message, plan, extracted_data)
+
+    def _apply_extraction(
+        self,
+        phone: str,
+        message: str,
+        plan: Dict,
+        extracted_data: Dict
+    ) -> Tuple[ConversationState, str]:
+        """
+        Mescla os dados extraídos e avança o fluxo da conversa
+        """
+        existing_data = plan["existing_data"]
+        is_update = plan["is_update"]
+        current_state = plan["current_state"]
 
         # 🔥 MERGE CONTROLADO
         merged_data = existing_data.copy() if existing_data else {}
@@ -129,12 +231,11 @@ class BotHandler:
                     if key not in merged_data or not merged_data.get(key):
                         merged_data[key] = value
 
-
         # Normaliza
         dados_normalizados, faltantes = normaliza_e_valida(merged_data)
 
         # 🚀 AGORA SIM chama o flow
-        data_to_flow = {} if (current_state == ConversationState.COTACAO_EDITANDO or is_control) else merged_data
+        data_to_flow = {} if (current_state == ConversationState.COTACAO_EDITANDO or plan["is_control"]) else merged_data
 
         logger.info(f"Estado antes do flow: {current_state.value}")
         logger.info(f"Dados existentes: {existing_data}")
@@ -147,203 +248,199 @@ class BotHandler:
             data_to_flow
         )
 
-        # Verificar se precisa processar cotação
-        if next_state == ConversationState.COTACAO_PROCESSANDO:
-            return self._process_quotation(phone, conversation_flow.get_conversation_data(phone), response)
-
-        if alteracoes:
+        if alteracoes and next_state != ConversationState.COTACAO_PROCESSANDO:
             texto_alteracoes = "\n".join(
                 [f"🔄 Atualizado {a}" for a in alteracoes]
             )
 
             response = texto_alteracoes + "\n\n" + response
 
-        # Enviar resposta
-        self._send_response(phone, response)
-
-        # Salvar resposta no banco
-        if self.db_manager:
-            self.db_manager.save_message(
-                phone=phone,
-                sender="bot",
-                message=response,
-                message_type="text",
-                timestamp=datetime.now()
-            )
-
-        return {
-            "status": "success",
-            "state": next_state.value,
-            "response": response,
-            "extracted_data": extracted_data,
-            "missing_fields": conversation_flow.get_missing_fields(phone),
-            "should_reply": True
-        }
+        return next_state, response
 
     def _process_quotation(self, phone: str, data: Dict, initial_response: str) -> Dict:
         """
         Processa a cotação usando automação SwissRe
         """
         try:
+            # SwissRe fora do ar: registra a cotação e avisa o cliente
+            if self.swissre_automation and not swissre_breaker.available:
+                return self._defer_quotation(phone, data)
+
             # Enviar mensagem inicial de processamento
             self._send_response(phone, initial_response)
+            self._save_bot_message(phone, initial_response)
 
-            if self.db_manager:
-                self.db_manager.save_message(
-                    phone=phone,
-                    sender="bot",
-                    message=initial_response,
-                    message_type="text",
-                    timestamp=datetime.now()
-                )
+            return self._run_quotation(phone, data)
+
+        except Exception as e:
+            logger.error(f"Erro ao processar cotação: {str(e)}", exc_info=True)
+            error_message = self._quotation_error_response()
+            self._send_response(phone, error_message)
+            return self._quotation_error_result(e, error_message)
+
+    def _run_quotation(self, phone: str, data: Dict, notify_deferral: bool = True) -> Dict:
+        """
+        Executa a automação SwissRe e envia o resultado
+        """
+        # Executar automação SwissRe (se disponível)
+        result = None
+        if self.swissre_automation:
+            logger.info(f"Iniciando automação SwissRe para {phone}")
+            result = SwissReAutomation.generate_quotation_pdf(data)
 
-            # Executar automação SwissRe (se disponível)
-            if self.swissre_automation:
-                logger.info(f"Iniciando automação SwissRe para {phone}")
-
-                result = SwissReAutomation.generate_quotation_pdf(data)
-
-                if result.get('success'):
-                    pdf_path = result.get('pdf_path')
-                    cotacao_id = result.get('quotation_number')
-
-                    if self.db_manager and pdf_path:
-                        self.db_manager.save_quotation_pdf(
-                            phone=phone,
-                            cotacao_id=cotacao_id,
-                            pdf_path=pdf_path,
-                            data=data
-                        )
-
-                    try:
-                        self.db_manager.save_quotation(
-                            phone=phone,
-                            client_data=data,
-                            pdf_path=pdf_path,
-                            status='completed',
-                            completed_by='bot'
-                        )
-                        logger.info(f"Cotação {cotacao_id} registrada na collection quotations")
-                    except Exception as e:
-                        logger.error(f"Erro ao salvar cotação no portal: {str(e)}")
-
-                    # Enviar PDF via WhatsApp
-                    if self.ultramsg_api and pdf_path:
-                        caption = f"Sua cotação {cotacao_id} foi gerada com sucesso!"
-                        self.ultramsg_api.send_document(phone, pdf_path, caption)
-
-                    success_message = (
-                        f"*Cotação #{cotacao_id} concluída com sucesso!*\n\n"
-                        f"O documento PDF foi enviado acima.\n\n"
-                        f"*Deseja mais alguma informação?*\n\n"
-                        f"Digite:\n"
-                        f"*1* - Fazer nova cotação\n"
-                        f"*2* - Falar com atendente\n"
-                        f"*3* - Encerrar atendimento"
-                    )
-
-                    conversation_flow.set_conversation_state(phone, ConversationState.COTACAO_CONCLUIDA)
-                    self._send_response(phone, success_message)
-
-                    if self.db_manager:
-                        self.db_manager.save_message(
-                            phone=phone,
-                            sender="bot",
-                            message=success_message,
-                            message_type="text",
-                            timestamp=datetime.now()
-                        )
-
-                        conversation_flow.add_cotacao_realizada(phone, {
-                            'cotacao_id': cotacao_id,
-                            'data': data,
-                            'pdf_path': pdf_path,
-                            'timestamp': datetime.now().isoformat()
-                        })
-
-                    return {
-                        "status": "quotation_success",
-                        "state": ConversationState.COTACAO_CONCLUIDA.value,
-                        "cotacao_id": cotacao_id,
-                        "pdf_path": pdf_path,
-                        "response": success_message,
-                        "should_reply": True
-                    }
+            if result.get('unavailable'):
+                return self._defer_quotation(phone, data, notify_deferral)
 
-                else:
-                    error_msg = result.get('error', 'Erro desconhecido')
-                    failure_message = (
-                        f"*Não foi possível processar sua cotação.*\n\n"
-                        f"Motivo: {error_msg}\n\n"
-                        f"Por favor, tente novamente ou fale com um atendente.\n\n"
-                        f"Digite:\n"
-                        f"*1* - Tentar novamente\n"
-                        f"*2* - Falar com atendente"
-                    )
-
-                    conversation_flow.set_conversation_state(phone, ConversationState.COTACAO_COLETANDO)
-                    self._send_response(phone, failure_message)
-
-                    if self.db_manager:
-                        self.db_manager.save_message(
-                            phone=phone,
-                            sender="bot",
-                            message=failure_message,
-                            message_type="text",
-                            timestamp=datetime.now()
-                        )
-
-                    return {
-                        "status": "quotation_failed",
-                        "state": ConversationState.COTACAO_COLETANDO.value,
-                        "error": error_msg,
-                        "response": failure_message,
-                        "should_reply": True
-                    }
+        actions, outcome = self._quotation_outcome(phone, data, result)
 
+        for kind, *args in actions:
+            if kind == "document":
+                # Enviar PDF via WhatsApp
+                self.ultramsg_api.send_document(phone, *args)
             else:
-                # SwissRe não disponível, simular sucesso
-                logger.warning("SwissRe automation não disponível, simulando sucesso")
-
-                success_message = (
-                    f"*Cotação simulada com sucesso!*\n\n"
-                    f"Em produção, o PDF seria gerado aqui.\n\n"
-                    f"*Deseja mais alguma informação?*\n\n"
-                    f"Digite:\n"
-                    f"*1* - Fazer nova cotação\n"
-                    f"*2* - Falar com atendente\n"
-                    f"*3* - Encerrar atendimento"
-                )
+                self._send_response(phone, *args)
+
+        return outcome
+
+    def _defer_quotation(self, phone: str, data: Dict, notify: bool = True) -> Dict:
+        """
+        Modo degradado da SwissRe: a cotação fica pendente e é refeita
+        (com envio do PDF) quando o circuito voltar a aceitar chamadas
+        """
+        quotation_backlog.add(phone, data, self._run_deferred_quotation)
+
+        message = self._deferred_quotation_response()
+        if notify:
+            self._send_response(phone, message)
+            self._save_bot_message(phone, message)
 
-                conversation_flow.set_conversation_state(phone, ConversationState.COTACAO_CONCLUIDA)
-                self._send_response(phone, success_message)
+        return self._deferred_quotation_result(message)
 
-                return {
-                    "status": "quotation_simulated",
-                    "state": ConversationState.COTACAO_CONCLUIDA.value,
-                    "response": success_message,
-                    "should_reply": True
-                }
+    def _run_deferred_quotation(self, phone: str, data: Dict):
+        """Executa uma cotação adiada (chamado pelo quotation_backlog)"""
+        if conversation_flow.get_conversation_state(phone) != ConversationState.COTACAO_PROCESSANDO:
+            logger.info(f"Cotação adiada de {phone} descartada (conversa mudou de estado)")
+            return
 
+        try:
+            self._run_quotation(phone, data, notify_deferral=False)
         except Exception as e:
-            logger.error(f"Erro ao processar cotação: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao processar cotação adiada: {str(e)}", exc_info=True)
+            self._send_response(phone, self._quotation_error_response())
+
+    def _quotation_outcome(self, phone: str, data: Dict, result: Optional[Dict]) -> Tuple[List[tuple], Dict]:
+        """
+        Aplica o resultado da automação SwissRe (estado e registros)
 
-            error_message = (
-                f"*Erro ao processar cotação*\n\n"
-                f"Desculpe, ocorreu um erro inesperado.\n\n"
-                f"Um atendente irá entrar em contato com você em breve.\n\n"
-                f"Digite 'atendente' para falar com um humano agora."
+        Returns:
+            Tuple com as mensagens a enviar, em ordem (("document", pdf, legenda)
+            ou ("text", mensagem)), e o resultado do processamento
+        """
+        if result is None:
+            # SwissRe não disponível, simular sucesso
+            logger.warning("SwissRe automation não disponível, simulando sucesso")
+
+            success_message = (
+                f"*Cotação simulada com sucesso!*\n\n"
+                f"Em produção, o PDF seria gerado aqui.\n\n"
+                f"*Deseja mais alguma informação?*\n\n"
+                f"Digite:\n"
+                f"*1* - Fazer nova cotação\n"
+                f"*2* - Falar com atendente\n"
+                f"*3* - Encerrar atendimento"
             )
 
-            self._send_response(phone, error_message)
+            conversation_flow.set_conversation_state(phone, ConversationState.COTACAO_CONCLUIDA)
 
-            return {
-                "status": "quotation_error",
-                "error": str(e),
-                "response": error_message,
+            return [("text", success_message)], {
+                "status": "quotation_simulated",
+                "state": ConversationState.COTACAO_CONCLUIDA.value,
+                "response": success_message,
                 "should_reply": True
             }
 
+        if result.get('success'):
+            pdf_path = result.get('pdf_path')
+            cotacao_id = result.get('quotation_number')
+            actions = []
+
+            if self.db_manager and pdf_path:
+                self.db_manager.save_quotation_pdf(
+                    phone=phone,
+                    cotacao_id=cotacao_id,
+                    pdf_path=pdf_path,
+                    data=data
+                )
+
+            try:
+                self.db_manager.save_quotation(
+                    phone=phone,
+                    client_data=data,
+                    pdf_path=pdf_path,
+                    status='completed',
+                    completed_by='bot'
+                )
+                logger.info(f"Cotação {cotacao_id} registrada na collection quotations")
+            except Exception as e:
+                logger.error(f"Erro ao salvar cotação no portal: {str(e)}")
+
+            if self.ultramsg_api and pdf_path:
+                caption = f"Sua cotação {cotacao_id} foi gerada com sucesso!"
+                actions.append(("document", pdf_path, caption))
+
+            success_message = (
+                f"*Cotação #{cotacao_id} concluída com sucesso!*\n\n"
+                f"O documento PDF foi enviado acima.\n\n"
+                f"*Deseja mais alguma informação?*\n\n"
+                f"Digite:\n"
+                f"*1* - Fazer nova cotação\n"
+                f"*2* - Falar com atendente\n"
+                f"*3* - Encerrar atendimento"
+            )
+
+            conversation_flow.set_conversation_state(phone, ConversationState.COTACAO_CONCLUIDA)
+            actions.append(("text", success_message))
+
+            if self.db_manager:
+                self._save_bot_message(phone, success_message)
+
+                conversation_flow.add_cotacao_realizada(phone, {
+                    'cotacao_id': cotacao_id,
+                    'data': data,
+                    'pdf_path': pdf_path,
+                    'timestamp': datetime.now().isoformat()
+                })
+
+            return actions, {
+                "status": "quotation_success",
+                "state": ConversationState.COTACAO_CONCLUIDA.value,
+                "cotacao_id": cotacao_id,
+                "pdf_path": pdf_path,
+                "response": success_message,
+                "should_reply": True
+            }
+
+        error_msg = result.get('error', 'Erro desconhecido')
+        failure_message = (
+            f"*Não foi possível processar sua cotação.*\n\n"
+            f"Motivo: {error_msg}\n\n"
+            f"Por favor, tente novamente ou fale com um atendente.\n\n"
+            f"Digite:\n"
+            f"*1* - Tentar novamente\n"
+            f"*2* - Falar com atendente"
+        )
+
+        conversation_flow.set_conversation_state(phone, ConversationState.COTACAO_COLETANDO)
+        self._save_bot_message(phone, failure_message)
+
+        return [("text", failure_message)], {
+            "status": "quotation_failed",
+            "state": ConversationState.COTACAO_COLETANDO.value,
+            "error": error_msg,
+            "response": failure_message,
+            "should_reply": True
+        }
+
     def _send_response(self, phone: str, message: str):
         """Envia resposta via UltraMsg"""
         try:
@@ -355,6 +452,91 @@ class BotHandler:
         except Exception as e:
             logger.error(f"Erro ao enviar resposta: {str(e)}")
 
+    def _save_bot_message(self, phone: str, message: str):
+        """Salva resposta do bot no banco (se disponível)"""
+        if self.db_manager:
+            self.db_manager.save_message(
+                phone=phone,
+                sender="bot",
+                message=message,
+                message_type="text",
+                timestamp=datetime.now()
+            )
+
+    # =========================================================================
+    # RESULTADOS
+    # =========================================================================
+
+    def _success_result(self, phone: str, next_state: ConversationState,
+                        response: str, extracted_data: Dict) -> Dict:
+        return {
+            "status": "success",
+            "state": next_state.value,
+            "response": response,
+            "extracted_data": extracted_data,
+            "missing_fields": conversation_flow.get_missing_fields(phone),
+            "should_reply": True
+        }
+
+    @staticmethod
+    def _agent_active_result() -> Dict:
+        return {
+            "status": "agent_active",
+            "message": "Conversa sendo atendida por humano",
+            "should_reply": False
+        }
+
+    @staticmethod
+    def _error_response() -> str:
+        return (
+            "Desculpe, ocorreu um erro ao processar sua mensagem.\n\n"
+            "Por favor, tente novamente ou digite 'atendente' para falar com um humano."
+        )
+
+    @staticmethod
+    def _error_result(error: Exception, error_response: str) -> Dict:
+        return {
+            "status": "error",
+            "message": str(error),
+            "should_reply": True,
+            "response": error_response
+        }
+
+    @staticmethod
+    def _deferred_quotation_response() -> str:
+        return (
+            "*Recebemos seus dados!*\n\n"
+            "O sistema da seguradora está instável no momento. "
+            "Sua cotação foi registrada e enviaremos o PDF aqui assim que estiver pronto."
+        )
+
+    @staticmethod
+    def _deferred_quotation_result(message: str) -> Dict:
+        return {
+            "status": "quotation_deferred",
+            "state": ConversationState.COTACAO_PROCESSANDO.value,
+            "response": message,
+            "should_reply": True
+        }
+
+    @staticmethod
+    def _quotation_error_response() -> str:
+        return (
+            f"*Erro ao processar cotação*\n\n"
+            f"Desculpe, ocorreu um erro inesperado.\n\n"
+            f"Um atendente irá entrar em contato com você em breve.\n\n"
+            f"Digite 'atendente' para falar com um humano agora."
+        )
+
+    @staticmethod
+    def _quotation_error_result(error: Exception, error_message: str) -> Dict:
+        return {
+            "status": "quotation_error",
+            "error": str(error),
+            "response": error_message,
+            "should_reply": True
+        }
+
     def handle_agent_takeover(self, phone: str, agent_id: str):
         """Marca conversa como assumida por atendente humano"""
         conversation_flow.set_conversation_state(phone, ConversationState.ATENDENTE_ATIVO)
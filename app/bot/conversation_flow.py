@@ -6,32 +6,24 @@ Baseado no novo roteiro de atendimento Equinos Seguros
 """
 import os
 import json
+import time
 import logging
-from enum import Enum
-from typing import Dict, List, Optional, Tuple
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 from app.bot.data_extractor import data_extractor
-from app.bot.faq_knowledge import FAQ_TOPICS, find_topic_by_message
+from app.bot.faq_knowledge import FAQ_TOPICS
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.conversation_machine import Intent, ROUTES
+from app.bot.intent_classifier import MessageIntents, intent_classifier
+from app.bot.session_store import SessionStore, VersionConflict, create_session_store, SESSION_STORE
+from app.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-
-class ConversationState(Enum):
-    """Estados possíveis da conversa"""
-    INITIAL = "initial"
-    MENU_PRINCIPAL = "menu_principal"
-    FAQ_RESPOSTA = "faq_resposta"
-    COTACAO_INICIO = "cotacao_inicio"
-    COTACAO_COLETANDO = "cotacao_coletando"
-    COTACAO_VALIDANDO = "cotacao_validando"
-    COTACAO_PROCESSANDO = "cotacao_processando"
-    COTACAO_CONCLUIDA = "cotacao_concluida"
-    POS_COTACAO = "pos_cotacao"
-    AGUARDANDO_ATENDENTE = "aguardando_atendente"
-    ATENDENTE_ATIVO = "atendente_ativo"
-    ENCERRADA = "encerrada"
-    COTACAO_EDITANDO = "cotacao_editando"
+# Intervalo da limpeza de sessões inativas (segundos, 0 desativa)
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
 
 
 class MessageTemplate:
@@ -195,93 +187,206 @@ class ConversationFlow:
     CONVERSATION_TIMEOUT = timedelta(minutes=10)
     AGENT_TIMEOUT = timedelta(hours=24)
 
-    def __init__(self, ultramsg_api=None):
-        self.conversations = {}
+    # Estados que esperam alguém de fora (atendente, SwissRe): expiram por AGENT_TIMEOUT
+    LONG_LIVED_STATES = (
+        ConversationState.AGUARDANDO_ATENDENTE,
+        ConversationState.ATENDENTE_ATIVO,
+        ConversationState.COTACAO_PROCESSANDO,
+    )
+
+    # Com timers ativos, a limpeza periódica espera além do prazo para não
+    # remover antes do disparo (ex: ATENDENTE_ATIVO precisa ser liberado)
+    TIMER_SWEEP_GRACE = timedelta(minutes=5)
+
+    # Tentativas de gravação quando outro worker alterou a sessão no meio
+    MAX_SAVE_RETRIES = 5
+
+    def __init__(self, ultramsg_api=None, store: Optional[SessionStore] = None):
+        self.sessions = store if store is not None else create_session_store(SESSION_STORE)
         self.ultramsg_api = ultramsg_api
+        self.hibernator = None
+        self.timers = None
+        self.journal = None
+        self._sweeper = None
+
+    def use_store(self, store: SessionStore):
+        """Troca o backend das sessões (ex: MongoDB depois de conectar)"""
+        self.sessions = store
+        logger.info(f"Sessões de conversa no backend '{store.name}'")
+
+    def use_timers(self, timers):
+        """Cada gravação de sessão passa a reagendar os prazos da conversa (ConversationTimers)"""
+        self.timers = timers
+
+    def use_journal(self, journal):
+        """Reconstrói as sessões pelo diário e passa a anexar cada mudança a ele"""
+        if journal.attach(self.sessions):
+            self.journal = journal
+            logger.info(f"Diário de sessões em {journal.path}")
+
+    def use_hibernator(self, hibernator):
+        """Sessões ociosas do backend em memória passam a ir para o disco na limpeza periódica"""
+        if hibernator.attach(self.sessions):
+            self.hibernator = hibernator
+            logger.info(f"Sessões ociosas há {hibernator.idle_after:.0f}s hibernadas em disco")
+
+    def expire_idle_sessions(self) -> int:
+        """
+        Remove sessões inativas há mais que CONVERSATION_TIMEOUT
+        (AGENT_TIMEOUT nos estados com atendente ou cotação em andamento)
+
+        O telefone volta como conversa nova na próxima mensagem, e o
+        histórico de cotações da sessão sai da memória junto. Com
+        hibernação, as sessões ociosas que ainda não expiraram vão para o
+        disco e as hibernadas expiram pelos mesmos limites.
+        """
+        now = datetime.now()
+        if self.timers:
+            # Os timers resetam/liberam no prazo; a limpeza só remove o que sobrar
+            now -= self.TIMER_SWEEP_GRACE
+        default_before = (now - self.CONVERSATION_TIMEOUT).timestamp()
+        before_by_state = {state.value: (now - self.AGENT_TIMEOUT).timestamp() for state in self.LONG_LIVED_STATES}
+        removed = self.sessions.purge_idle(default_before, before_by_state)
+
+        hibernator = self.hibernator
+        if hibernator and hibernator.store is self.sessions:
+            removed += hibernator.purge_idle(default_before, before_by_state)
+            hibernator.hibernate_idle()
+
+        if removed:
+            metrics.incr("sessions.expired", removed)
+            logger.info(f"{removed} sessões inativas removidas")
+        self.sessions.publish_gauges()
+        return removed
+
+    def start_sweeper(self, interval: float = SESSION_SWEEP_INTERVAL):
+        """Inicia a limpeza periódica das sessões inativas (idempotente)"""
+        if interval <= 0 or (self._sweeper and self._sweeper.is_alive()):
+            return
+        self._sweeper = threading.Thread(
+            target=self._sweep_forever, args=(interval,), name="session-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def _sweep_forever(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.expire_idle_sessions()
+            except Exception as e:
+                logger.error(f"Erro ao limpar sessões inativas: {str(e)}")
+
+    def _get_session(self, phone: str) -> Optional[ConversationSession]:
+        return self.sessions.load(phone)[0]
+
+    def _update_session(self, phone: str, mutate: Callable[[ConversationSession], None],
+                        create: bool = True) -> Optional[ConversationSession]:
+        """
+        Lê, altera e grava a sessão com versão otimista
+
+        Em conflito (outro worker gravou antes) relê e reaplica `mutate`.
+
+        Args:
+            mutate: Função que altera a sessão recebida (in-place)
+            create: Cria a sessão se ainda não existir
+
+        Returns:
+            Sessão gravada (None se não existia e create=False)
+        """
+        for _ in range(self.MAX_SAVE_RETRIES):
+            session, version = self.sessions.load(phone)
+            if session is None:
+                if not create:
+                    return None
+                session = ConversationSession()
+            mutate(session)
+            # Com diário, o store registra a mudança dentro da própria gravação
+            if self.sessions.save(phone, session, version):
+                if self.timers:
+                    self.timers.on_session_saved(phone, session)
+                return session
+            metrics.incr("sessions.version_conflicts")
+        raise VersionConflict(phone)
 
     def is_conversation_expired(self, phone: str) -> bool:
         """
         Verifica se a conversa ficou inativa por mais tempo que o permitido.
         Não atualiza last_interaction aqui.
         """
-        if phone not in self.conversations:
+        conv = self._get_session(phone)
+        if conv is None:
             return False
 
-        conv = self.conversations[phone]
-        last_interaction = conv.get("last_interaction")
-
-        if not last_interaction:
+        if not conv.last_interaction:
             return False
 
-        time_diff = datetime.now() - last_interaction
+        time_diff = time.time() - conv.last_interaction
 
-        return time_diff > self.CONVERSATION_TIMEOUT
+        return time_diff > self.CONVERSATION_TIMEOUT.total_seconds()
 
     def get_conversation_state(self, phone: str) -> ConversationState:
-        if phone not in self.conversations:
+        conv = self._get_session(phone)
+        if conv is None:
             return ConversationState.INITIAL
 
-        return self.conversations[phone].get(
-            "state",
-            ConversationState.INITIAL
-        )
+        return conv.state
 
     def set_conversation_state(self, phone: str, state: ConversationState):
-        if phone not in self.conversations:
-            self.conversations[phone] = {
-                'state': state,
-                'data': {},
-                'created_at': datetime.now(),
-                'last_interaction': datetime.now(),
-                'message_count': 0,
-                'cotacoes_realizadas': []
-            }
-        else:
-            self.conversations[phone]['state'] = state
-            self.conversations[phone]['last_interaction'] = datetime.now()
+        def mutate(conv):
+            conv.state = state
+            conv.touch()
+
+        self._update_session(phone, mutate)
 
     def update_conversation_data(self, phone: str, data: Dict):
-        if phone not in self.conversations:
-            self.conversations[phone] = {
-                'state': ConversationState.INITIAL,
-                'data': {},
-                'created_at': datetime.now(),
-                'last_interaction': datetime.now(),
-                'message_count': 0,
-                'cotacoes_realizadas': []
-            }
-
-        for k, v in data.items():
-            if v and str(v).strip() and str(v).lower() != "none":
-                self.conversations[phone]['data'][k] = v
-
-        self.conversations[phone]['last_interaction'] = datetime.now()
-        self.conversations[phone]['message_count'] += 1
+        def mutate(conv):
+            for k, v in data.items():
+                if v and str(v).strip() and str(v).lower() != "none":
+                    conv.data[k] = v
+
+            conv.touch()
+            conv.message_count += 1
+
+        self._update_session(phone, mutate)
+
+    def apply_field_edit(self, phone: str, campo: str, valor: str):
+        """Grava o novo valor do campo em edição e volta para a validação (uma única gravação)"""
+        def mutate(conv):
+            conv.data[campo] = valor
+            conv.campo_edicao = None
+            conv.state = ConversationState.COTACAO_VALIDANDO
+            conv.touch()
+
+        self._update_session(phone, mutate)
 
     def get_conversation_data(self, phone: str) -> Dict:
-        if phone not in self.conversations:
+        conv = self._get_session(phone)
+        if conv is None:
             return {}
-        return self.conversations[phone]['data']
+        return conv.data.to_dict()
+
+    def get_conversation_version(self, phone: str) -> int:
+        """Versão da sessão no store (muda a cada gravação; 0 se não existe)"""
+        return self.sessions.load(phone)[1]
+
+    def touch_conversation(self, phone: str):
+        """Atualiza last_interaction (sem criar a sessão)"""
+        def mutate(conv):
+            conv.touch()
+
+        self._update_session(phone, mutate, create=False)
 
     def reset_conversation(self, phone: str):
-        if phone in self.conversations:
-            cotacoes = self.conversations[phone].get('cotacoes_realizadas', [])
-            self.conversations[phone] = {
-                'state': ConversationState.INITIAL,
-                'data': {},
-                'created_at': datetime.now(),
-                'last_interaction': datetime.now(),
-                'message_count': 0,
-                'cotacoes_realizadas': cotacoes
-            }
+        self._update_session(phone, ConversationSession.reset, create=False)
 
     def add_cotacao_realizada(self, phone: str, cotacao_data: Dict):
-        if phone not in self.conversations:
-            return
-        if 'cotacoes_realizadas' not in self.conversations[phone]:
-            self.conversations[phone]['cotacoes_realizadas'] = []
         cotacao_data['timestamp'] = datetime.now().isoformat()
-        self.conversations[phone]['cotacoes_realizadas'].append(cotacao_data)
+
+        self._update_session(phone, lambda conv: conv.add_cotacao(cotacao_data), create=False)
+
+    def get_cotacoes_realizadas(self, phone: str) -> List[Dict]:
+        conv = self._get_session(phone)
+        return list(conv.cotacoes_realizadas or []) if conv else []
 
     def get_missing_fields(self, phone: str) -> List[str]:
         data = self.get_conversation_data(phone)
@@ -356,161 +461,45 @@ class ConversationFlow:
         current_state = self.get_conversation_state(phone)
         message_lower = message.lower().strip()
 
-        if phone in self.conversations:
-            self.conversations[phone]["last_interaction"] = datetime.now()
-
-        # 1. Validação tem prioridade
-        if current_state == ConversationState.COTACAO_VALIDANDO:
-            return self._process_cotacao_validando(phone, message_lower)
-
-        # 2. Edição tem prioridade
-        if current_state == ConversationState.COTACAO_EDITANDO:
-            return self._process_cotacao_editando(phone, message)
-
-        # 3. Atendente tem prioridade
-        if self._is_handoff_request(message_lower):
-            self.set_conversation_state(phone, ConversationState.AGUARDANDO_ATENDENTE)
-            return ConversationState.AGUARDANDO_ATENDENTE, MessageTemplate.get_template(
-                ConversationState.AGUARDANDO_ATENDENTE
-            )
-
-        # 4. Menu / voltar
-        if message_lower in ['menu', 'voltar', '0'] and current_state not in [
-            ConversationState.INITIAL,
-            ConversationState.COTACAO_COLETANDO,
-            ConversationState.COTACAO_VALIDANDO,
-            ConversationState.COTACAO_PROCESSANDO
-        ]:
-            self.set_conversation_state(phone, ConversationState.MENU_PRINCIPAL)
-            return ConversationState.MENU_PRINCIPAL, MessageTemplate.get_template(
-                ConversationState.INITIAL
-            )
-
-        # 5. FAQ por palavra-chave ANTES do extracted_data
-        estados_permitidos_faq = [
-            ConversationState.INITIAL,
-            ConversationState.MENU_PRINCIPAL,
-            ConversationState.FAQ_RESPOSTA,
-            ConversationState.COTACAO_INICIO,
-            ConversationState.COTACAO_COLETANDO,
-            ConversationState.COTACAO_CONCLUIDA,
-            ConversationState.POS_COTACAO,
-        ]
-
-        if current_state in estados_permitidos_faq:
-            faq = find_topic_by_message(message)
-
-            if faq:
-                faq_texto = f"*{faq['titulo']}*\n\n{faq['resumo']}"
-
-                self.set_conversation_state(phone, ConversationState.FAQ_RESPOSTA)
-
-                return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
-                    ConversationState.FAQ_RESPOSTA,
-                    faq_texto=faq_texto
-                )
-
-        # 6. Só depois trata dados de cotação
-        if extracted_data:
-            campos_cotacao = set(self.REQUIRED_FIELDS.keys())
-
-            tem_dado_cotacao = any(
-                k in campos_cotacao and extracted_data.get(k)
-                for k in extracted_data.keys()
-            )
-
-            if tem_dado_cotacao:
-                self.update_conversation_data(phone, extracted_data)
-
-                if current_state in [
-                    ConversationState.INITIAL,
-                    ConversationState.MENU_PRINCIPAL,
-                    ConversationState.COTACAO_INICIO,
-                    ConversationState.COTACAO_COLETANDO,
-                    ConversationState.COTACAO_VALIDANDO
-                ]:
-                    if self.is_data_complete(phone):
-                        self.set_conversation_state(phone, ConversationState.COTACAO_VALIDANDO)
-                        return ConversationState.COTACAO_VALIDANDO, MessageTemplate.format_template(
-                            ConversationState.COTACAO_VALIDANDO,
-                            resumo_completo=self.format_complete_summary(phone)
-                        )
-
-                    self.set_conversation_state(phone, ConversationState.COTACAO_COLETANDO)
-                    return ConversationState.COTACAO_COLETANDO, MessageTemplate.format_template(
-                        ConversationState.COTACAO_COLETANDO,
-                        dados_coletados=self.format_collected_data(phone),
-                        dados_faltantes=self.format_missing_data(phone)
-                    )
-
-        # Verificar se usuário quer falar com atendente
-        if self._is_handoff_request(message_lower):
-            self.set_conversation_state(phone, ConversationState.AGUARDANDO_ATENDENTE)
-            return ConversationState.AGUARDANDO_ATENDENTE, MessageTemplate.get_template(
-                ConversationState.AGUARDANDO_ATENDENTE
-            )
-
-        # Verificar se quer voltar ao menu
-        if message_lower in ['menu', 'voltar', '0'] and current_state not in [
-            ConversationState.INITIAL,
-            ConversationState.COTACAO_COLETANDO,
-            ConversationState.COTACAO_VALIDANDO,
-            ConversationState.COTACAO_PROCESSANDO
-        ]:
-            self.set_conversation_state(phone, ConversationState.MENU_PRINCIPAL)
-            return ConversationState.MENU_PRINCIPAL, MessageTemplate.get_template(
-                ConversationState.INITIAL
-            )
-
-        # Processar baseado no estado atual
-        if current_state == ConversationState.INITIAL:
-            return self._process_initial(phone, message_lower)
-
-        elif current_state == ConversationState.MENU_PRINCIPAL:
-            return self._process_menu_principal(phone, message_lower, message)
-
-        elif current_state == ConversationState.FAQ_RESPOSTA:
-            return self._process_faq_resposta(phone, message_lower, message)
-
-        elif current_state == ConversationState.COTACAO_INICIO:
-            return self._process_cotacao_inicio(phone, message)
-
-        elif current_state == ConversationState.COTACAO_COLETANDO:
-            return self._process_cotacao_coletando(phone, message)
-
-        elif current_state == ConversationState.COTACAO_VALIDANDO:
-            return self._process_cotacao_validando(phone, message_lower)
-
-        elif current_state == ConversationState.COTACAO_CONCLUIDA:
-            return self._process_cotacao_concluida(phone, message_lower)
-
-        elif current_state == ConversationState.POS_COTACAO:
-            return self._process_pos_cotacao(phone, message_lower, message)
-
-        elif current_state == ConversationState.COTACAO_EDITANDO:
-            return self._process_cotacao_editando(phone, message)
-
-        else:
-            self.reset_conversation(phone)
-            return self._process_initial(phone, message_lower)
-
-    def _is_handoff_request(self, message: str) -> bool:
-        keywords = [
-            'atendente', 'humano', 'pessoa', 'agente', 'operador',
-            'falar com alguem', 'falar com alguém', 'falar com uma pessoa',
-            'suporte', 'ajuda humana', 'transferir', 'quero falar', 'preciso falar'
-        ]
-        return any(keyword in message for keyword in keywords)
-
-    def _process_initial(self, phone: str, message: str) -> Tuple[ConversationState, str]:
+        self.touch_conversation(phone)
+
+        # Rotas do estado compiladas da tabela (conversation_machine.TRANSITIONS)
+        routes = ROUTES[current_state]
+        intents = intent_classifier.classify(message)
+        for intent, handler in routes.intents:
+            match = self._match_intent(intent, intents, extracted_data)
+            if match:
+                result = getattr(self, handler)(phone, message, message_lower, match)
+                if result is not None:
+                    return result
+
+        handler = routes.options.get(message_lower, routes.default)
+        return getattr(self, handler)(phone, message, message_lower, None)
+
+    def _match_intent(self, intent: str, intents: MessageIntents, extracted_data: Optional[Dict]):
+        """Valor verdadeiro (tópico, dados...) se a intenção global casa com a mensagem"""
+        if intent == Intent.HANDOFF:
+            return intents.handoff
+        if intent == Intent.MENU:
+            return intents.menu
+        if intent == Intent.FAQ:
+            return intents.faq_topic
+        if intent == Intent.DATA and extracted_data:
+            # Só conta se trouxe algum campo da cotação
+            if any(extracted_data.get(k) for k in extracted_data if k in self.REQUIRED_FIELDS):
+                return extracted_data
+        return None
+
+    def _process_initial(self, phone: str, message: str, message_lower: str = "",
+                         match=None) -> Tuple[ConversationState, str]:
         self.set_conversation_state(phone, ConversationState.MENU_PRINCIPAL)
         return ConversationState.MENU_PRINCIPAL, MessageTemplate.get_template(
             ConversationState.INITIAL
         )
 
-    def _process_cotacao_editando(self, phone, message):
-        conv = self.conversations.get(phone, {})
-        campo_edicao = conv.get("campo_edicao")
+    def _process_cotacao_editando(self, phone, message, message_lower="", match=None):
+        conv = self._get_session(phone)
+        campo_edicao = conv.campo_edicao if conv else None
 
         mapa_nomes = {
             "nome_solicitante": "Nome do Solicitante",
@@ -525,10 +514,7 @@ class ConversationFlow:
 
         # FASE 2: já escolheu o campo, agora grava o novo valor
         if campo_edicao:
-            self.conversations[phone]['data'][campo_edicao] = message.strip()
-            self.conversations[phone].pop("campo_edicao", None)
-
-            self.set_conversation_state(phone, ConversationState.COTACAO_VALIDANDO)
+            self.apply_field_edit(phone, campo_edicao, message.strip())
 
             return ConversationState.COTACAO_VALIDANDO, (
                 f"✅ {mapa_nomes.get(campo_edicao, campo_edicao)} atualizado com sucesso!\n\n" +
@@ -579,7 +565,7 @@ class ConversationFlow:
 
         for key, field in mapa.items():
             if key == campo or key in campo:
-                self.conversations[phone]['campo_edicao'] = field
+                self._update_session(phone, lambda conv: setattr(conv, 'campo_edicao', field))
                 return (
                     ConversationState.COTACAO_EDITANDO,
                     f"Qual o novo valor para *{mapa_nomes.get(field, field)}*?"
@@ -597,86 +583,7 @@ class ConversationFlow:
             "7 - Utilização\n"
             "8 - UF"
         )
-    def _process_menu_principal(self, phone: str, message_lower: str, message_original: str) -> Tuple[ConversationState, str]:
-        """Processa menu principal com 3 opções + FAQ inteligente"""
-
-        # Opção 1 - Cotação
-        if message_lower in ['1', 'um', 'cotacao', 'cotação', 'seguro', 'quero cotação',
-                             'quero fazer cotação', 'cotação de seguro']:
-            self.set_conversation_state(phone, ConversationState.COTACAO_INICIO)
-            return ConversationState.COTACAO_INICIO, MessageTemplate.get_template(
-                ConversationState.COTACAO_INICIO
-            )
-
-        # Opção 2 - Como funciona o seguro
-        if message_lower in ['2', 'dois', 'como funciona', 'funciona', 'como funciona o seguro']:
-            faq_texto = self._build_faq_response_by_id(4)  # Tema 4: Cotação e Contratação
-            self.set_conversation_state(phone, ConversationState.FAQ_RESPOSTA)
-            return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
-                ConversationState.FAQ_RESPOSTA,
-                faq_texto=faq_texto
-            )
-
-        # Opção 3 - Qual valor do seguro
-        if message_lower in ['3', 'tres', 'três', 'valor', 'preço', 'preco',
-                             'quanto custa', 'qual valor', 'valor do seguro']:
-            faq_texto = self._build_faq_response_by_id(5)  # Tema 5: Preço e Valor
-            self.set_conversation_state(phone, ConversationState.FAQ_RESPOSTA)
-            return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
-                ConversationState.FAQ_RESPOSTA,
-                faq_texto=faq_texto
-            )
-
-        # Tentar encontrar FAQ por palavras-chave
-        topic = find_topic_by_message(message_original)
-        if topic:
-            faq_texto = f"*{topic['titulo']}*\n\n{topic['resumo']}"
-            self.set_conversation_state(phone, ConversationState.FAQ_RESPOSTA)
-            return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
-                ConversationState.FAQ_RESPOSTA,
-                faq_texto=faq_texto
-            )
-
-        # Nenhuma opção reconhecida
-        return ConversationState.MENU_PRINCIPAL, (
-            MessageTemplate.get_template(ConversationState.INITIAL) +
-            "\n\n_Por favor, digite 1, 2 ou 3, ou escreva sua dúvida._"
-        )
-
-    def _process_faq_resposta(self, phone: str, message_lower: str, message_original: str) -> Tuple[ConversationState, str]:
-        """Processa resposta após FAQ"""
-
-        # Opção 1 - Iniciar cotação
-        if message_lower in ['1', 'um', 'cotacao', 'cotação', 'sim']:
-            self.set_conversation_state(phone, ConversationState.COTACAO_INICIO)
-            return ConversationState.COTACAO_INICIO, MessageTemplate.get_template(
-                ConversationState.COTACAO_INICIO
-            )
-
-        # Opção 0 - Voltar ao menu
-        if message_lower in ['0', 'zero', 'menu', 'voltar']:
-            self.set_conversation_state(phone, ConversationState.MENU_PRINCIPAL)
-            return ConversationState.MENU_PRINCIPAL, MessageTemplate.get_template(
-                ConversationState.INITIAL
-            )
-
-        # Tentar encontrar outra FAQ
-        topic = find_topic_by_message(message_original)
-        if topic:
-            faq_texto = f"*{topic['titulo']}*\n\n{topic['resumo']}"
-            self.set_conversation_state(phone, ConversationState.FAQ_RESPOSTA)
-            return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
-                ConversationState.FAQ_RESPOSTA,
-                faq_texto=faq_texto
-            )
-
-        # Não entendeu, oferecer opções
-        return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
-            ConversationState.FAQ_RESPOSTA,
-            faq_texto="Não encontrei uma resposta específica para sua pergunta."
-        )
-
-    def _process_cotacao_inicio(self, phone: str, message: str):
+    def _process_cotacao_inicio(self, phone: str, message: str, message_lower: str = "", match=None):
         """Processa início da cotação - extrai dados da primeira mensagem"""
 
         if self.is_data_complete(phone):
@@ -693,7 +600,7 @@ class ConversationFlow:
             dados_faltantes=self.format_missing_data(phone)
         )
 
-    def _process_cotacao_coletando(self, phone: str, message: str):
+    def _process_cotacao_coletando(self, phone: str, message: str, message_lower: str = "", match=None):
         """Processa coleta de dados - extrai dados incrementalmente"""
 
         if self.is_data_complete(phone):
@@ -709,98 +616,136 @@ class ConversationFlow:
             dados_faltantes=self.format_missing_data(phone)
         )
 
-    def _process_cotacao_validando(self, phone: str, message: str) -> Tuple[ConversationState, str]:
-        """Processa validação dos dados coletados"""
-        if message in ['1', 'sim', 's', 'correto', 'ok']:
-            self.set_conversation_state(phone, ConversationState.COTACAO_PROCESSANDO)
-            return ConversationState.COTACAO_PROCESSANDO, MessageTemplate.get_template(
-                ConversationState.COTACAO_PROCESSANDO
-            )
+    # =========================================================================
+    # HANDLERS DA TABELA DE TRANSIÇÕES
+    # Assinatura comum: (phone, mensagem, mensagem minúscula, valor da intenção)
+    # =========================================================================
 
-        elif message in ['2', 'nao', 'não', 'n', 'corrigir']:
-            self.set_conversation_state(phone, ConversationState.COTACAO_EDITANDO)
-
-            return ConversationState.COTACAO_EDITANDO, (
-                "Qual informação você deseja corrigir?\n\n"
-                "Digite uma das opções:\n"
-                "1 - Nome do Solicitante\n"
-                "2 - Nome do Animal\n"
-                "3 - Valor do Animal\n"
-                "4 - Raça\n"
-                "5 - Data de Nascimento\n"
-                "6 - Sexo\n"
-                "7 - Utilização\n"
-                "8 - UF"
-            )
+    def _route_handoff(self, phone, message, message_lower, match):
+        self.set_conversation_state(phone, ConversationState.AGUARDANDO_ATENDENTE)
+        return ConversationState.AGUARDANDO_ATENDENTE, MessageTemplate.get_template(
+            ConversationState.AGUARDANDO_ATENDENTE
+        )
+
+    def _route_menu(self, phone, message, message_lower, match):
+        self.set_conversation_state(phone, ConversationState.MENU_PRINCIPAL)
+        return ConversationState.MENU_PRINCIPAL, MessageTemplate.get_template(
+            ConversationState.INITIAL
+        )
 
-        else:
+    def _route_faq_topic(self, phone, message, message_lower, topic):
+        return self._faq_response(phone, f"*{topic['titulo']}*\n\n{topic['resumo']}")
+
+    def _route_collect_data(self, phone, message, message_lower, extracted_data):
+        self.update_conversation_data(phone, extracted_data)
+
+        if self.is_data_complete(phone):
+            self.set_conversation_state(phone, ConversationState.COTACAO_VALIDANDO)
             return ConversationState.COTACAO_VALIDANDO, MessageTemplate.format_template(
                 ConversationState.COTACAO_VALIDANDO,
                 resumo_completo=self.format_complete_summary(phone)
-            ) + "\n\n_Por favor, digite 1 para confirmar ou 2 para corrigir._"
-
-    def _process_cotacao_concluida(self, phone: str, message: str) -> Tuple[ConversationState, str]:
-        """Processa opções após cotação concluída"""
-        if message in ['1', 'nova', 'nova cotacao', 'nova cotação']:
-            data = self.get_conversation_data(phone)
-            self.add_cotacao_realizada(phone, data.copy())
-            self.reset_conversation(phone)
-            self.set_conversation_state(phone, ConversationState.COTACAO_INICIO)
-            return ConversationState.COTACAO_INICIO, MessageTemplate.get_template(
-                ConversationState.COTACAO_INICIO
             )
 
-        elif message in ['2', 'atendente', 'humano']:
-            self.set_conversation_state(phone, ConversationState.AGUARDANDO_ATENDENTE)
-            return ConversationState.AGUARDANDO_ATENDENTE, MessageTemplate.get_template(
-                ConversationState.AGUARDANDO_ATENDENTE
-            )
+        self.set_conversation_state(phone, ConversationState.COTACAO_COLETANDO)
+        return ConversationState.COTACAO_COLETANDO, MessageTemplate.format_template(
+            ConversationState.COTACAO_COLETANDO,
+            dados_coletados=self.format_collected_data(phone),
+            dados_faltantes=self.format_missing_data(phone)
+        )
 
-        elif message in ['3', 'encerrar', 'tchau', 'obrigado']:
-            self.set_conversation_state(phone, ConversationState.ENCERRADA)
-            return ConversationState.ENCERRADA, MessageTemplate.get_template(
-                ConversationState.ENCERRADA
-            )
+    def _route_store_data(self, phone, message, message_lower, extracted_data):
+        """Fora da coleta os dados só são guardados; a mensagem segue para o estado"""
+        self.update_conversation_data(phone, extracted_data)
+        return None
 
-        else:
-            return ConversationState.COTACAO_CONCLUIDA, MessageTemplate.format_template(
-                ConversationState.COTACAO_CONCLUIDA,
-                mensagem_resultado="Cotação enviada com sucesso!"
-            ) + "\n\n_Por favor, digite 1, 2 ou 3._"
-
-    def _process_pos_cotacao(self, phone: str, message_lower: str, message_original: str) -> Tuple[ConversationState, str]:
-        """Processa menu pós-cotação"""
-        if message_lower in ['1', 'nova', 'nova cotacao']:
-            data = self.get_conversation_data(phone)
-            self.add_cotacao_realizada(phone, data.copy())
-            self.reset_conversation(phone)
-            self.set_conversation_state(phone, ConversationState.COTACAO_INICIO)
-            return ConversationState.COTACAO_INICIO, MessageTemplate.get_template(
-                ConversationState.COTACAO_INICIO
-            )
+    def _route_start_quotation(self, phone, message, message_lower, match):
+        self.set_conversation_state(phone, ConversationState.COTACAO_INICIO)
+        return ConversationState.COTACAO_INICIO, MessageTemplate.get_template(
+            ConversationState.COTACAO_INICIO
+        )
 
-        elif message_lower in ['2', 'duvida', 'dúvida', 'duvidas', 'dúvidas']:
-            self.set_conversation_state(phone, ConversationState.MENU_PRINCIPAL)
-            return ConversationState.MENU_PRINCIPAL, MessageTemplate.get_template(
-                ConversationState.INITIAL
-            )
+    def _route_faq_how_it_works(self, phone, message, message_lower, match):
+        return self._faq_response(phone, self._build_faq_response_by_id(4))  # Tema 4: Cotação e Contratação
 
-        elif message_lower in ['3', 'atendente', 'humano']:
-            self.set_conversation_state(phone, ConversationState.AGUARDANDO_ATENDENTE)
-            return ConversationState.AGUARDANDO_ATENDENTE, MessageTemplate.get_template(
-                ConversationState.AGUARDANDO_ATENDENTE
-            )
+    def _route_faq_price(self, phone, message, message_lower, match):
+        return self._faq_response(phone, self._build_faq_response_by_id(5))  # Tema 5: Preço e Valor
 
-        elif message_lower in ['4', 'encerrar', 'tchau']:
-            self.set_conversation_state(phone, ConversationState.ENCERRADA)
-            return ConversationState.ENCERRADA, MessageTemplate.get_template(
-                ConversationState.ENCERRADA
-            )
+    def _route_menu_unrecognized(self, phone, message, message_lower, match):
+        return ConversationState.MENU_PRINCIPAL, (
+            MessageTemplate.get_template(ConversationState.INITIAL) +
+            "\n\n_Por favor, digite 1, 2 ou 3, ou escreva sua dúvida._"
+        )
 
-        else:
-            return ConversationState.POS_COTACAO, MessageTemplate.get_template(
-                ConversationState.POS_COTACAO
-            ) + "\n\n_Por favor, digite um número de 1 a 4._"
+    def _route_faq_unrecognized(self, phone, message, message_lower, match):
+        return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
+            ConversationState.FAQ_RESPOSTA,
+            faq_texto="Não encontrei uma resposta específica para sua pergunta."
+        )
+
+    def _route_confirm_data(self, phone, message, message_lower, match):
+        self.set_conversation_state(phone, ConversationState.COTACAO_PROCESSANDO)
+        return ConversationState.COTACAO_PROCESSANDO, MessageTemplate.get_template(
+            ConversationState.COTACAO_PROCESSANDO
+        )
+
+    def _route_start_edit(self, phone, message, message_lower, match):
+        self.set_conversation_state(phone, ConversationState.COTACAO_EDITANDO)
+
+        return ConversationState.COTACAO_EDITANDO, (
+            "Qual informação você deseja corrigir?\n\n"
+            "Digite uma das opções:\n"
+            "1 - Nome do Solicitante\n"
+            "2 - Nome do Animal\n"
+            "3 - Valor do Animal\n"
+            "4 - Raça\n"
+            "5 - Data de Nascimento\n"
+            "6 - Sexo\n"
+            "7 - Utilização\n"
+            "8 - UF"
+        )
+
+    def _route_repeat_validation(self, phone, message, message_lower, match):
+        return ConversationState.COTACAO_VALIDANDO, MessageTemplate.format_template(
+            ConversationState.COTACAO_VALIDANDO,
+            resumo_completo=self.format_complete_summary(phone)
+        ) + "\n\n_Por favor, digite 1 para confirmar ou 2 para corrigir._"
+
+    def _route_new_quotation(self, phone, message, message_lower, match):
+        data = self.get_conversation_data(phone)
+        self.add_cotacao_realizada(phone, data.copy())
+        self.reset_conversation(phone)
+        self.set_conversation_state(phone, ConversationState.COTACAO_INICIO)
+        return ConversationState.COTACAO_INICIO, MessageTemplate.get_template(
+            ConversationState.COTACAO_INICIO
+        )
+
+    def _route_close(self, phone, message, message_lower, match):
+        self.set_conversation_state(phone, ConversationState.ENCERRADA)
+        return ConversationState.ENCERRADA, MessageTemplate.get_template(
+            ConversationState.ENCERRADA
+        )
+
+    def _route_concluded_unrecognized(self, phone, message, message_lower, match):
+        return ConversationState.COTACAO_CONCLUIDA, MessageTemplate.format_template(
+            ConversationState.COTACAO_CONCLUIDA,
+            mensagem_resultado="Cotação enviada com sucesso!"
+        ) + "\n\n_Por favor, digite 1, 2 ou 3._"
+
+    def _route_post_quotation_unrecognized(self, phone, message, message_lower, match):
+        return ConversationState.POS_COTACAO, MessageTemplate.get_template(
+            ConversationState.POS_COTACAO
+        ) + "\n\n_Por favor, digite um número de 1 a 4._"
+
+    def _route_reset(self, phone, message, message_lower, match):
+        self.reset_conversation(phone)
+        return self._process_initial(phone, message, message_lower)
+
+    def _faq_response(self, phone: str, faq_texto: str) -> Tuple[ConversationState, str]:
+        self.set_conversation_state(phone, ConversationState.FAQ_RESPOSTA)
+        return ConversationState.FAQ_RESPOSTA, MessageTemplate.format_template(
+            ConversationState.FAQ_RESPOSTA,
+            faq_texto=faq_texto
+        )
 
     # =========================================================================
     # HELPERS
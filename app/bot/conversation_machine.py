@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Máquina de Estados da Conversa
+As transições do ConversationFlow declaradas uma única vez como tabela
+(estado x intenção -> handler, próximos estados) e compiladas na
+importação em lookups de dicionário/frozenset por estado.
+
+Ordem de avaliação em cada estado (a primeira intenção que casa vence):
+    handoff -> menu -> faq -> dados -> opção do estado -> padrão
+Um handler que retorna None não consome a mensagem (ex: grava os dados
+extraídos e deixa seguir para as próximas intenções).
+
+`verify_transitions()` aponta estados inalcançáveis, transições
+conflitantes ou sombreadas e estados sem rota padrão.
+"""
+
+from collections import deque
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from app.bot.conversation_session import ConversationState
+
+S = ConversationState
+
+
+class Intent:
+    """Intenções reconhecidas na mensagem, em ordem de prioridade"""
+    HANDOFF = "handoff"
+    MENU = "menu"
+    FAQ = "faq"
+    DATA = "dados"
+    OPTION = "opcao"
+    DEFAULT = "padrao"
+
+    ORDER = (HANDOFF, MENU, FAQ, DATA, OPTION, DEFAULT)
+
+    # Reconhecidas pelo IntentClassifier, mas fora da tabela (usadas pelo BotHandler)
+    UPDATE = "atualizacao"
+    CONTROL = "controle"
+
+
+class Transition(NamedTuple):
+    states: FrozenSet[ConversationState]
+    intent: str
+    handler: str
+    next_states: Tuple[ConversationState, ...]
+    words: FrozenSet[str] = frozenset()
+
+
+def _t(states, intent, handler, next_states, words=()) -> Transition:
+    if isinstance(states, ConversationState):
+        states = (states,)
+    return Transition(frozenset(states), intent, handler, tuple(next_states), frozenset(words))
+
+
+HANDOFF_KEYWORDS = (
+    'atendente', 'humano', 'pessoa', 'agente', 'operador',
+    'falar com alguem', 'falar com alguém', 'falar com uma pessoa',
+    'suporte', 'ajuda humana', 'transferir', 'quero falar', 'preciso falar'
+)
+
+MENU_WORDS = frozenset(['menu', 'voltar', '0'])
+
+ALL_STATES = frozenset(ConversationState)
+
+# Validação e edição têm prioridade: nem handoff nem menu são checados nelas
+PRIORITY_STATES = frozenset([S.COTACAO_VALIDANDO, S.COTACAO_EDITANDO])
+ROUTED_STATES = ALL_STATES - PRIORITY_STATES
+
+MENU_STATES = ROUTED_STATES - {S.INITIAL, S.COTACAO_COLETANDO, S.COTACAO_PROCESSANDO}
+
+FAQ_STATES = frozenset([
+    S.INITIAL, S.MENU_PRINCIPAL, S.FAQ_RESPOSTA, S.COTACAO_INICIO,
+    S.COTACAO_COLETANDO, S.COTACAO_CONCLUIDA, S.POS_COTACAO,
+])
+
+# Dados da cotação nesses estados levam à coleta/validação; nos demais só são gravados
+DATA_STATES = frozenset([S.INITIAL, S.MENU_PRINCIPAL, S.COTACAO_INICIO, S.COTACAO_COLETANDO])
+
+# Estados que terminam em reset + saudação quando nada mais casa
+FALLBACK_STATES = frozenset([S.COTACAO_PROCESSANDO, S.AGUARDANDO_ATENDENTE, S.ATENDENTE_ATIVO, S.ENCERRADA])
+
+TRANSITIONS = (
+    # Validação dos dados
+    _t(S.COTACAO_VALIDANDO, Intent.OPTION, "_route_confirm_data", [S.COTACAO_PROCESSANDO],
+       ['1', 'sim', 's', 'correto', 'ok']),
+    _t(S.COTACAO_VALIDANDO, Intent.OPTION, "_route_start_edit", [S.COTACAO_EDITANDO],
+       ['2', 'nao', 'não', 'n', 'corrigir']),
+    _t(S.COTACAO_VALIDANDO, Intent.DEFAULT, "_route_repeat_validation", [S.COTACAO_VALIDANDO]),
+
+    # Edição de um campo (escolha do campo, depois o valor)
+    _t(S.COTACAO_EDITANDO, Intent.DEFAULT, "_process_cotacao_editando", [S.COTACAO_EDITANDO, S.COTACAO_VALIDANDO]),
+
+    # Intenções globais
+    _t(ROUTED_STATES, Intent.HANDOFF, "_route_handoff", [S.AGUARDANDO_ATENDENTE]),
+    _t(MENU_STATES, Intent.MENU, "_route_menu", [S.MENU_PRINCIPAL]),
+    _t(FAQ_STATES, Intent.FAQ, "_route_faq_topic", [S.FAQ_RESPOSTA]),
+    _t(DATA_STATES, Intent.DATA, "_route_collect_data", [S.COTACAO_VALIDANDO, S.COTACAO_COLETANDO]),
+    _t(ROUTED_STATES - DATA_STATES, Intent.DATA, "_route_store_data", []),
+
+    # Saudação
+    _t(S.INITIAL, Intent.DEFAULT, "_process_initial", [S.MENU_PRINCIPAL]),
+
+    # Menu principal
+    _t(S.MENU_PRINCIPAL, Intent.OPTION, "_route_start_quotation", [S.COTACAO_INICIO],
+       ['1', 'um', 'cotacao', 'cotação', 'seguro', 'quero cotação', 'quero fazer cotação', 'cotação de seguro']),
+    _t(S.MENU_PRINCIPAL, Intent.OPTION, "_route_faq_how_it_works", [S.FAQ_RESPOSTA],
+       ['2', 'dois', 'como funciona', 'funciona', 'como funciona o seguro']),
+    _t(S.MENU_PRINCIPAL, Intent.OPTION, "_route_faq_price", [S.FAQ_RESPOSTA],
+       ['3', 'tres', 'três', 'valor', 'preço', 'preco', 'quanto custa', 'qual valor', 'valor do seguro']),
+    _t(S.MENU_PRINCIPAL, Intent.DEFAULT, "_route_menu_unrecognized", [S.MENU_PRINCIPAL]),
+
+    # Depois de uma resposta de FAQ
+    _t(S.FAQ_RESPOSTA, Intent.OPTION, "_route_start_quotation", [S.COTACAO_INICIO],
+       ['1', 'um', 'cotacao', 'cotação', 'sim']),
+    _t(S.FAQ_RESPOSTA, Intent.OPTION, "_route_menu", [S.MENU_PRINCIPAL], ['zero']),
+    _t(S.FAQ_RESPOSTA, Intent.DEFAULT, "_route_faq_unrecognized", [S.FAQ_RESPOSTA]),
+
+    # Coleta dos dados
+    _t(S.COTACAO_INICIO, Intent.DEFAULT, "_process_cotacao_inicio", [S.COTACAO_VALIDANDO, S.COTACAO_COLETANDO]),
+    _t(S.COTACAO_COLETANDO, Intent.DEFAULT, "_process_cotacao_coletando", [S.COTACAO_VALIDANDO, S.COTACAO_COLETANDO]),
+
+    # Cotação concluída
+    _t(S.COTACAO_CONCLUIDA, Intent.OPTION, "_route_new_quotation", [S.COTACAO_INICIO],
+       ['1', 'nova', 'nova cotacao', 'nova cotação']),
+    _t(S.COTACAO_CONCLUIDA, Intent.OPTION, "_route_handoff", [S.AGUARDANDO_ATENDENTE], ['2']),
+    _t(S.COTACAO_CONCLUIDA, Intent.OPTION, "_route_close", [S.ENCERRADA], ['3', 'encerrar', 'tchau', 'obrigado']),
+    _t(S.COTACAO_CONCLUIDA, Intent.DEFAULT, "_route_concluded_unrecognized", [S.COTACAO_CONCLUIDA]),
+
+    # Menu pós-cotação
+    _t(S.POS_COTACAO, Intent.OPTION, "_route_new_quotation", [S.COTACAO_INICIO], ['1', 'nova', 'nova cotacao']),
+    _t(S.POS_COTACAO, Intent.OPTION, "_route_menu", [S.MENU_PRINCIPAL], ['2', 'duvida', 'dúvida', 'duvidas', 'dúvidas']),
+    _t(S.POS_COTACAO, Intent.OPTION, "_route_handoff", [S.AGUARDANDO_ATENDENTE], ['3']),
+    _t(S.POS_COTACAO, Intent.OPTION, "_route_close", [S.ENCERRADA], ['4', 'encerrar', 'tchau']),
+    _t(S.POS_COTACAO, Intent.DEFAULT, "_route_post_quotation_unrecognized", [S.POS_COTACAO]),
+
+    # Estados sem menu próprio: volta ao início
+    _t(FALLBACK_STATES, Intent.DEFAULT, "_route_reset", [S.MENU_PRINCIPAL]),
+)
+
+# Transições feitas fora da tabela (resultado da SwissRe, atendente assumindo)
+EXTERNAL_TRANSITIONS = {
+    S.COTACAO_PROCESSANDO: (S.COTACAO_CONCLUIDA, S.COTACAO_COLETANDO),
+    S.AGUARDANDO_ATENDENTE: (S.ATENDENTE_ATIVO,),
+}
+
+
+class StateRoutes(NamedTuple):
+    """Rotas compiladas de um estado"""
+    intents: Tuple[Tuple[str, str], ...]   # (intenção global, handler) em ordem
+    options: Dict[str, str]                # palavra -> handler
+    default: Optional[str]
+
+
+def compile_transitions(transitions=TRANSITIONS) -> Dict[ConversationState, StateRoutes]:
+    """Agrupa a tabela por estado, na ordem de Intent.ORDER"""
+    compiled = {}
+    for state in ConversationState:
+        intents = []
+        options = {}
+        default = None
+        for intent in Intent.ORDER:
+            for transition in transitions:
+                if state not in transition.states or transition.intent != intent:
+                    continue
+                if intent == Intent.OPTION:
+                    for word in transition.words:
+                        options.setdefault(word, transition.handler)
+                elif intent == Intent.DEFAULT:
+                    default = default or transition.handler
+                else:
+                    intents.append((intent, transition.handler))
+        compiled[state] = StateRoutes(tuple(intents), options, default)
+    return compiled
+
+
+ROUTES = compile_transitions()
+
+
+def verify_transitions(transitions=TRANSITIONS, handler_owner=None,
+                       classify: Optional[Callable[[str], object]] = None) -> List[str]:
+    """
+    Confere a tabela de transições
+
+    Args:
+        handler_owner: Classe com os handlers (confere se existem)
+        classify: Classificador das mensagens (padrão: intent_classifier.classify),
+            para detectar opções sombreadas por handoff/FAQ
+
+    Returns:
+        Lista de problemas (vazia = tabela consistente)
+    """
+    if classify is None:
+        from app.bot.intent_classifier import intent_classifier
+        classify = intent_classifier.classify
+
+    problems = []
+
+    seen = {}
+    for transition in transitions:
+        for state in transition.states:
+            if transition.intent == Intent.OPTION:
+                for word in transition.words:
+                    previous = seen.setdefault((state, Intent.OPTION, word), transition.handler)
+                    if previous != transition.handler:
+                        problems.append(f"conflito: '{word}' em {state.value} -> {previous} e {transition.handler}")
+            else:
+                previous = seen.setdefault((state, transition.intent), transition.handler)
+                if previous != transition.handler:
+                    problems.append(f"conflito: {transition.intent} em {state.value} -> "
+                                    f"{previous} e {transition.handler}")
+        if handler_owner is not None and not hasattr(handler_owner, transition.handler):
+            problems.append(f"handler inexistente: {transition.handler}")
+
+    routes = compile_transitions(transitions)
+    intents_by_state = {state: {intent for intent, _ in route.intents} for state, route in routes.items()}
+    for state, route in routes.items():
+        if route.default is None:
+            problems.append(f"sem rota padrão: {state.value}")
+        # Opções que uma intenção de prioridade maior sempre captura antes
+        for word in route.options:
+            intents = classify(word)
+            if Intent.HANDOFF in intents_by_state[state] and intents.handoff:
+                problems.append(f"sombreada: '{word}' em {state.value} (handoff)")
+            elif Intent.MENU in intents_by_state[state] and intents.menu:
+                problems.append(f"sombreada: '{word}' em {state.value} (menu)")
+            elif Intent.FAQ in intents_by_state[state] and intents.faq_topic:
+                problems.append(f"sombreada: '{word}' em {state.value} (faq)")
+
+    graph = {state: set(EXTERNAL_TRANSITIONS.get(state, ())) for state in ConversationState}
+    for transition in transitions:
+        for state in transition.states:
+            graph[state].update(transition.next_states)
+    reachable = {S.INITIAL}
+    queue = deque([S.INITIAL])
+    while queue:
+        for target in graph[queue.popleft()]:
+            if target not in reachable:
+                reachable.add(target)
+                queue.append(target)
+    for state in ConversationState:
+        if state not in reachable:
+            problems.append(f"inalcançável: {state.value}")
+
+    return problems
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Sessão de Conversa Compacta
+Registro com __slots__ para o estado de cada telefone: os oito campos da
+cotação são atributos fixos (sem dicionário por sessão), as datas são
+epoch em segundos (int) e o histórico de cotações só é alocado quando existe
+"""
+
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class ConversationState(Enum):
+    """Estados possíveis da conversa"""
+    INITIAL = "initial"
+    MENU_PRINCIPAL = "menu_principal"
+    FAQ_RESPOSTA = "faq_resposta"
+    COTACAO_INICIO = "cotacao_inicio"
+    COTACAO_COLETANDO = "cotacao_coletando"
+    COTACAO_VALIDANDO = "cotacao_validando"
+    COTACAO_PROCESSANDO = "cotacao_processando"
+    COTACAO_CONCLUIDA = "cotacao_concluida"
+    POS_COTACAO = "pos_cotacao"
+    AGUARDANDO_ATENDENTE = "aguardando_atendente"
+    ATENDENTE_ATIVO = "atendente_ativo"
+    ENCERRADA = "encerrada"
+    COTACAO_EDITANDO = "cotacao_editando"
+
+
+# Campos obrigatórios da cotação (mesma ordem de ConversationFlow.REQUIRED_FIELDS)
+QUOTATION_FIELDS = (
+    'nome_solicitante',
+    'nome_animal',
+    'valor_animal',
+    'raca',
+    'data_nascimento',
+    'sexo',
+    'utilizacao',
+    'uf',
+)
+
+
+class QuotationData:
+    """
+    Dados da cotação: um slot por campo obrigatório (None = não informado)
+
+    Campos fora da lista (raros, vindos da extração) ficam em `extra`,
+    criado só quando necessário.
+    """
+
+    __slots__ = QUOTATION_FIELDS + ('extra',)
+
+    def __init__(self, values: Optional[Dict] = None):
+        for field in QUOTATION_FIELDS:
+            setattr(self, field, None)
+        self.extra = None
+        if values:
+            self.update(values)
+
+    def get(self, key: str, default=None):
+        if key in QUOTATION_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default) if self.extra else default
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        if key in QUOTATION_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def update(self, values: Dict):
+        for key, value in values.items():
+            self[key] = value
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        for field in QUOTATION_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                yield field, value
+        if self.extra:
+            yield from self.extra.items()
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    def copy(self) -> "QuotationData":
+        copied = QuotationData()
+        for field in QUOTATION_FIELDS:
+            setattr(copied, field, getattr(self, field))
+        copied.extra = dict(self.extra) if self.extra else None
+        return copied
+
+
+class ConversationSession:
+    """
+    Estado de uma conversa
+
+    created_at/last_interaction são epoch em segundos; cotacoes_realizadas
+    fica None até a primeira cotação; campo_edicao guarda o campo escolhido
+    durante a edição dos dados.
+    """
+
+    __slots__ = ('state', 'data', 'created_at', 'last_interaction', 'message_count',
+                 'cotacoes_realizadas', 'campo_edicao')
+
+    def __init__(self, state: ConversationState = ConversationState.INITIAL,
+                 cotacoes_realizadas: Optional[List[Dict]] = None):
+        now = int(time.time())
+        self.state = state
+        self.data = QuotationData()
+        self.created_at = now
+        self.last_interaction = now
+        self.message_count = 0
+        self.cotacoes_realizadas = cotacoes_realizadas or None
+        self.campo_edicao = None
+
+    def touch(self):
+        self.last_interaction = int(time.time())
+
+    def reset(self):
+        """Volta ao início mantendo o histórico de cotações"""
+        cotacoes = self.cotacoes_realizadas
+        self.__init__(cotacoes_realizadas=cotacoes)
+
+    def add_cotacao(self, cotacao: Dict):
+        if self.cotacoes_realizadas is None:
+            self.cotacoes_realizadas = []
+        self.cotacoes_realizadas.append(cotacao)
+
+    def copy(self) -> "ConversationSession":
+        copied = ConversationSession.__new__(ConversationSession)
+        copied.state = self.state
+        copied.data = self.data.copy()
+        copied.created_at = self.created_at
+        copied.last_interaction = self.last_interaction
+        copied.message_count = self.message_count
+        copied.cotacoes_realizadas = list(self.cotacoes_realizadas) if self.cotacoes_realizadas else None
+        copied.campo_edicao = self.campo_edicao
+        return copied
+
+    def to_dict(self) -> Dict:
+        """Forma serializável (JSON/MongoDB)"""
+        encoded = {
+            'state': self.state.value,
+            'data': self.data.to_dict(),
+            'created_at': self.created_at,
+            'last_interaction': self.last_interaction,
+            'message_count': self.message_count,
+            'cotacoes_realizadas': self.cotacoes_realizadas or [],
+        }
+        if self.campo_edicao:
+            encoded['campo_edicao'] = self.campo_edicao
+        return encoded
+
+    @classmethod
+    def from_dict(cls, encoded: Dict) -> "ConversationSession":
+        """Inverso de to_dict (aceita também datas em ISO do formato anterior)"""
+        session = cls(ConversationState(encoded.get('state', ConversationState.INITIAL.value)))
+        session.data = QuotationData(encoded.get('data'))
+        session.created_at = _epoch(encoded.get('created_at'), session.created_at)
+        session.last_interaction = _epoch(encoded.get('last_interaction'), session.created_at)
+        session.message_count = encoded.get('message_count', 0)
+        session.cotacoes_realizadas = list(encoded.get('cotacoes_realizadas') or []) or None
+        session.campo_edicao = encoded.get('campo_edicao')
+        return session
+
+
+def _epoch(value, default: int) -> int:
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Timers das Conversas
+Cada gravação de sessão (re)agenda no timer wheel o prazo da conversa,
+e os vencimentos disparam as ações sem varrer as sessões:
+- expiração: CONVERSATION_TIMEOUT volta a conversa ao início
+- AGENT_TIMEOUT nos estados longos; ATENDENTE_ATIVO é devolvido ao bot
+  via handle_agent_release
+- lembrete opcional ("ainda está aí?") durante a coleta da cotação
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from app.bot.conversation_flow import conversation_flow
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.utils.metrics import metrics
+from app.utils.striped_lock import session_locks
+from app.utils.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# Segundos sem resposta até o lembrete (0 desativa)
+SESSION_NUDGE_AFTER = float(os.getenv('SESSION_NUDGE_AFTER', '0'))
+
+NUDGE_MESSAGE = """*Ainda está aí?* 🐴
+
+Seus dados da cotação estão guardados, é só continuar de onde parou.
+
+_Digite *menu* para voltar ao início ou *atendente* para falar com nossa equipe._"""
+
+# Espera antes de tentar de novo quando o shard do telefone está cheio
+RETRY_DELAY = 5
+
+
+class ConversationTimers:
+    """
+    Prazos das conversas em um TimerWheel (um timer de expiração e um de
+    lembrete por telefone)
+
+    O payload de cada timer é o last_interaction da sessão no agendamento:
+    se a sessão mudou desde então (outra mensagem, outro worker), o
+    disparo só reagenda pelo prazo novo.
+    """
+
+    EXPIRE = "expire"
+    NUDGE = "nudge"
+
+    # Estados em que o cliente está no meio da cotação
+    NUDGE_STATES = frozenset([
+        ConversationState.COTACAO_INICIO,
+        ConversationState.COTACAO_COLETANDO,
+        ConversationState.COTACAO_VALIDANDO,
+        ConversationState.COTACAO_EDITANDO,
+    ])
+
+    def __init__(self, flow, wheel: Optional[TimerWheel] = None, nudge_after: float = SESSION_NUDGE_AFTER):
+        """
+        Args:
+            flow: ConversationFlow dono das sessões e dos timeouts
+            nudge_after: Segundos sem resposta até o lembrete (0 desativa)
+        """
+        self.flow = flow
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.nudge_after = nudge_after
+        self.release: Optional[Callable[[str], None]] = None
+        self.notify: Optional[Callable[[str, str], None]] = None
+        self.executor: Optional[Callable] = None
+        self._thread = None
+        self.expired = 0
+        self.released = 0
+        self.nudged = 0
+
+    def start(self, release: Optional[Callable[[str], None]] = None,
+              notify: Optional[Callable[[str, str], None]] = None,
+              executor: Optional[Callable] = None):
+        """
+        Liga os timers ao fluxo e inicia a thread do relógio (idempotente)
+
+        Args:
+            release: Devolve ao bot uma conversa com atendente (handle_agent_release)
+            notify: Envia mensagem ao telefone (lembrete)
+            executor: submit(chave, func, *args) para rodar no shard do telefone
+        """
+        self.release = release
+        self.notify = notify
+        self.executor = executor
+        self.flow.use_timers(self)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="conversation-timers", daemon=True)
+            self._thread.start()
+
+    def on_session_saved(self, phone: str, session: ConversationSession):
+        """Reagenda os prazos do telefone (chamado pelo ConversationFlow a cada gravação)"""
+        if session.state == ConversationState.INITIAL:
+            # Conversa nova ou já reiniciada: a limpeza periódica cuida dela
+            self.wheel.cancel((phone, self.EXPIRE))
+            self.wheel.cancel((phone, self.NUDGE))
+            return
+
+        stamp = session.last_interaction
+        idle = time.time() - stamp
+        self.wheel.schedule((phone, self.EXPIRE), self._timeout(session) - idle, stamp)
+
+        if self.nudge_after and session.state in self.NUDGE_STATES and self.nudge_after > idle:
+            self.wheel.schedule((phone, self.NUDGE), self.nudge_after - idle, stamp)
+        else:
+            self.wheel.cancel((phone, self.NUDGE))
+
+    def stats(self) -> Dict:
+        stats = self.wheel.stats()
+        stats.update(expired=self.expired, released=self.released, nudged=self.nudged)
+        return stats
+
+    def _timeout(self, session: ConversationSession) -> float:
+        if session.state in self.flow.LONG_LIVED_STATES:
+            return self.flow.AGENT_TIMEOUT.total_seconds()
+        return self.flow.CONVERSATION_TIMEOUT.total_seconds()
+
+    def _run(self):
+        while True:
+            time.sleep(self.wheel.tick)
+            for (phone, kind), stamp in self.wheel.advance():
+                self._dispatch(phone, kind, stamp)
+
+    def _dispatch(self, phone: str, kind: str, stamp: int):
+        try:
+            if self.executor:
+                if self.executor(phone, self._handle, phone, kind, stamp) is None:
+                    # Shard cheio: tenta de novo em alguns segundos
+                    self.wheel.schedule((phone, kind), RETRY_DELAY, stamp)
+                return
+            self._handle(phone, kind, stamp)
+        except Exception as e:
+            logger.error(f"Erro no timer {kind} de {phone}: {str(e)}", exc_info=True)
+
+    def _handle(self, phone: str, kind: str, stamp: int):
+        # Sob o lock do telefone: a mescla e gravação de uma mensagem (BotHandler) não
+        # acontece entre a conferência do prazo e o reset (timers sem executor, ex: asyncio)
+        with session_locks.hold(phone):
+            self._handle_locked(phone, kind, stamp)
+
+    def _handle_locked(self, phone: str, kind: str, stamp: int):
+        session, _ = self.flow.sessions.load(phone)
+        if session is None:
+            return
+        if session.last_interaction != stamp:
+            # Houve atividade depois do agendamento
+            self.on_session_saved(phone, session)
+            return
+
+        if kind == self.NUDGE:
+            if session.state in self.NUDGE_STATES and self.notify:
+                self.notify(phone, NUDGE_MESSAGE)
+                self.nudged += 1
+                metrics.incr("conversations.nudges")
+            return
+
+        if session.state == ConversationState.ATENDENTE_ATIVO and self.release:
+            logger.info(f"AGENT_TIMEOUT de {phone} - devolvendo a conversa ao bot")
+            self.release(phone)
+            self.released += 1
+            metrics.incr("conversations.agent_released")
+        else:
+            logger.info(f"Timeout de conversa ({phone}, {session.state.value}) - resetando")
+            self.flow.reset_conversation(phone)
+            self.expired += 1
+            metrics.incr("conversations.expired")
+
+
+CONVERSATION_TIMERS = os.getenv('CONVERSATION_TIMERS', 'true').lower() == 'true'
+
+# Instância global (None com CONVERSATION_TIMERS=false: só a verificação na próxima mensagem)
+conversation_timers = ConversationTimers(conversation_flow) if CONVERSATION_TIMERS else None
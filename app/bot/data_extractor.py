@@ -10,10 +10,24 @@ import re
 import json
 import logging
 from typing import Dict, Optional
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APITimeoutError, InternalServerError
+
+from app.utils.circuit_breaker import openai_breaker, CircuitOpenError
+from app.utils.concurrency_limiter import openai_limiter, LimiterTimeout
 
 logger = logging.getLogger(__name__)
 
+# Timeout por chamada (o circuit breaker evita pagar esse tempo a cada mensagem)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "15"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+
+# Erros que indicam sobrecarga da OpenAI (reduzem o limite de concorrência)
+OPENAI_OVERLOAD_ERRORS = (RateLimitError, APITimeoutError, InternalServerError)
+
+
+def is_openai_overload(error: Exception) -> bool:
+    return isinstance(error, OPENAI_OVERLOAD_ERRORS)
+
 
 class DataExtractor:
     """
@@ -23,34 +37,109 @@ class DataExtractor:
     def __init__(self):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.client = None
+        self._async_client = None
 
         if self.openai_api_key:
-            self.client = OpenAI(api_key=self.openai_api_key)
+            self.client = OpenAI(
+                api_key=self.openai_api_key,
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES
+            )
             logger.info("DataExtractor inicializado com OpenAI")
         else:
             logger.warning("OpenAI API key não encontrada, usando extração simples")
 
-    def extract_data(self, message: str, existing_data: Optional[Dict] = None) -> Dict:
+    def extract_data(self, message: str, existing_data: Optional[Dict] = None,
+                     allow_ai: bool = True) -> Dict:
         """
         Extrai dados da mensagem e mescla com dados existentes
+
+        Com allow_ai=False (modo degradado sob sobrecarga) ou com o circuito
+        da OpenAI aberto usa apenas regex
         """
-        if self.client:
+        if self.client and allow_ai and openai_breaker.available:
             return self._extract_with_ai(message, existing_data)
         else:
             return self._extract_simple(message, existing_data)
 
+    async def extract_data_async(self, message: str, existing_data: Optional[Dict] = None,
+                                 allow_ai: bool = True) -> Dict:
+        """
+        Versão assíncrona de extract_data (modo de serviço asyncio)
+        """
+        if self.client and allow_ai and openai_breaker.available:
+            return await self._extract_with_ai_async(message, existing_data)
+        else:
+            return self._extract_simple(message, existing_data)
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Cliente OpenAI assíncrono, criado no primeiro uso"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.openai_api_key,
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES
+            )
+        return self._async_client
+
     def _extract_with_ai(self, message: str, existing_data: Optional[Dict]) -> Dict:
         """Extrai dados usando OpenAI"""
         try:
             logger.info("Extraindo dados usando OpenAI")
 
-            existing_context = ""
-            if existing_data:
-                existing_context = "\n\nDados já coletados anteriormente:\n" + json.dumps(
-                    existing_data, ensure_ascii=False, indent=2
-                )
+            response = openai_limiter.call(
+                openai_breaker.call,
+                self.client.chat.completions.create,
+                overload_error=is_openai_overload,
+                **self._build_ai_request(message, existing_data)
+            )
+
+            return self._parse_ai_response(response)
+
+        except CircuitOpenError:
+            logger.warning("Circuito da OpenAI aberto, usando extração simples")
+            return self._extract_simple(message, existing_data)
+        except LimiterTimeout as e:
+            logger.warning(f"{str(e)}, usando extração simples")
+            return self._extract_simple(message, existing_data)
+        except Exception as e:
+            logger.error(f"Erro na extração com IA: {str(e)}")
+            return self._extract_simple(message, existing_data)
+
+    async def _extract_with_ai_async(self, message: str, existing_data: Optional[Dict]) -> Dict:
+        """Extrai dados usando OpenAI sem bloquear o event loop"""
+        try:
+            logger.info("Extraindo dados usando OpenAI (async)")
+
+            response = await openai_limiter.call_async(
+                openai_breaker.call_async,
+                self.async_client.chat.completions.create,
+                overload_error=is_openai_overload,
+                **self._build_ai_request(message, existing_data)
+            )
+
+            return self._parse_ai_response(response)
+
+        except CircuitOpenError:
+            logger.warning("Circuito da OpenAI aberto, usando extração simples")
+            return self._extract_simple(message, existing_data)
+        except LimiterTimeout as e:
+            logger.warning(f"{str(e)}, usando extração simples")
+            return self._extract_simple(message, existing_data)
+        except Exception as e:
+            logger.error(f"Erro na extração com IA: {str(e)}")
+            return self._extract_simple(message, existing_data)
+
+    def _build_ai_request(self, message: str, existing_data: Optional[Dict]) -> Dict:
+        """Monta os parâmetros da chamada ao modelo"""
+        existing_context = ""
+        if existing_data:
+            existing_context = "\n\nDados já coletados anteriormente:\n" + json.dumps(
+                existing_data, ensure_ascii=False, indent=2
+            )
 
-            system_prompt = f"""Você é um assistente especializado em extrair dados estruturados de mensagens de texto.
+        system_prompt = f"""Você é um assistente especializado em extrair dados estruturados de mensagens de texto.
 
 Sua tarefa é extrair informações para cotação de seguros de equinos (cavalos).
 
@@ -86,34 +175,32 @@ Exemplo:
   "uf": "SP"
 }}"""
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=400,
-                temperature=0.1
-            )
-
-            response_text = response.choices[0].message.content.strip()
+        return {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            "max_tokens": 400,
+            "temperature": 0.1
+        }
 
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                extracted_data = json.loads(json_str)
+    def _parse_ai_response(self, response) -> Dict:
+        """Extrai o JSON da resposta do modelo"""
+        response_text = response.choices[0].message.content.strip()
 
-                # Importante:
-                # Retornar apenas os dados NOVOS extraídos da mensagem.
-                # O merge com os dados antigos já é feito no BotHandler.
-                return extracted_data
-            else:
-                logger.warning("Não foi possível extrair JSON da resposta da IA")
-                return {}
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            json_str = json_match.group()
+            extracted_data = json.loads(json_str)
 
-        except Exception as e:
-            logger.error(f"Erro na extração com IA: {str(e)}")
-            return self._extract_simple(message, existing_data)
+            # Importante:
+            # Retornar apenas os dados NOVOS extraídos da mensagem.
+            # O merge com os dados antigos já é feito no BotHandler.
+            return extracted_data
+        else:
+            logger.warning("Não foi possível extrair JSON da resposta da IA")
+            return {}
 
     def _extract_simple(self, message: str, existing_data: Optional[Dict]) -> Dict:
         """
@@ -223,15 +310,17 @@ Exemplo:
 
         return len(errors) == 0, errors
 
+# Palavras que indicam correção de um dado já informado (também no IntentClassifier)
+UPDATE_KEYWORDS = (
+    "corrigir", "alterar", "mudar", "trocar",
+    "na verdade", "errado", "corrige", "ajustar"
+)
+
+
 def is_update_intent(message: str) -> bool:
     msg = message.lower()
 
-    palavras = [
-        "corrigir", "alterar", "mudar", "trocar",
-        "na verdade", "errado", "corrige", "ajustar"
-    ]
-
-    return any(p in msg for p in palavras)
+    return any(p in msg for p in UPDATE_KEYWORDS)
 
 # Instância global do extrator
 data_extractor = DataExtractor()
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import unicodedata
 import re
+from typing import Dict, Iterable, Optional
+
+from app.utils.aho_corasick import AhoCorasick
 
 """
 Base de Conhecimento FAQ - Equinos Seguros
@@ -548,27 +551,30 @@ def get_all_keywords_map():
     return keyword_map
 
 
-def find_topic_by_message(message: str) -> dict | None:
+def compile_keyword_weights(topics: Dict = FAQ_TOPICS) -> Dict[str, Dict[str, int]]:
     """
-    Tenta encontrar um tópico FAQ baseado na mensagem do usuário.
-    Retorna o tópico encontrado ou None.
+    Retorna {palavra_chave_normalizada: {topic_id: pontuação}}.
+    A pontuação é o número de palavras da palavra-chave (somada se ela se repete no tópico).
     """
+    weights = {}
+    for topic_id, topic in topics.items():
+        for kw in topic["palavras_chave"]:
+            kw_normalized = normalizar_texto(kw)
+            if kw_normalized:
+                topic_weights = weights.setdefault(kw_normalized, {})
+                topic_weights[topic_id] = topic_weights.get(topic_id, 0) + len(kw_normalized.split())
+    return weights
 
-    message_normalized = normalizar_texto(message)
 
+def best_topic(scores: Dict[str, int], topics: Dict = FAQ_TOPICS) -> Optional[dict]:
+    """
+    Tópico de maior pontuação (no empate vale o que vem antes em `topics`), ou None.
+    """
     best_match = None
     best_score = 0
 
-    for topic in FAQ_TOPICS.values():
-        score = 0
-
-        for kw in topic["palavras_chave"]:
-            kw_normalized = normalizar_texto(kw)
-
-            if kw_normalized and kw_normalized in message_normalized:
-                # Quanto maior/específica a palavra-chave, maior a pontuação.
-                score += len(kw_normalized.split())
-
+    for topic_id, topic in topics.items():
+        score = scores.get(topic_id, 0)
         if score > best_score:
             best_score = score
             best_match = topic
@@ -577,3 +583,41 @@ def find_topic_by_message(message: str) -> dict | None:
         return best_match
 
     return None
+
+
+def score_topics(keywords: Iterable[str], weights: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """Soma, por tópico, a pontuação das palavras-chave encontradas na mensagem."""
+    scores = {}
+    for kw in keywords:
+        for topic_id, weight in weights[kw].items():
+            scores[topic_id] = scores.get(topic_id, 0) + weight
+    return scores
+
+
+def compile_keyword_index(weights: Dict[str, Dict[str, int]]) -> AhoCorasick:
+    """Autômato Aho-Corasick com as palavras-chave normalizadas (cada uma retorna a si mesma)."""
+    index = AhoCorasick()
+    for kw in weights:
+        index.add(kw, kw)
+    return index.build()
+
+
+# Índice compilado na importação: uma passada pela mensagem acha todas as palavras-chave
+FAQ_KEYWORD_WEIGHTS = compile_keyword_weights()
+FAQ_KEYWORD_INDEX = compile_keyword_index(FAQ_KEYWORD_WEIGHTS)
+
+
+def find_topic_by_message(message: str) -> dict | None:
+    """
+    Tenta encontrar um tópico FAQ baseado na mensagem do usuário.
+    Retorna o tópico encontrado ou None.
+
+    Cada palavra-chave contida na mensagem normalizada soma o seu número de
+    palavras ao tópico (quanto maior/específica, maior a pontuação); a busca
+    é uma única passada pelo índice compilado.
+    """
+
+    message_normalized = normalizar_texto(message)
+    found = FAQ_KEYWORD_INDEX.find(message_normalized)
+
+    return best_topic(score_topics(found, FAQ_KEYWORD_WEIGHTS))
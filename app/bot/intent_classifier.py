@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Classificador de Intenções
+Uma única passada sobre a mensagem para todas as detecções por palavra-
+chave que antes eram feitas separadamente (handoff, edição de dados, FAQ):
+o texto é normalizado uma vez (normalizar_texto) e percorrido por um
+autômato Aho-Corasick com todas as palavras-chave. Menu e mensagens de
+controle são comparações exatas sobre o mesmo texto.
+
+O resultado traz todas as intenções que casaram, com pontuação (palavras
+das palavras-chave encontradas), e fica em cache por mensagem: BotHandler
+e ConversationFlow classificam a mesma mensagem sem repetir o trabalho.
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.bot.conversation_machine import HANDOFF_KEYWORDS, MENU_WORDS, Intent
+from app.bot.data_extractor import UPDATE_KEYWORDS
+from app.bot.faq_knowledge import FAQ_TOPICS, best_topic, compile_keyword_weights, normalizar_texto
+from app.utils.aho_corasick import AhoCorasick
+
+# Mensagens de controle (menu/confirmação): não passam pela extração
+CONTROL_WORDS = frozenset(['0', '1', '2', '3', 'sim', 'nao', 'não'])
+
+
+class MessageIntents(NamedTuple):
+    """Intenções de uma mensagem (compartilhado pelo cache: não alterar)"""
+    text: str                               # minúsculas, sem espaços nas pontas
+    normalized: str                         # normalizar_texto
+    handoff: bool
+    update: bool
+    menu: bool
+    control: bool
+    faq_topic: Optional[dict]               # mesmo critério de find_topic_by_message
+    scores: Tuple[Tuple[str, int], ...]     # (intenção, pontuação), maior primeiro
+    faq_scores: Tuple[Tuple[str, int], ...]  # (topic_id, pontuação), maior primeiro
+
+
+class IntentClassifier:
+    """
+    Palavras-chave de handoff, edição e FAQ em um só autômato
+
+    As palavras-chave são normalizadas como a mensagem; cada uma vale o
+    número de palavras que tem (como no FAQ) e conta uma vez por mensagem.
+    """
+
+    def __init__(self, faq_topics: Dict = FAQ_TOPICS, cache_size: int = 4096):
+        """
+        Args:
+            faq_topics: Tópicos do FAQ (palavras_chave)
+            cache_size: Mensagens classificadas mantidas em cache (0 desativa)
+        """
+        self.faq_topics = faq_topics
+
+        # padrão normalizado -> {alvo: pontuação}; alvo é uma intenção ou (Intent.FAQ, topic_id)
+        self._targets: Dict[str, Dict] = {}
+        for keyword in HANDOFF_KEYWORDS:
+            self._add(keyword, Intent.HANDOFF)
+        for keyword in UPDATE_KEYWORDS:
+            self._add(keyword, Intent.UPDATE)
+        # Mesmos pesos do índice do FAQ (faq_knowledge.find_topic_by_message)
+        for pattern, topic_weights in compile_keyword_weights(faq_topics).items():
+            weights = self._targets.setdefault(pattern, {})
+            for topic_id, weight in topic_weights.items():
+                weights[(Intent.FAQ, topic_id)] = weight
+
+        self._automaton = AhoCorasick()
+        for pattern in self._targets:
+            self._automaton.add(pattern, pattern)
+        self._automaton.build()
+
+        self.classify = lru_cache(maxsize=cache_size)(self._classify) if cache_size else self._classify
+
+    def _add(self, keyword: str, target):
+        pattern = normalizar_texto(keyword)
+        if not pattern:
+            return
+        weights = self._targets.setdefault(pattern, {})
+        weights[target] = weights.get(target, 0) + len(pattern.split())
+
+    def _classify(self, message: str) -> MessageIntents:
+        """
+        Classifica a mensagem
+
+        Returns:
+            MessageIntents com todas as intenções encontradas
+        """
+        text = (message or "").lower().strip()
+        normalized = normalizar_texto(message)
+
+        scores: Dict[str, int] = {}
+        faq_scores: Dict[str, int] = {}
+        for pattern in self._automaton.find(normalized):
+            for target, weight in self._targets[pattern].items():
+                if isinstance(target, tuple):
+                    faq_scores[target[1]] = faq_scores.get(target[1], 0) + weight
+                else:
+                    scores[target] = scores.get(target, 0) + weight
+
+        faq_topic = best_topic(faq_scores, self.faq_topics) if faq_scores else None
+        if faq_topic is not None:
+            scores[Intent.FAQ] = max(faq_scores.values())
+
+        menu = text in MENU_WORDS
+        control = text in CONTROL_WORDS
+        if menu:
+            scores[Intent.MENU] = 1
+        if control:
+            scores[Intent.CONTROL] = 1
+
+        return MessageIntents(
+            text=text,
+            normalized=normalized,
+            handoff=Intent.HANDOFF in scores,
+            update=Intent.UPDATE in scores,
+            menu=menu,
+            control=control,
+            faq_topic=faq_topic,
+            scores=tuple(sorted(scores.items(), key=lambda item: -item[1])),
+            faq_scores=tuple(sorted(faq_scores.items(), key=lambda item: -item[1]))
+        )
+
+    def stats(self) -> Dict:
+        stats = {"patterns": self._automaton.patterns}
+        if hasattr(self.classify, "cache_info"):
+            info = self.classify.cache_info()
+            stats.update(cache_hits=info.hits, cache_misses=info.misses, cached=info.currsize)
+        return stats
+
+
+# Instância global
+intent_classifier = IntentClassifier(cache_size=int(os.getenv('INTENT_CACHE_SIZE', '4096')))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Agrupamento de Rajadas de Mensagens
+Junta as mensagens rápidas de um mesmo telefone em um único processamento
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MessageCoalescer:
+    """
+    Janela de agrupamento (debounce) por telefone
+
+    Enquanto o cliente continua digitando, as mensagens ficam no buffer.
+    O buffer é liberado quando passa `window` segundos sem mensagem nova
+    ou quando a primeira mensagem já esperou `max_wait` segundos.
+    Uma única thread controla todos os prazos.
+
+    Cada telefone tem uma fila de jobs: rajadas de dados e mensagens de
+    controle (menu, "sim"...), que são sempre um job separado. As mensagens
+    já foram confirmadas ao UltraMsg (200), que não reenvia: se o callback
+    não conseguir enfileirar (shard cheio), o job fica na frente da fila e
+    é tentado de novo a cada `retry_delay` segundos, com os seguintes
+    esperando atrás dele. Só depois de `max_retries` tentativas ele é
+    descartado, e `on_drop` recebe os ids (para a deduplicação esquecê-los).
+    """
+
+    def __init__(self, flush_callback: Callable[[str, List[str]], bool],
+                 window: float = 0.0, max_wait: float = 5.0,
+                 retry_delay: float = 1.0, max_retries: int = 30,
+                 on_drop: Optional[Callable[[str, List[str]], None]] = None):
+        """
+        Args:
+            flush_callback: Recebe (telefone, mensagens) e retorna False se não conseguiu enfileirar
+            window: Segundos de silêncio para liberar o buffer (0 desativa)
+            max_wait: Tempo máximo que a primeira mensagem fica no buffer
+            retry_delay: Espera entre tentativas quando o callback recusa
+            max_retries: Tentativas antes de descartar a rajada
+            on_drop: Recebe (telefone, ids das mensagens) de uma rajada descartada
+        """
+        self.flush_callback = flush_callback
+        self.window = window
+        self.max_wait = max(max_wait, window)
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.on_drop = on_drop
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def add(self, phone: str, message: str, bufferable: bool = True, message_id: Optional[str] = None):
+        """
+        Adiciona uma mensagem
+
+        Args:
+            phone: Telefone do cliente
+            message: Texto recebido
+            bufferable: False para mensagens de controle (menu, confirmação),
+                que liberam o buffer e seguem imediatamente, na ordem, sempre
+                como um job separado (nunca juntas com os dados)
+            message_id: Id do UltraMsg (devolvido em on_drop se a mensagem for descartada)
+        """
+        now = time.monotonic()
+        with self._cond:
+            queue = self._pending.setdefault(phone, [])
+            if not self.enabled or not bufferable:
+                # Mensagem de controle: libera o que estava pendente antes dela
+                queue.append(self._entry(now, [message], [message_id], control=True))
+                self._drain(phone, now, force=True)
+                return
+
+            if queue and not queue[-1]["control"]:
+                pending = queue[-1]
+            else:
+                pending = self._entry(now, [], [])
+                queue.append(pending)
+            pending["messages"].append(message)
+            pending["ids"].append(message_id)
+            if not pending["attempts"]:
+                pending["deadline"] = min(now + self.window, pending["first"] + self.max_wait)
+            metrics.incr("webhook.coalesce.buffered")
+            self._ensure_thread()
+            self._cond.notify()
+
+    @staticmethod
+    def _entry(now: float, messages: List[str], ids: List[Optional[str]], control: bool = False) -> Dict:
+        return {"first": now, "deadline": now, "messages": messages, "ids": ids,
+                "attempts": 0, "control": control}
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="message-coalescer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [phone for phone, queue in self._pending.items() if queue[0]["deadline"] <= now]
+
+                if not due:
+                    timeout = None
+                    if self._pending:
+                        timeout = min(queue[0]["deadline"] for queue in self._pending.values()) - now
+                    self._cond.wait(timeout)
+                    continue
+
+                for phone in due:
+                    self._drain(phone, now)
+
+    def _drain(self, phone: str, now: float, force: bool = False):
+        """
+        Libera os jobs do telefone em ordem (chamado sob o lock)
+
+        Para no primeiro que o callback recusar (ele volta a ser tentado
+        depois de retry_delay) ou numa rajada ainda dentro da janela. Com
+        force=True (chegou mensagem de controle) as rajadas saem antes do prazo.
+        """
+        queue = self._pending.get(phone, [])
+        while queue:
+            entry = queue[0]
+            if entry["attempts"] and entry["deadline"] > now:
+                break
+            if not (force or entry["control"] or entry["deadline"] <= now):
+                break
+            if not self._flush(phone, entry):
+                break
+            queue.pop(0)
+        if queue:
+            self._ensure_thread()
+            self._cond.notify()
+        else:
+            self._pending.pop(phone, None)
+
+    def _flush(self, phone: str, pending: Dict) -> bool:
+        """
+        Entrega as mensagens de um job ao callback
+
+        Returns:
+            False se o job continua na fila (nova tentativa em retry_delay)
+        """
+        messages = pending["messages"]
+        if not pending["attempts"]:
+            metrics.incr("webhook.coalesce.flushes")
+            if len(messages) > 1:
+                metrics.incr("webhook.coalesce.messages_merged", len(messages) - 1)
+                logger.info(f"Agrupando {len(messages)} mensagens de {phone}")
+        try:
+            if self.flush_callback(phone, messages):
+                return True
+        except Exception as e:
+            logger.error(f"Erro ao liberar mensagens de {phone}: {str(e)}", exc_info=True)
+
+        pending["attempts"] += 1
+        if pending["attempts"] > self.max_retries:
+            metrics.incr("webhook.coalesce.dropped", len(messages))
+            logger.error(f"Descartando {len(messages)} mensagens de {phone} após "
+                         f"{self.max_retries} tentativas de enfileirar")
+            if self.on_drop:
+                self.on_drop(phone, [message_id for message_id in pending["ids"] if message_id])
+            return True
+
+        # Continua na frente da fila do telefone; o que chegou depois espera atrás
+        metrics.incr("webhook.coalesce.retries")
+        pending["deadline"] = time.monotonic() + self.retry_delay
+        return False
+
+    def stats(self) -> Dict:
+        """Retorna o estado do agrupamento"""
+        with self._cond:
+            pending = sum(len(entry["messages"]) for queue in self._pending.values() for entry in queue)
+            phones = len(self._pending)
+            retrying = sum(1 for queue in self._pending.values() if queue[0]["attempts"])
+        return {
+            "window": self.window,
+            "max_wait": self.max_wait,
+            "pending_phones": phones,
+            "pending_messages": pending,
+            "retrying_phones": retrying
+        }
+
+
+COALESCE_WINDOW = float(os.getenv('WEBHOOK_COALESCE_WINDOW', '0'))
+COALESCE_MAX_WAIT = float(os.getenv('WEBHOOK_COALESCE_MAX_WAIT', '5'))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Deduplicação de Webhooks
+Descarta reentregas do UltraMsg pelo id da mensagem antes de qualquer processamento
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDeduplicator:
+    """
+    Cache de ids já vistos com TTL
+
+    Camada local (OrderedDict por ordem de chegada, limitada em tamanho) e
+    camada compartilhada opcional em uma collection MongoDB com índice TTL,
+    para que todos os workers do gunicorn concordem sobre o que já foi visto.
+    """
+
+    def __init__(self, ttl_seconds: int = 600, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.shared_collection = None
+
+    def attach_shared(self, collection):
+        """
+        Ativa a camada compartilhada
+
+        Args:
+            collection: Collection MongoDB usada para registrar os ids
+        """
+        try:
+            collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            self.shared_collection = collection
+            logger.info("Deduplicação compartilhada ativada (MongoDB)")
+        except Exception as e:
+            logger.warning(f"Erro ao ativar deduplicação compartilhada: {str(e)}")
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """
+        Verifica e registra o id da mensagem
+
+        Returns:
+            bool: True se o id já foi visto dentro do TTL
+        """
+        if not message_id:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            if message_id in self._seen:
+                metrics.incr("webhook.dedup.hits")
+                metrics.incr("webhook.dedup.local_hits")
+                return True
+            self._seen[message_id] = now + self.ttl_seconds
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+
+        if self.shared_collection is not None and self._seen_shared(message_id):
+            metrics.incr("webhook.dedup.hits")
+            metrics.incr("webhook.dedup.shared_hits")
+            return True
+
+        metrics.incr("webhook.dedup.misses")
+        return False
+
+    def forget(self, message_id: str):
+        """Remove o id (ex: webhook recusado, o UltraMsg vai reenviar)"""
+        if not message_id:
+            return
+        with self._lock:
+            self._seen.pop(message_id, None)
+        if self.shared_collection is not None:
+            try:
+                self.shared_collection.delete_one({"_id": message_id})
+            except Exception as e:
+                logger.warning(f"Erro ao remover id da deduplicação: {str(e)}")
+
+    def _seen_shared(self, message_id: str) -> bool:
+        try:
+            from pymongo.errors import DuplicateKeyError
+        except ImportError:
+            return False
+
+        try:
+            self.shared_collection.insert_one({"_id": message_id, "created_at": datetime.utcnow()})
+            return False
+        except DuplicateKeyError:
+            return True
+        except Exception as e:
+            # Falha aberta: na dúvida, processa a mensagem
+            logger.warning(f"Erro na deduplicação compartilhada: {str(e)}")
+            return False
+
+    def _purge(self, now: float):
+        while self._seen:
+            expires_at = next(iter(self._seen.values()))
+            if expires_at > now:
+                break
+            self._seen.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Retorna contadores e taxa de acerto"""
+        hits = metrics.counter("webhook.dedup.hits")
+        misses = metrics.counter("webhook.dedup.misses")
+        total = hits + misses
+        return {
+            "entries": len(self._seen),
+            "shared": self.shared_collection is not None,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0
+        }
+
+
+# Instância global do deduplicador
+message_deduplicator = MessageDeduplicator(
+    ttl_seconds=int(os.getenv('WEBHOOK_DEDUP_TTL', '600')),
+    max_entries=int(os.getenv('WEBHOOK_DEDUP_MAX_ENTRIES', '50000'))
+)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Dispatcher de Mensagens do Webhook
+Filas particionadas por telefone: ordem garantida por cliente, paralelismo entre clientes
+"""
+
+import os
+import time
+import zlib
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Decisões de admissão
+ADMIT = "admit"
+DEGRADE = "degrade"
+REJECT = "reject"
+
+
+class MessageDispatcher:
+    """
+    Executa o processamento das mensagens em shards.
+
+    Cada telefone é mapeado (crc32) para um shard fixo com uma fila limitada
+    e um único worker: mensagens do mesmo cliente são processadas em ordem,
+    uma de cada vez, enquanto clientes diferentes rodam em paralelo.
+    As filas são do processo: a ordem vale dentro de um worker do gunicorn.
+    Com `--workers 2` dois webhooks do mesmo telefone podem cair em workers
+    diferentes e rodar ao mesmo tempo; aí quem protege a conversa é a versão
+    otimista do store compartilhado (SESSION_STORE=sqlite/mongo), que relê
+    e reaplica a alteração, mas não garante a ordem de chegada.
+
+    Controle de admissão: acima de `soft_limit` jobs no shard a política
+    de sobrecarga decide entre recusar ("reject") ou aceitar em modo
+    degradado ("degrade", extração só por regex). Com o shard cheio o
+    job é sempre recusado.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 200,
+                 soft_limit: int = 0, overload_policy: str = REJECT):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        # Capacidade total dividida entre os shards
+        self.shard_queue_size = max(1, -(-self.queue_size // self.workers))
+        self.soft_limit = soft_limit
+        self.overload_policy = overload_policy if overload_policy in (REJECT, DEGRADE) else REJECT
+        self._queues = [queue.Queue(maxsize=self.shard_queue_size) for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._started = False
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.degraded = 0
+
+    def start(self):
+        """Inicia um worker por shard (chamado sob demanda no primeiro submit)"""
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    args=(self._queues[i],),
+                    name=f"message-dispatcher-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._started = True
+            logger.info(
+                f"MessageDispatcher iniciado com {self.workers} shards "
+                f"(fila={self.shard_queue_size} por shard)"
+            )
+
+    def shard_for(self, key: str) -> int:
+        """Retorna o shard do telefone"""
+        return zlib.crc32(key.encode('utf-8')) % self.workers
+
+    def submit(self, key: str, func: Callable, *args, **kwargs) -> Optional[Future]:
+        """
+        Enfileira um job no shard do telefone sem bloquear
+
+        Args:
+            key: Telefone (define o shard e a ordem de execução)
+            func: Função a executar
+
+        Returns:
+            Future com o resultado, ou None se a fila do shard estiver cheia
+        """
+        if not self._started:
+            self.start()
+
+        future = Future()
+        try:
+            self._queues[self.shard_for(key)].put_nowait((future, time.monotonic(), func, args, kwargs))
+            metrics.set_gauge("webhook.queue.depth", self.depth())
+            return future
+        except queue.Full:
+            self._record_shed(key)
+            return None
+
+    def admission(self, key: str) -> str:
+        """
+        Decide se um novo job do telefone pode entrar
+
+        Returns:
+            str: ADMIT, DEGRADE ou REJECT
+        """
+        depth = self._queues[self.shard_for(key)].qsize()
+
+        if depth >= self.shard_queue_size:
+            self._record_shed(key)
+            return REJECT
+
+        if self.soft_limit and depth >= self.soft_limit:
+            if self.overload_policy == DEGRADE:
+                with self._lock:
+                    self.degraded += 1
+                metrics.incr("webhook.degraded")
+                return DEGRADE
+            self._record_shed(key)
+            return REJECT
+
+        return ADMIT
+
+    def depth(self) -> int:
+        """Total de jobs aguardando em todos os shards"""
+        return sum(q.qsize() for q in self._queues)
+
+    def _record_shed(self, key: str):
+        with self._lock:
+            self.rejected += 1
+        metrics.incr("webhook.shed")
+        logger.warning(f"Shard {self.shard_for(key)} sobrecarregado, job recusado para {key}")
+
+    def _worker_loop(self, shard_queue: queue.Queue):
+        while True:
+            future, enqueued_at, func, args, kwargs = shard_queue.get()
+            metrics.observe("webhook.queue.wait_seconds", time.monotonic() - enqueued_at)
+            metrics.set_gauge("webhook.queue.depth", self.depth())
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(func(*args, **kwargs))
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Erro no job do dispatcher: {str(e)}", exc_info=True)
+            finally:
+                shard_queue.task_done()
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas das filas"""
+        depths = [q.qsize() for q in self._queues]
+        return {
+            "shards": self.workers,
+            "queue_size": self.queue_size,
+            "queue_depth": sum(depths),
+            "shard_depths": depths,
+            "soft_limit": self.soft_limit,
+            "overload_policy": self.overload_policy,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "degraded": self.degraded
+        }
+
+
+# Instância global do dispatcher
+message_dispatcher = MessageDispatcher(
+    workers=int(os.getenv('WEBHOOK_WORKERS', '4')),
+    queue_size=int(os.getenv('WEBHOOK_QUEUE_SIZE', '200')),
+    soft_limit=int(os.getenv('WEBHOOK_QUEUE_SOFT_LIMIT', '0')),
+    overload_policy=os.getenv('WEBHOOK_OVERLOAD_POLICY', REJECT).lower()
+)
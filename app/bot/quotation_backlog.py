@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Cotações Adiadas
+Com a SwissRe indisponível (circuito aberto), a confirmação do cliente é
+registrada aqui e a cotação é refeita quando o circuito voltar a aceitar chamadas
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from app.utils.circuit_breaker import swissre_breaker
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QuotationBacklog:
+    """
+    Fila de cotações pendentes (uma por telefone, em ordem de chegada)
+
+    Um worker em background verifica `is_available` e, quando a dependência
+    volta, executa `run(phone, data)` de cada pendência. Com um executor
+    configurado (ex: message_dispatcher.submit) a execução vai para o shard
+    do telefone, mantendo a ordem com as mensagens do cliente.
+    """
+
+    def __init__(self, is_available: Callable[[], bool], poll_interval: float = 5.0):
+        self.is_available = is_available
+        self.poll_interval = poll_interval
+        self.executor: Optional[Callable] = None
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._worker = None
+        self.completed = 0
+
+    def set_executor(self, executor: Callable):
+        """Executor no formato submit(chave, func, *args)"""
+        self.executor = executor
+
+    def add(self, phone: str, data: Dict, run: Callable[[str, Dict], None]):
+        """Registra (ou atualiza) a cotação pendente do telefone"""
+        with self._cond:
+            self._pending[phone] = (dict(data), run, time.time())
+            metrics.set_gauge("quotations.deferred", len(self._pending))
+            self._start()
+            self._cond.notify()
+        logger.info(f"Cotação de {phone} adiada (SwissRe indisponível)")
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "oldest_seconds": round(time.time() - next(iter(self._pending.values()))[2], 1)
+                if self._pending else 0,
+                "completed": self.completed
+            }
+
+    def _start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="quotation-backlog", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+            if not self.is_available():
+                time.sleep(self.poll_interval)
+                continue
+
+            with self._cond:
+                phone, (data, run, _) = self._pending.popitem(last=False)
+                metrics.set_gauge("quotations.deferred", len(self._pending))
+
+            try:
+                if self.executor:
+                    future = self.executor(phone, run, phone, data)
+                    if future is None:
+                        # Shard cheio: devolve para a fila e tenta depois
+                        with self._cond:
+                            self._pending[phone] = (data, run, time.time())
+                        time.sleep(self.poll_interval)
+                        continue
+                    future.result()
+                else:
+                    run(phone, data)
+                self.completed += 1
+            except Exception as e:
+                logger.error(f"Erro ao executar cotação adiada de {phone}: {str(e)}", exc_info=True)
+
+
+# Instância global (cotações esperando a SwissRe)
+quotation_backlog = QuotationBacklog(lambda: swissre_breaker.available)
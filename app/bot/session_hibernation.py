@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Hibernação de Sessões Ociosas
+Sessões do backend em memória paradas há mais de SESSION_HIBERNATE_AFTER
+segundos (ex: "vou ver os dados do cavalo e já volto") saem da RAM para
+um arquivo SQLite local e voltam na próxima leitura do telefone: o
+conjunto quente fica em memória e a cauda longa custa só disco
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from app.bot.conversation_session import ConversationSession
+from app.bot.session_store import MemorySessionStore, SQLiteSessionStore
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SessionHibernator:
+    """
+    Camada fria do MemorySessionStore
+
+    `hibernate_idle()` grava as sessões ociosas no SQLite e só então as
+    remove da memória (se não mudaram no meio); `rehydrate(phone)` é
+    registrado como loader do store e devolve a sessão para a memória na
+    próxima leitura, sob lock, para duas mensagens simultâneas do mesmo
+    telefone não criarem sessões diferentes.
+    """
+
+    def __init__(self, db_path: str, idle_after: float = 300):
+        """
+        Args:
+            db_path: Arquivo SQLite das sessões hibernadas
+            idle_after: Segundos sem interação até a sessão sair da memória
+        """
+        self.cold = SQLiteSessionStore(db_path)
+        self.idle_after = idle_after
+        self.store = None
+        self._lock = threading.Lock()
+        self.hibernated = 0
+        self.rehydrated = 0
+
+    def attach(self, store) -> bool:
+        """Liga a hibernação ao store (só o backend em memória)"""
+        if not isinstance(store, MemorySessionStore):
+            logger.info(f"Hibernação de sessões desativada (backend '{store.name}' não fica em memória)")
+            return False
+        self.store = store
+        store.add_loader(self.rehydrate)
+        return True
+
+    def hibernate_idle(self, now: Optional[float] = None) -> int:
+        """
+        Move para o disco as sessões sem interação há mais de idle_after
+
+        Returns:
+            Quantidade de sessões hibernadas
+        """
+        if self.store is None:
+            return 0
+        before = (now or time.time()) - self.idle_after
+        moved = 0
+        for phone, version, session in self.store.idle_entries(before):
+            with self._lock:
+                # Disco primeiro: a sessão nunca fica fora dos dois lugares
+                self.cold.delete(phone)
+                self.cold.save(phone, session, 0)
+                if self.store.remove_if_unchanged(phone, version):
+                    moved += 1
+                else:
+                    # Mensagem chegou no meio: a versão em memória é a que vale
+                    self.cold.delete(phone)
+
+        if moved:
+            self.hibernated += moved
+            metrics.incr("sessions.hibernated", moved)
+            logger.info(f"{moved} sessões ociosas hibernadas em disco")
+        return moved
+
+    def rehydrate(self, phone: str) -> Optional[ConversationSession]:
+        """Loader do store: devolve a sessão hibernada para a memória"""
+        started = time.perf_counter()
+        with self._lock:
+            session, _ = self.cold.load(phone)
+            if session is None:
+                return None
+            self.store.save(phone, session, 0)
+            self.cold.delete(phone)
+            self.rehydrated += 1
+
+        metrics.incr("sessions.rehydrated")
+        metrics.observe("sessions.rehydrate_seconds", time.perf_counter() - started)
+        # Já instalada no store: o load relê de lá
+        return None
+
+    def purge_idle(self, default_before: float, before_by_state: Optional[Dict[str, float]] = None) -> int:
+        """Expira também as sessões hibernadas (mesmos limites do store)"""
+        return self.cold.purge_idle(default_before, before_by_state)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.store is not None,
+            "idle_after": self.idle_after,
+            "on_disk": len(self.cold),
+            "hibernated": self.hibernated,
+            "rehydrated": self.rehydrated
+        }
+
+
+SESSION_HIBERNATE_PATH = os.getenv('SESSION_HIBERNATE_PATH', '')
+
+# Instância global (None sem SESSION_HIBERNATE_PATH)
+session_hibernator = SessionHibernator(
+    db_path=SESSION_HIBERNATE_PATH,
+    idle_after=float(os.getenv('SESSION_HIBERNATE_AFTER', '300'))
+) if SESSION_HIBERNATE_PATH else None
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+Diário de Eventos das Conversas
+Cada gravação de sessão no store em memória vira um evento compacto (só o
+que mudou) anexado a um arquivo local append-only, uma linha JSON por
+evento. O estado é reconstruído por replay (snapshot + eventos), a
+compactação periódica grava um snapshot binário a partir de um segmento
+fechado do diário, e o mesmo arquivo serve para análise (iter_events) sem
+consultar o banco.
+
+Evento: {"p": telefone, "t": epoch, ...} com as chaves que mudaram:
+    f: sessão inteira (nova ou de volta de um loader, ex: hibernação)
+    x: sessão removida (expirada, descartada pelo LRU ou hibernada)
+    r: conversa reiniciada (histórico mantido)
+    s: estado               d: {campo: valor} (None = removido)
+    c: campo em edição      m: message_count
+    q: [posição, cotação]   (histórico de cotações)
+
+Todos os eventos gravam valores absolutos: repetir o replay de um trecho
+sobre um snapshot mais novo chega ao mesmo estado, então uma queda entre
+o snapshot e a remoção do segmento compactado não corrompe nada.
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.session_snapshot import SnapshotError, decode_record, read_snapshot, write_snapshot
+from app.bot.session_store import MemorySessionStore
+from app.utils.metrics import metrics
+from app.utils.process_lock import try_lock_file
+
+logger = logging.getLogger(__name__)
+
+
+def session_event(phone: str, before: Optional[ConversationSession],
+                  after: Optional[ConversationSession]) -> Optional[Dict]:
+    """
+    Evento com as diferenças entre duas versões da sessão
+
+    Args:
+        before: Versão anterior (None = sessão nova)
+        after: Versão nova (None = sessão removida)
+
+    Returns:
+        Evento ou None se nada mudou
+    """
+    if after is None:
+        return {"p": phone, "t": int(time.time()), "x": 1}
+    if before is None:
+        return {"p": phone, "t": after.last_interaction, "f": after.to_dict()}
+
+    event = {}
+    if after.created_at != before.created_at:
+        # ConversationSession.reset recria a sessão com o mesmo histórico
+        event["r"] = 1
+        before = ConversationSession(cotacoes_realizadas=before.cotacoes_realizadas)
+
+    if after.state != before.state:
+        event["s"] = after.state.value
+
+    old_data = before.data.to_dict()
+    new_data = after.data.to_dict()
+    changed = {key: value for key, value in new_data.items() if old_data.get(key) != value}
+    changed.update({key: None for key in old_data if key not in new_data})
+    if changed:
+        event["d"] = changed
+
+    if after.campo_edicao != before.campo_edicao:
+        event["c"] = after.campo_edicao
+    if after.message_count != before.message_count:
+        event["m"] = after.message_count
+
+    old_cotacoes = before.cotacoes_realizadas or []
+    new_cotacoes = after.cotacoes_realizadas or []
+    if len(new_cotacoes) > len(old_cotacoes):
+        event["q"] = [len(new_cotacoes) - 1, new_cotacoes[-1]]
+
+    if not event and after.last_interaction == before.last_interaction:
+        return None
+    event["p"] = phone
+    event["t"] = after.last_interaction
+    return event
+
+
+def apply_event(sessions: Dict[str, ConversationSession], event: Dict):
+    """Aplica um evento sobre o estado reconstruído (replay)"""
+    phone = event["p"]
+    if "x" in event:
+        sessions.pop(phone, None)
+        return
+    if "f" in event:
+        sessions[phone] = ConversationSession.from_dict(event["f"])
+        return
+
+    session = sessions.get(phone)
+    if session is None:
+        session = ConversationSession()
+        session.created_at = event["t"]
+        sessions[phone] = session
+    elif "r" in event:
+        session.reset()
+        session.created_at = event["t"]
+
+    if "s" in event:
+        session.state = ConversationState(event["s"])
+    if "d" in event:
+        for key, value in event["d"].items():
+            if value is None and session.data.extra and key in session.data.extra:
+                del session.data.extra[key]
+            else:
+                session.data[key] = value
+    if "c" in event:
+        session.campo_edicao = event["c"]
+    if "m" in event:
+        session.message_count = event["m"]
+    if "q" in event:
+        position, cotacao = event["q"]
+        cotacoes = session.cotacoes_realizadas or []
+        del cotacoes[position:]
+        cotacoes.append(cotacao)
+        session.cotacoes_realizadas = cotacoes
+    session.last_interaction = event["t"]
+
+
+def iter_events(path: str) -> Iterator[Dict]:
+    """Eventos do diário em ordem (uma linha incompleta no fim, de uma queda, é ignorada)"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"Evento inválido ignorado no diário {path}")
+
+
+class SessionJournal:
+    """
+    Diário append-only das sessões do backend em memória
+
+    record() é listener do MemorySessionStore: roda sob o lock do store e
+    só enfileira a mudança (as sessões guardadas nunca são alteradas no
+    lugar), então os eventos ficam na ordem das gravações sem que o store
+    espere pelo disco. Uma thread monta os eventos e grava em lote. A
+    cada `compact_every` eventos o diário atual vira um segmento fechado
+    (`<path>.compacting`) e um arquivo novo passa a receber os eventos; uma
+    thread reconstrói o estado (snapshot + segmento), grava o snapshot
+    (`<path>.snapshot`) e apaga o segmento, sem segurar record().
+    """
+
+    def __init__(self, path: str, compact_every: int = 50000, retention: float = 86400):
+        """
+        Args:
+            path: Arquivo do diário
+            compact_every: Eventos entre compactações (0 desativa)
+            retention: Sessões sem interação há mais que isso (segundos) saem na compactação
+        """
+        self.path = path
+        self.snapshot_path = f"{path}.snapshot"
+        self.segment_path = f"{path}.compacting"
+        self.compact_every = compact_every
+        self.retention = retention
+        self.store = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._writing = False
+        self._writer = None
+        self._file = None
+        self._owner_lock = None
+        self._pending = 0
+        self._compacting = False
+        self.appended = 0
+        self.compactions = 0
+
+    def attach(self, store) -> bool:
+        """Restaura no store o estado do diário e passa a registrar (só o backend em memória)"""
+        if not isinstance(store, MemorySessionStore):
+            logger.info(f"Diário de sessões desativado (backend '{store.name}' já é persistente)")
+            return False
+        # Um processo por diário: a compactação troca o arquivo que os outros estariam usando
+        self._owner_lock = try_lock_file(self.path)
+        if self._owner_lock is None:
+            logger.warning(f"Diário de sessões desativado neste worker: outro processo já usa "
+                           f"{self.path} (backend memory com mais de um worker; use SESSION_STORE=sqlite)")
+            return False
+        started = time.perf_counter()
+        sessions = self.replay()
+        installed = store.install(list(sessions.items()))
+        store.add_listener(self.record)
+        self.store = store
+        atexit.register(self.flush, 5)
+        if sessions:
+            logger.info(f"{installed} sessões reconstruídas do diário em {time.perf_counter() - started:.2f}s")
+        return True
+
+    def record(self, phone: str, before: Optional[ConversationSession], after: Optional[ConversationSession]):
+        """Enfileira a mudança da sessão para o diário (after=None: sessão removida)"""
+        with self._cond:
+            self._queue.append((phone, before, after))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="session-journal-writer", daemon=True)
+                self._writer.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a gravação do que já foi enfileirado
+
+        Returns:
+            False se o tempo acabou antes
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._writing, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                batch = list(self._queue)
+                self._queue.clear()
+                self._writing = True
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Erro ao gravar no diário de sessões: {str(e)}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _write(self, batch):
+        """Anexa ao diário os eventos de um lote de mudanças"""
+        lines = []
+        for phone, before, after in batch:
+            event = session_event(phone, before, after)
+            if event is not None:
+                lines.append(json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+        if not lines:
+            return
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write("".join(lines))
+                self._file.flush()
+            except OSError as e:
+                # As sessões já foram gravadas no store: perdem-se só os eventos
+                logger.error(f"Erro ao gravar no diário de sessões: {str(e)}")
+                metrics.incr("sessions.journal.errors")
+                return
+            self.appended += len(lines)
+            self._pending += len(lines)
+            compact = self.compact_every and self._pending >= self.compact_every and not self._compacting
+            if compact:
+                self._compacting = True
+        metrics.incr("sessions.journal.events", len(lines))
+        if compact:
+            threading.Thread(target=self.compact, name="session-journal-compact", daemon=True).start()
+
+    def replay(self) -> Dict[str, ConversationSession]:
+        """Estado atual: snapshot, segmento em compactação e diário atual"""
+        self.flush()
+        sessions = self._replay_segment()
+        for event in iter_events(self.path):
+            apply_event(sessions, event)
+        return sessions
+
+    def _replay_segment(self) -> Dict[str, ConversationSession]:
+        """Snapshot mais o segmento fechado (o que a compactação grava)"""
+        sessions: Dict[str, ConversationSession] = {}
+        if os.path.exists(self.snapshot_path):
+            try:
+                payload, index = read_snapshot(self.snapshot_path)
+                sessions = dict(decode_record(payload, offset) for offset in index.values())
+            except (OSError, SnapshotError) as e:
+                logger.error(f"Snapshot do diário ignorado ({self.snapshot_path}): {str(e)}")
+        for event in iter_events(self.segment_path):
+            apply_event(sessions, event)
+        return sessions
+
+    def compact(self) -> int:
+        """
+        Fecha o diário atual e grava snapshot + segmento fechado como snapshot
+
+        Só a troca de arquivo segura o lock; replay e gravação do snapshot
+        rodam com a gravação dos eventos livre para o arquivo novo.
+
+        Returns:
+            Sessões no snapshot
+        """
+        started = time.perf_counter()
+        # O que já foi gravado no store entra neste snapshot
+        self.flush()
+        with self._lock:
+            self._compacting = True
+            try:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                # Um segmento que sobrou de uma compactação interrompida é compactado antes
+                if not os.path.exists(self.segment_path) and os.path.exists(self.path):
+                    os.replace(self.path, self.segment_path)
+                    self._pending = 0
+            except OSError as e:
+                logger.error(f"Erro ao compactar diário de sessões: {str(e)}")
+                self._compacting = False
+                return 0
+
+        try:
+            sessions = self._replay_segment()
+            cutoff = time.time() - self.retention
+            kept = [(phone, session) for phone, session in sessions.items()
+                    if session.last_interaction >= cutoff]
+            write_snapshot(self.snapshot_path, kept)
+            # Depois do snapshot: se cair aqui, o replay repete eventos já aplicados (idempotente)
+            if os.path.exists(self.segment_path):
+                os.remove(self.segment_path)
+            self.compactions += 1
+        except Exception as e:
+            logger.error(f"Erro ao compactar diário de sessões: {str(e)}")
+            return 0
+        finally:
+            self._compacting = False
+
+        elapsed = time.perf_counter() - started
+        metrics.observe("sessions.journal.compact_seconds", elapsed)
+        logger.info(f"Diário de sessões compactado ({len(kept)} sessões, {elapsed:.2f}s)")
+        return len(kept)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.store is not None,
+            "appended": self.appended,
+            "queued": len(self._queue),
+            "since_compaction": self._pending,
+            "compactions": self.compactions,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+
+SESSION_JOURNAL_PATH = os.getenv('SESSION_JOURNAL_PATH', '')
+
+# Instância global (None sem SESSION_JOURNAL_PATH)
+session_journal = SessionJournal(
+    path=SESSION_JOURNAL_PATH,
+    compact_every=int(os.getenv('SESSION_JOURNAL_COMPACT_EVERY', '50000'))
+) if SESSION_JOURNAL_PATH else None
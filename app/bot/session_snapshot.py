@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot Binário das Sessões (reinício a quente)
+Grava as sessões do backend em memória em um arquivo binário versionado e
+com checksum (no SIGTERM, na saída do processo e periodicamente) e as
+restaura no próximo start:
+- o arquivo é validado e indexado no start (telefone -> posição), antes
+  das requisições; a decodificação das sessões fica para depois
+- uma mensagem de um telefone ainda não restaurado decodifica só a sessão dele
+- o restante é carregado aos poucos no store, em background
+
+As sessões do backend em memória são do processo: com mais de um worker
+só o primeiro (dono de `<path>.lock`) usa o snapshot; os demais ficam sem
+e registram um aviso (use SESSION_STORE=sqlite para vários workers).
+
+Formato (little-endian):
+    cabeçalho: magic "EQSS" | versão u16 | sessões u32 | gerado em u64 | tamanho u64 | crc32 u32
+    registro:  tamanho u32 | telefone (u16 + utf-8) | estado u8 | created_at u32 |
+               last_interaction u32 | message_count u32 | campo_edicao u8 |
+               campos presentes u8 | campos em JSON u8 | valores (u32 + utf-8) |
+               extra/histórico (u32 + JSON)
+"""
+
+import os
+import sys
+import json
+import atexit
+import signal
+import time
+import zlib
+import struct
+import logging
+import threading
+from itertools import islice
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.bot.conversation_session import (
+    ConversationSession, ConversationState, QuotationData, QUOTATION_FIELDS
+)
+from app.bot.session_store import MemorySessionStore
+from app.utils.metrics import metrics
+from app.utils.process_lock import try_lock_file
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EQSS"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<4sHIQQI")
+RECORD_SIZE = struct.Struct("<I")
+PHONE_SIZE = struct.Struct("<H")
+RECORD_FIXED = struct.Struct("<BIIIBBB")
+VALUE_SIZE = struct.Struct("<I")
+BLOB_SIZE = struct.Struct("<I")
+
+STATES = list(ConversationState)
+STATE_INDEX = {state: index for index, state in enumerate(STATES)}
+FIELD_INDEX = {field: index for index, field in enumerate(QUOTATION_FIELDS)}
+
+
+class SnapshotError(Exception):
+    """Arquivo de snapshot inválido (formato, versão ou checksum)"""
+
+
+def encode_record(phone: str, session: ConversationSession) -> bytes:
+    """Serializa uma sessão no formato binário do snapshot"""
+    phone_bytes = phone.encode("utf-8")
+    present = 0
+    as_json = 0
+    values = []
+    for index, field in enumerate(QUOTATION_FIELDS):
+        value = getattr(session.data, field)
+        if value is None:
+            continue
+        present |= 1 << index
+        if isinstance(value, str):
+            encoded = value.encode("utf-8")
+        else:
+            as_json |= 1 << index
+            encoded = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        values.append(VALUE_SIZE.pack(len(encoded)) + encoded)
+
+    blob = b""
+    if session.data.extra or session.cotacoes_realizadas:
+        blob = json.dumps(
+            {"extra": session.data.extra, "cotacoes": session.cotacoes_realizadas},
+            ensure_ascii=False, default=str
+        ).encode("utf-8")
+
+    campo = FIELD_INDEX[session.campo_edicao] + 1 if session.campo_edicao in FIELD_INDEX else 0
+    body = b"".join((
+        PHONE_SIZE.pack(len(phone_bytes)), phone_bytes,
+        RECORD_FIXED.pack(STATE_INDEX[session.state], session.created_at, session.last_interaction,
+                          session.message_count, campo, present, as_json),
+        *values,
+        BLOB_SIZE.pack(len(blob)), blob
+    ))
+    return RECORD_SIZE.pack(len(body)) + body
+
+
+def decode_record(buffer, offset: int) -> Tuple[str, ConversationSession]:
+    """Lê o registro que começa em `offset` (logo depois do tamanho)"""
+    (phone_len,) = PHONE_SIZE.unpack_from(buffer, offset)
+    offset += PHONE_SIZE.size
+    phone = str(buffer[offset:offset + phone_len], "utf-8")
+    offset += phone_len
+
+    state, created, last, count, campo, present, as_json = RECORD_FIXED.unpack_from(buffer, offset)
+    offset += RECORD_FIXED.size
+
+    # Sem passar pelos __init__: todos os slots são preenchidos aqui
+    data = QuotationData.__new__(QuotationData)
+    data.extra = None
+    for index, field in enumerate(QUOTATION_FIELDS):
+        bit = 1 << index
+        if not present & bit:
+            setattr(data, field, None)
+            continue
+        (size,) = VALUE_SIZE.unpack_from(buffer, offset)
+        offset += VALUE_SIZE.size
+        raw = str(buffer[offset:offset + size], "utf-8")
+        offset += size
+        setattr(data, field, json.loads(raw) if as_json & bit else raw)
+
+    session = ConversationSession.__new__(ConversationSession)
+    session.state = STATES[state]
+    session.data = data
+    session.created_at = created
+    session.last_interaction = last
+    session.message_count = count
+    session.campo_edicao = QUOTATION_FIELDS[campo - 1] if campo else None
+    session.cotacoes_realizadas = None
+
+    (blob_size,) = BLOB_SIZE.unpack_from(buffer, offset)
+    if blob_size:
+        offset += BLOB_SIZE.size
+        blob = json.loads(str(buffer[offset:offset + blob_size], "utf-8"))
+        data.extra = blob.get("extra") or None
+        session.cotacoes_realizadas = blob.get("cotacoes") or None
+    return phone, session
+
+
+def write_snapshot(path: str, sessions: Iterable[Tuple[str, ConversationSession]]) -> int:
+    """
+    Grava o snapshot de forma atômica (arquivo temporário + rename)
+
+    Returns:
+        Quantidade de sessões gravadas
+    """
+    started = time.perf_counter()
+    records = [encode_record(phone, session) for phone, session in sessions]
+    payload = b"".join(records)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(records), int(time.time()),
+                         len(payload), zlib.crc32(payload))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+    metrics.observe("sessions.snapshot.write_seconds", time.perf_counter() - started)
+    return len(records)
+
+
+def read_snapshot(path: str) -> Tuple[memoryview, Dict[str, int]]:
+    """
+    Valida o arquivo e indexa os registros sem decodificá-los
+
+    Returns:
+        (payload, {telefone: posição do registro})
+
+    Raises:
+        SnapshotError: magic, versão, tamanho ou checksum inválidos
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise SnapshotError("cabeçalho incompleto")
+        magic, version, count, _, size, checksum = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise SnapshotError("arquivo não é um snapshot de sessões")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"versão {version} não suportada")
+        payload = f.read()
+
+    if len(payload) != size or zlib.crc32(payload) != checksum:
+        raise SnapshotError("checksum inválido (arquivo truncado ou corrompido)")
+
+    view = memoryview(payload)
+    index = {}
+    offset = 0
+    for _ in range(count):
+        (length,) = RECORD_SIZE.unpack_from(view, offset)
+        start = offset + RECORD_SIZE.size
+        (phone_len,) = PHONE_SIZE.unpack_from(view, start)
+        phone = str(view[start + PHONE_SIZE.size:start + PHONE_SIZE.size + phone_len], "utf-8")
+        index[phone] = start
+        offset = start + length
+    return view, index
+
+
+class SnapshotRestorer:
+    """
+    Restauração preguiçosa de um snapshot para o store em memória
+
+    `load()` valida e indexa o arquivo (no start, fora das requisições);
+    `take(phone)` é registrado como loader do MemorySessionStore: uma
+    sessão ainda não restaurada é decodificada na hora em que o telefone
+    manda mensagem, sem esperar nada. Uma thread em background carrega o resto.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._payload = None
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.restored = 0
+        self.total = 0
+        self.index_seconds = 0.0
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._index)
+
+    def start(self, store):
+        """Valida/indexa o snapshot agora e restaura as sessões em background"""
+        self.load()
+        if self.total:
+            threading.Thread(target=self._run, args=(store,), name="session-restore", daemon=True).start()
+
+    def load(self) -> int:
+        """
+        Valida e indexa o arquivo (sem decodificar as sessões)
+
+        Returns:
+            Sessões no snapshot
+        """
+        started = time.perf_counter()
+        try:
+            if os.path.exists(self.path):
+                payload, index = read_snapshot(self.path)
+                with self._lock:
+                    self._payload, self._index = payload, index
+                    self.total = len(index)
+        except (OSError, SnapshotError, struct.error, UnicodeDecodeError) as e:
+            logger.error(f"Snapshot de sessões ignorado ({self.path}): {str(e)}")
+        self.index_seconds = time.perf_counter() - started
+        return self.total
+
+    def take(self, phone: str) -> Optional[ConversationSession]:
+        """Remove e decodifica a sessão do telefone (None se não estiver no snapshot)"""
+        if not self._index:
+            return None
+        with self._lock:
+            offset = self._index.pop(phone, None)
+            if offset is None:
+                return None
+            self.restored += 1
+            return decode_record(self._payload, offset)[1]
+
+    def restore_pending(self, store):
+        """Carrega no store tudo o que ainda não foi restaurado"""
+        # Quem já tem sessão nova (mensagem chegou antes) fica com ela
+        while True:
+            with self._lock:
+                # Na ordem do arquivo (menos recente primeiro), preservando a ordem do LRU
+                batch = [(phone, self._index.pop(phone)) for phone in list(islice(self._index, 1000))]
+                if not batch:
+                    self._payload = None
+                    return
+                store.install([decode_record(self._payload, offset) for _, offset in batch])
+                self.restored += len(batch)
+
+    def _run(self, store):
+        started = time.perf_counter()
+        self.restore_pending(store)
+        elapsed = self.index_seconds + time.perf_counter() - started
+        metrics.observe("sessions.snapshot.restore_seconds", elapsed)
+        logger.info(f"{self.total} sessões restauradas do snapshot em {elapsed:.2f}s "
+                    f"(indexação no start: {self.index_seconds:.2f}s)")
+
+    def stats(self) -> Dict:
+        return {"path": self.path, "total": self.total, "restored": self.restored, "pending": self.pending}
+
+
+class SessionSnapshotter:
+    """
+    Liga o snapshot ao store em memória: restaura no start e grava
+    periodicamente, na saída do processo (atexit) e no SIGTERM
+
+    Os backends sqlite/mongo já persistem sozinhos e são ignorados. Com
+    mais de um processo usando o mesmo arquivo, só o dono do lock grava
+    (cada worker tem só as próprias sessões: o último a gravar apagaria
+    as dos outros).
+    """
+
+    def __init__(self, path: str, interval: float = 300):
+        self.path = path
+        self.interval = interval
+        self.store = None
+        self.restorer = SnapshotRestorer(path)
+        self._write_lock = threading.Lock()
+        self._owner_lock = None
+        self.disabled_reason = None
+        self.last_written = 0
+        self.last_written_at = None
+
+    def start(self, store) -> bool:
+        """Restaura o snapshot no store e agenda as gravações (idempotente)"""
+        if self.store is not None:
+            return True
+        if not isinstance(store, MemorySessionStore):
+            logger.info(f"Snapshot de sessões desativado (backend '{store.name}' já é persistente)")
+            return False
+        self._owner_lock = try_lock_file(self.path)
+        if self._owner_lock is None:
+            self.disabled_reason = "outro processo já usa o snapshot"
+            logger.warning(f"Snapshot de sessões desativado neste worker: outro processo já usa "
+                           f"{self.path} (backend memory com mais de um worker; use SESSION_STORE=sqlite)")
+            return False
+
+        self.store = store
+        store.add_loader(self.restorer.take)
+        self.restorer.start(store)
+
+        if self.interval > 0:
+            threading.Thread(target=self._periodic, name="session-snapshot", daemon=True).start()
+        atexit.register(self.save)
+        self._install_sigterm()
+        return True
+
+    def save(self) -> int:
+        """Grava o snapshot agora (inclui sessões do snapshot anterior ainda não restauradas)"""
+        if self.store is None:
+            return 0
+        with self._write_lock:
+            try:
+                self.restorer.restore_pending(self.store)
+                count = write_snapshot(self.path, self.store.items())
+            except Exception as e:
+                logger.error(f"Erro ao gravar snapshot de sessões: {str(e)}")
+                return 0
+            self.last_written = count
+            self.last_written_at = time.time()
+        logger.info(f"Snapshot de sessões gravado ({count} sessões)")
+        return count
+
+    def _periodic(self):
+        while True:
+            time.sleep(self.interval)
+            self.save()
+
+    def _install_sigterm(self):
+        """Grava no SIGTERM e repassa para o handler anterior (ex: o do gunicorn)"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handler(signum, frame):
+            self.save()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                # Evita gravar de novo no atexit
+                atexit.unregister(self.save)
+                sys.exit(0)
+
+        signal.signal(signal.SIGTERM, handler)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.store is not None,
+            "disabled_reason": self.disabled_reason,
+            "restore": self.restorer.stats(),
+            "last_written": self.last_written,
+            "last_written_at": self.last_written_at
+        }
+
+
+SESSION_SNAPSHOT_PATH = os.getenv('SESSION_SNAPSHOT_PATH', '')
+
+# Instância global (None sem SESSION_SNAPSHOT_PATH)
+session_snapshotter = SessionSnapshotter(
+    path=SESSION_SNAPSHOT_PATH,
+    interval=float(os.getenv('SESSION_SNAPSHOT_INTERVAL', '300'))
+) if SESSION_SNAPSHOT_PATH else None
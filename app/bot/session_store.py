@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+"""
+Armazenamento das Sessões de Conversa
+Backends plugáveis para o estado do ConversationFlow (SESSION_STORE):
+- memory: dicionário do processo (testes / um único worker)
+- sqlite: arquivo SQLite em modo WAL compartilhado pelos workers da máquina
+- mongo:  collection MongoDB compartilhada entre máquinas
+
+Toda gravação usa versão otimista: save() só grava se a versão lida em
+load() ainda for a atual, então dois workers nunca sobrescrevem um ao
+outro em silêncio.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.bot.conversation_session import ConversationSession
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    phone TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    session TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    state TEXT,
+    last_interaction REAL
+);
+"""
+
+# Colunas adicionadas depois da primeira versão da tabela
+MIGRATIONS = {
+    "state": "ALTER TABLE sessions ADD COLUMN state TEXT",
+    "last_interaction": "ALTER TABLE sessions ADD COLUMN last_interaction REAL",
+}
+
+
+class VersionConflict(Exception):
+    """A sessão foi alterada por outro worker entre a leitura e a gravação"""
+
+    def __init__(self, phone: str):
+        super().__init__(f"Conflito de versão na sessão de {phone}")
+        self.phone = phone
+
+
+def _base_bytes(session: ConversationSession) -> int:
+    data = session.data
+    size = sys.getsizeof(session) + sys.getsizeof(data)
+    for _, value in data.items():
+        size += sys.getsizeof(value)
+    if data.extra:
+        size += sys.getsizeof(data.extra)
+    return size
+
+
+def _cotacao_bytes(cotacao: Dict) -> int:
+    return len(json.dumps(cotacao, ensure_ascii=False, default=str))
+
+
+def estimate_session_bytes(session: ConversationSession, previous: Optional[ConversationSession] = None,
+                           previous_size: int = 0) -> int:
+    """
+    Estimativa do tamanho em memória da sessão (registro, textos e histórico)
+
+    Args:
+        previous: Versão anterior da sessão, com o tamanho estimado dela
+            (previous_size). O histórico de cotações só cresce e as cópias
+            compartilham os itens: o que já foi medido não é serializado de novo.
+    """
+    size = _base_bytes(session)
+    cotacoes = session.cotacoes_realizadas
+    if not cotacoes:
+        return size
+
+    old = previous.cotacoes_realizadas if previous is not None else None
+    if old and len(old) <= len(cotacoes) and all(a is b for a, b in zip(old, cotacoes)):
+        measured = previous_size - _base_bytes(previous) - sys.getsizeof(old)
+        start = len(old)
+    else:
+        measured, start = 0, 0
+    return size + sys.getsizeof(cotacoes) + measured + sum(
+        _cotacao_bytes(cotacao) for cotacao in cotacoes[start:]
+    )
+
+
+class SessionStore:
+    """
+    Interface dos backends
+
+    load(phone) -> (sessão ou None, versão); versão 0 = sessão inexistente
+    save(phone, sessão, versão_lida) -> False em conflito de versão
+    """
+
+    name = "base"
+
+    def load(self, phone: str) -> Tuple[Optional[ConversationSession], int]:
+        raise NotImplementedError
+
+    def save(self, phone: str, session: ConversationSession, expected_version: int) -> bool:
+        raise NotImplementedError
+
+    def delete(self, phone: str):
+        raise NotImplementedError
+
+    def phones(self) -> List[str]:
+        raise NotImplementedError
+
+    def purge_idle(self, default_before: float, before_by_state: Optional[Dict[str, float]] = None) -> int:
+        """
+        Remove sessões sem interação desde `default_before` (epoch)
+
+        Args:
+            before_by_state: Limite próprio por estado (valor do enum -> epoch)
+
+        Returns:
+            Quantidade de sessões removidas
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        for phone in self.phones():
+            self.delete(phone)
+
+    def __contains__(self, phone: str) -> bool:
+        return self.load(phone)[0] is not None
+
+    def __len__(self) -> int:
+        return len(self.phones())
+
+    def estimated_bytes(self) -> int:
+        return 0
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, "sessions": len(self), "estimated_bytes": self.estimated_bytes()}
+
+    def publish_gauges(self):
+        metrics.set_gauge("sessions.live", len(self))
+        metrics.set_gauge("sessions.bytes", self.estimated_bytes())
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessões no próprio processo (padrão; não compartilha entre workers)
+
+    Com max_entries > 0 a sessão usada há mais tempo é descartada quando o
+    limite é atingido (LRU); o tamanho estimado de cada sessão é mantido
+    junto para o gauge sessions.bytes. As versões vêm de um contador do
+    store: uma sessão removida e criada de novo nunca repete uma versão
+    já lida (quem leu a antiga não grava nem remove a nova).
+
+    Listeners (add_listener) são avisados de cada gravação e remoção (clear
+    incluído) ainda sob o lock do store, na mesma ordem em que elas
+    acontecem; devem ser rápidos (sem I/O), pois seguram o store.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 0):
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[str, Tuple[int, ConversationSession, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.loaders: List[Callable[[str], Optional[ConversationSession]]] = []
+        self.listeners: List[Callable[[str, Optional[ConversationSession], Optional[ConversationSession]], None]] = []
+
+    def add_listener(self, listener: Callable[[str, Optional[ConversationSession], Optional[ConversationSession]], None]):
+        """
+        Recebe (telefone, antes, depois) a cada mudança (ex: diário de eventos)
+
+        antes=None: sessão nova (ou vinda de um loader); depois=None: sessão
+        removida (expirada, descartada pelo LRU ou hibernada). É chamado com
+        o lock do store seguro: precisa ser rápido e não pode usar o store.
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, phone: str, before: Optional[ConversationSession], after: Optional[ConversationSession]):
+        for listener in self.listeners:
+            listener(phone, before, after)
+
+    def _evict_locked(self) -> int:
+        """Descarta as sessões usadas há mais tempo acima de max_entries (com o lock seguro)"""
+        evicted = 0
+        while self.max_entries and len(self._sessions) > self.max_entries:
+            phone, (_, old_session, old_size) = self._sessions.popitem(last=False)
+            self._bytes -= old_size
+            self._notify(phone, old_session, None)
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    def add_loader(self, loader: Callable[[str], Optional[ConversationSession]]):
+        """Fonte consultada quando o telefone não está na memória (ex: snapshot)"""
+        self.loaders.append(loader)
+
+    def load(self, phone: str) -> Tuple[Optional[ConversationSession], int]:
+        with self._lock:
+            entry = self._sessions.get(phone)
+            if entry is not None:
+                self._sessions.move_to_end(phone)
+        if entry is None:
+            return self._load_missing(phone)
+        return entry[1].copy(), entry[0]
+
+    def _load_missing(self, phone: str) -> Tuple[Optional[ConversationSession], int]:
+        if not self.loaders:
+            return None, 0
+        for loader in self.loaders:
+            session = loader(phone)
+            if session is not None:
+                # Se outra thread criou a sessão nesse meio tempo, vale a dela
+                self.save(phone, session, 0)
+                break
+
+        # Relê mesmo sem retorno: o loader pode ter gravado a sessão por conta própria
+        with self._lock:
+            entry = self._sessions.get(phone)
+        return (entry[1].copy(), entry[0]) if entry else (None, 0)
+
+    def items(self) -> List[Tuple[str, ConversationSession]]:
+        """Sessões em ordem de uso (menos recente primeiro); os objetos não são alterados no lugar"""
+        with self._lock:
+            return [(phone, entry[1]) for phone, entry in self._sessions.items()]
+
+    def save(self, phone: str, session: ConversationSession, expected_version: int) -> bool:
+        session = session.copy()
+        with self._lock:
+            current = self._sessions.get(phone)
+            if (current[0] if current else 0) != expected_version:
+                return False
+            # Incremental: só as cotações novas do histórico são medidas
+            size = estimate_session_bytes(session, *(current[1:] if current else ()))
+            if current:
+                self._bytes -= current[2]
+            self._version += 1
+            self._sessions[phone] = (self._version, session, size)
+            self._sessions.move_to_end(phone)
+            self._bytes += size
+            # As sessões guardadas nunca são alteradas no lugar: a anterior serve de "antes"
+            self._notify(phone, current[1] if current else None, session)
+            evicted = self._evict_locked()
+
+        if evicted:
+            metrics.incr("sessions.evicted", evicted)
+        if not current or evicted:
+            self.publish_gauges()
+        return True
+
+    def install(self, sessions: List[Tuple[str, ConversationSession]]) -> int:
+        """
+        Carga em lote de sessões recém-criadas (ex: restauradas de snapshot)
+
+        Os objetos passam a ser do store (sem cópia); telefones que já têm
+        sessão mantêm a atual.
+
+        Returns:
+            Quantidade de sessões instaladas
+        """
+        sized = [(phone, session, estimate_session_bytes(session)) for phone, session in sessions]
+        installed = 0
+        with self._lock:
+            for phone, session, size in sized:
+                if phone in self._sessions:
+                    continue
+                self._version += 1
+                self._sessions[phone] = (self._version, session, size)
+                self._bytes += size
+                installed += 1
+            evicted = self._evict_locked()
+
+        if evicted:
+            metrics.incr("sessions.evicted", evicted)
+        self.publish_gauges()
+        return installed
+
+    def delete(self, phone: str):
+        with self._lock:
+            entry = self._sessions.pop(phone, None)
+            if entry:
+                self._bytes -= entry[2]
+                self._notify(phone, entry[1], None)
+
+    def purge_idle(self, default_before: float, before_by_state: Optional[Dict[str, float]] = None) -> int:
+        before_by_state = before_by_state or {}
+        with self._lock:
+            snapshot = [(phone, entry[0], entry[1]) for phone, entry in self._sessions.items()]
+
+        removed = 0
+        for phone, version, session in snapshot:
+            before = before_by_state.get(session.state.value, default_before)
+            if session.last_interaction < before and self.remove_if_unchanged(phone, version):
+                removed += 1
+        return removed
+
+    def idle_entries(self, before: float) -> List[Tuple[str, int, ConversationSession]]:
+        """(telefone, versão, sessão) sem interação desde `before`; os objetos não são alterados no lugar"""
+        with self._lock:
+            return [(phone, entry[0], entry[1]) for phone, entry in self._sessions.items()
+                    if entry[1].last_interaction < before]
+
+    def remove_if_unchanged(self, phone: str, version: int) -> bool:
+        """Remove a sessão só se ninguém gravou depois da versão lida"""
+        with self._lock:
+            entry = self._sessions.get(phone)
+            if not entry or entry[0] != version:
+                return False
+            del self._sessions[phone]
+            self._bytes -= entry[2]
+            self._notify(phone, entry[1], None)
+            return True
+
+    def phones(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def clear(self):
+        with self._lock:
+            removed = list(self._sessions.items())
+            self._sessions.clear()
+            self._bytes = 0
+            for phone, (_, session, _) in removed:
+                self._notify(phone, session, None)
+
+    def __contains__(self, phone: str) -> bool:
+        return phone in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def estimated_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update(max_entries=self.max_entries, evicted=self.evicted)
+        return stats
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessões em SQLite (WAL) compartilhado pelos workers do gunicorn
+
+    Cada thread tem a sua conexão (refeita depois de um fork); as gravações
+    são um único UPDATE/INSERT condicionado à versão, sem transação longa.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(statement)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_idle ON sessions (last_interaction)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, phone: str) -> Tuple[Optional[ConversationSession], int]:
+        row = self._conn().execute(
+            "SELECT version, session FROM sessions WHERE phone = ?", (phone,)
+        ).fetchone()
+        if row is None:
+            return None, 0
+        return ConversationSession.from_dict(json.loads(row[1])), row[0]
+
+    def save(self, phone: str, session: ConversationSession, expected_version: int) -> bool:
+        payload = json.dumps(session.to_dict(), ensure_ascii=False, default=str)
+        params = (payload, time.time(), session.state.value, session.last_interaction)
+        if expected_version == 0:
+            cursor = self._conn().execute(
+                "INSERT OR IGNORE INTO sessions (session, updated_at, state, last_interaction, phone, version) "
+                "VALUES (?, ?, ?, ?, ?, 1)",
+                (*params, phone)
+            )
+        else:
+            cursor = self._conn().execute(
+                "UPDATE sessions SET version = version + 1, session = ?, updated_at = ?, "
+                "state = ?, last_interaction = ? WHERE phone = ? AND version = ?",
+                (*params, phone, expected_version)
+            )
+        return cursor.rowcount == 1
+
+    def purge_idle(self, default_before: float, before_by_state: Optional[Dict[str, float]] = None) -> int:
+        before_by_state = before_by_state or {}
+        cases = " ".join("WHEN ? THEN ?" for _ in before_by_state)
+        limit = f"CASE state {cases} ELSE ? END" if cases else "?"
+        params = [value for item in before_by_state.items() for value in item] + [default_before]
+        cursor = self._conn().execute(
+            f"DELETE FROM sessions WHERE COALESCE(last_interaction, updated_at) < {limit}", params
+        )
+        return cursor.rowcount
+
+    def delete(self, phone: str):
+        self._conn().execute("DELETE FROM sessions WHERE phone = ?", (phone,))
+
+    def phones(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT phone FROM sessions")]
+
+    def clear(self):
+        self._conn().execute("DELETE FROM sessions")
+
+    def __contains__(self, phone: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM sessions WHERE phone = ?", (phone,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def estimated_bytes(self) -> int:
+        # Tamanho do JSON gravado (as sessões não ficam na memória do processo)
+        return self._conn().execute("SELECT COALESCE(SUM(LENGTH(session)), 0) FROM sessions").fetchone()[0]
+
+
+class MongoSessionStore(SessionStore):
+    """Sessões em uma collection MongoDB (um documento por telefone, _id = telefone)"""
+
+    name = "mongo"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def load(self, phone: str) -> Tuple[Optional[ConversationSession], int]:
+        doc = self.collection.find_one({"_id": phone})
+        if doc is None:
+            return None, 0
+        return ConversationSession.from_dict(doc["session"]), doc["version"]
+
+    def save(self, phone: str, session: ConversationSession, expected_version: int) -> bool:
+        from pymongo.errors import DuplicateKeyError
+
+        # Round-trip em JSON garante documento só com tipos básicos
+        encoded = json.loads(json.dumps(session.to_dict(), default=str))
+        fields = {"session": encoded, "updated_at": datetime.utcnow(),
+                  "state": session.state.value,
+                  "last_interaction": session.last_interaction}
+        if expected_version == 0:
+            try:
+                self.collection.insert_one({"_id": phone, "version": 1, **fields})
+                return True
+            except DuplicateKeyError:
+                return False
+
+        result = self.collection.update_one(
+            {"_id": phone, "version": expected_version},
+            {"$set": fields, "$inc": {"version": 1}}
+        )
+        return result.matched_count == 1
+
+    def purge_idle(self, default_before: float, before_by_state: Optional[Dict[str, float]] = None) -> int:
+        before_by_state = before_by_state or {}
+        conditions = [{"state": state, "last_interaction": {"$lt": before}}
+                      for state, before in before_by_state.items()]
+        conditions.append({"state": {"$nin": list(before_by_state)}, "last_interaction": {"$lt": default_before}})
+        return self.collection.delete_many({"$or": conditions}).deleted_count
+
+    def delete(self, phone: str):
+        self.collection.delete_one({"_id": phone})
+
+    def phones(self) -> List[str]:
+        return [doc["_id"] for doc in self.collection.find({}, {"_id": 1})]
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def __contains__(self, phone: str) -> bool:
+        return self.collection.count_documents({"_id": phone}, limit=1) > 0
+
+    def __len__(self) -> int:
+        return self.collection.estimated_document_count()
+
+
+def create_session_store(backend: str) -> SessionStore:
+    """
+    Cria o store do backend informado ("mongo" é ligado depois, com a conexão
+    do MongoDB: ver ConversationFlow.use_store)
+    """
+    backend = (backend or "memory").lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv('SESSION_DB_PATH', 'sessions.sqlite3'))
+    if backend not in ("memory", "mongo"):
+        logger.warning(f"SESSION_STORE desconhecido '{backend}', usando memória")
+    return MemorySessionStore(max_entries=int(os.getenv('SESSION_MAX_ENTRIES', '50000')))
+
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
@@ -14,6 +14,11 @@ from datetime import datetime
 
 from app.bot.pdf_storage import salvar_pdf_mongo
 from app.bot.dados_estados import DADOS_ESTADOS
+from app.bot.data_extractor import is_openai_overload
+from app.utils.circuit_breaker import openai_breaker, swissre_breaker, CircuitOpenError
+from app.utils.concurrency_limiter import (
+    openai_limiter, swissre_document_limiter, swissre_quotation_limiter, LimiterTimeout, is_overload_status
+)
 
 logger = logging.getLogger(__name__)
 # Carrega as variáveis definidas no arquivo .env
@@ -34,6 +39,37 @@ API_URL = "https://corsobr.api.swissre.com/issuance/v1/CreateQuotation"
 API_URL_DOCUMENT = 'https://corsobr.api.swissre.com/document/v1/PrintDocument'
 CPF = os.getenv("CPF")
 
+# Timeouts das chamadas SwissRe (conexão, leitura) em segundos
+SWISSRE_TIMEOUT = (
+    float(os.getenv("SWISSRE_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("SWISSRE_READ_TIMEOUT", "60"))
+)
+
+
+def _swissre_overloaded(response) -> bool:
+    return is_overload_status(response.status_code)
+
+
+def _post_swissre(url, limiter=None, **kwargs):
+    """
+    POST para a SwissRe com timeout e pelo circuit breaker (5xx/429 contam como falha)
+
+    Com um limiter (CreateQuotation/PrintDocument, um por endpoint) a chamada
+    também ocupa uma vaga do limite adaptativo de concorrência
+    """
+    if limiter is None:
+        return swissre_breaker.call(
+            requests.post, url, timeout=SWISSRE_TIMEOUT, failure_if=_swissre_overloaded, **kwargs
+        )
+
+    return limiter.call(
+        swissre_breaker.call, requests.post, url, timeout=SWISSRE_TIMEOUT,
+        failure_if=_swissre_overloaded,
+        overloaded_if=_swissre_overloaded,
+        overload_error=lambda e: isinstance(e, requests.exceptions.Timeout),
+        **kwargs
+    )
+
 class SwissReAutomation:
   def normalizar_retorno_json(dados):
       """
@@ -68,10 +104,17 @@ class SwissReAutomation:
           "nome",
       ]
       # Inicializa cliente da OpenAI
-      client = OpenAI(api_key=OPENAI_API_KEY)
+      try:
+          client = OpenAI(api_key=OPENAI_API_KEY)
+      except Exception as e:
+          logger.warning(f"Cliente da OpenAI indisponível: {str(e)}")
+          return False
       for tentativa in range(1, max_tentativas + 1):
           try:
-              response = client.chat.completions.create(
+              response = openai_limiter.call(
+                  openai_breaker.call,
+                  client.chat.completions.create,
+                  overload_error=is_openai_overload,
                   model="gpt-4o-mini",
                   messages=[
                       {"role": "system", "content": "Responda sempre em JSON puro."},
@@ -114,6 +157,10 @@ class SwissReAutomation:
               # ✅ Se passou em todas as validações
               return dados
 
+          except (CircuitOpenError, LimiterTimeout) as e:
+              # Sem tentar de novo: o chamador segue pelo modo degradado (dados_sem_ia)
+              logger.warning(f"OpenAI indisponível ({type(e).__name__}), abandonando extração")
+              return False
           except Exception as e:
               print(f"❌ Erro na tentativa {tentativa}: {e}")
               if tentativa < max_tentativas:
@@ -123,6 +170,17 @@ class SwissReAutomation:
                   print("❌ Limite de tentativas atingido.")
                   return False
 
+  def dados_sem_ia(client_data):
+      """
+      Modo degradado (circuito da OpenAI aberto): usa direto os campos já
+      coletados na conversa
+      """
+      return {
+          "uf": str(client_data.get("uf", "")).upper(),
+          "valor": str(client_data.get("valor_animal", "")),
+          "nome": client_data.get("nome_solicitante", ""),
+      }
+
   def generate_quotation_pdf(client_data):
     logger.info(f"Inicio Fluxo de Cotação SwissRe: {client_data}")
 
@@ -146,8 +204,22 @@ class SwissReAutomation:
     Texto: {client_data}
     """
 
+    contractNumber = None
     try:
-      resultado = SwissReAutomation.extrair_dados_chatgpt(prompt)
+      if isinstance(client_data, dict) and not openai_breaker.available:
+          resultado = SwissReAutomation.dados_sem_ia(client_data)
+      else:
+          resultado = SwissReAutomation.extrair_dados_chatgpt(prompt)
+          if not resultado and isinstance(client_data, dict):
+              logger.warning("Extração por IA falhou, usando os dados coletados na conversa")
+              resultado = SwissReAutomation.dados_sem_ia(client_data)
+      if not resultado:
+          # Nada foi criado na SwissRe: a cotação volta para o backlog
+          return {
+              'success': False,
+              'unavailable': True,
+              'message': 'Extração dos dados indisponível'
+              }
       uf = resultado['uf']
       endereco = DADOS_ESTADOS.get(uf)
       logger.info(f"Resultado dados categorizados: {resultado}")
@@ -272,7 +344,7 @@ class SwissReAutomation:
           "client_id": CLIENT_ID,
           "client_secret": CLIENT_SECRET
       }
-      response = requests.post(TOKEN_URL, data=data)
+      response = _post_swissre(TOKEN_URL, data=data)
       token = response.json()["access_token"]
 
 
@@ -284,7 +356,7 @@ class SwissReAutomation:
 
       # 4. Enviar requisição de cotação
       logger.info("Envio requisição para formalizar cotacao")
-      quotation_response = requests.post(API_URL, headers=headers, json=payload)
+      quotation_response = _post_swissre(API_URL, limiter=swissre_quotation_limiter, headers=headers, json=payload)
 
       dados = quotation_response.json()
       contractNumber = dados['Response']['contractNumber']
@@ -302,7 +374,7 @@ class SwissReAutomation:
       }
 
       logger.info(f"Cotacao gerada {contractNumber}")
-      response_doc = requests.post(API_URL_DOCUMENT, headers=headers, json=payload_doc)
+      response_doc = _post_swissre(API_URL_DOCUMENT, limiter=swissre_document_limiter, headers=headers, json=payload_doc)
 
       logger.info(f"Status Code: {response_doc.status_code}")
 
@@ -336,6 +408,22 @@ class SwissReAutomation:
           }
 
 
+    except (CircuitOpenError, LimiterTimeout, requests.exceptions.ConnectionError) as e:
+        if contractNumber is not None:
+            logger.error(f"❌ Erro na automação SwissRe: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Erro na automação: {str(e)}'
+                }
+
+        # Nada chegou a ser criado na SwissRe: a cotação pode ser refeita depois
+        logger.error(f"❌ SwissRe indisponível: {str(e)}")
+        return {
+            'success': False,
+            'unavailable': True,
+            'message': f'SwissRe indisponível: {str(e)}'
+            }
+
     except Exception as e:
         logger.error(f"❌ Erro na automação SwissRe: {str(e)}")
         return {
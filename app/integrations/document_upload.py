@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Envio de Documentos sem carregar o arquivo inteiro em memória
+
+Dois caminhos para o campo "document" do UltraMsg:
+- por URL: o PDF é publicado uma vez em DOCUMENT_MEDIA_DIR com o hash do
+  conteúdo no nome e o UltraMsg baixa de DOCUMENT_PUBLIC_BASE_URL
+- streaming: o corpo x-www-form-urlencoded é gerado em blocos
+  (leitura -> base64 -> quote) com Content-Length calculado antes
+"""
+import os
+import base64
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+from urllib.parse import quote
+
+from app.integrations.ultramsg_format import encode_form_payload
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Múltiplo de 3: o base64 de cada bloco concatena sem padding intermediário
+READ_CHUNK = 48 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """Hash do conteúdo do arquivo (lido em blocos)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_chunk(chunk: bytes) -> bytes:
+    # Mesmo quote de encode_form_payload (mantém "/" literal)
+    return quote(base64.b64encode(chunk).decode("ascii")).encode("ascii")
+
+
+class StreamingFormBody:
+    """
+    Corpo x-www-form-urlencoded com um arquivo em base64 gerado sob demanda
+
+    Objeto "file-like" (read/__len__/__iter__): o requests envia em blocos
+    com Content-Length, e no máximo um bloco codificado fica em memória.
+    """
+
+    def __init__(self, fields: Dict, file_field: str, path: str):
+        prefix = "&".join(f"{k}={quote(str(v))}" for k, v in fields.items())
+        self.prefix = ((prefix + "&") if prefix else "").encode("utf-8") + f"{file_field}=".encode("ascii")
+        self.path = path
+        self._length = None
+        self._file = None
+        self._buffer = b""
+        self._started = False
+
+    def __len__(self) -> int:
+        if self._length is None:
+            # Primeira passada só para medir (o quote expande "+" e "=")
+            size = len(self.prefix)
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                    size += len(_encode_chunk(chunk))
+            self._length = size
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._started:
+            self._started = True
+            self._buffer = self.prefix
+            self._file = open(self.path, "rb")
+
+        while self._file is not None and (size < 0 or len(self._buffer) < size):
+            chunk = self._file.read(READ_CHUNK)
+            if not chunk:
+                self.close()
+                break
+            self._buffer += _encode_chunk(chunk)
+
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(READ_CHUNK)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class DocumentPublisher:
+    """
+    Publica documentos por hash do conteúdo para envio por URL
+
+    O mesmo PDF é copiado uma única vez; a URL fica em cache pelo hash
+    (e o hash em cache por caminho/tamanho/mtime, para não reler o arquivo).
+    """
+
+    def __init__(self, media_dir: str, public_base_url: str, max_entries: int = 1000):
+        self.media_dir = media_dir
+        self.public_base_url = public_base_url.rstrip("/")
+        self.max_entries = max_entries
+        self._hashes = OrderedDict()
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.public_base_url)
+
+    def publish(self, path: str) -> str:
+        """
+        Retorna a URL pública do documento (copiando-o se ainda não publicado)
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            sha = self._hashes.get(key)
+        if sha is None:
+            sha = file_sha256(path)
+            with self._lock:
+                self._remember(self._hashes, key, sha)
+
+        with self._lock:
+            url = self._urls.get(sha)
+        if url is not None:
+            metrics.incr("documents.url_cache_hits")
+            return url
+
+        name = f"{sha}.pdf"
+        target = os.path.join(self.media_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(self.media_dir, exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, target)
+            metrics.incr("documents.published")
+
+        url = f"{self.public_base_url}/media/documents/{name}"
+        with self._lock:
+            self._remember(self._urls, sha, url)
+        return url
+
+    def _remember(self, cache: OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+
+def document_form_body(fields: Dict, pdf_path: str) -> Union[str, StreamingFormBody]:
+    """
+    Monta o corpo do envio de documento (fields + "document")
+
+    Returns:
+        str codificado por URL pública quando o publicador está ativo,
+        senão um StreamingFormBody
+    """
+    if document_publisher.enabled:
+        return encode_form_payload(dict(fields, document=document_publisher.publish(pdf_path)))
+
+    return StreamingFormBody(fields, "document", pdf_path)
+
+
+# Instância global (envio por URL só com DOCUMENT_PUBLIC_BASE_URL configurado)
+document_publisher = DocumentPublisher(
+    media_dir=os.getenv('DOCUMENT_MEDIA_DIR', 'media/documents'),
+    public_base_url=os.getenv('DOCUMENT_PUBLIC_BASE_URL', '')
+)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Transporte HTTP compartilhado (sessão keep-alive com pool de conexões)
+Evita abrir uma conexão TCP+TLS nova a cada mensagem enviada ao UltraMsg
+"""
+import os
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HttpTransport:
+    """
+    Sessão requests com pool de conexões, timeouts padrão e retry
+
+    O retry cobre falhas de conexão (a requisição não chegou ao servidor)
+    em qualquer método, e falhas de leitura/5xx apenas em métodos
+    idempotentes: um POST de mensagem nunca é reenviado depois de aceito.
+    """
+
+    RETRY_STATUS = (502, 503, 504)
+
+    def __init__(self, name: str, pool_size: int = 10, connect_timeout: float = 5,
+                 read_timeout: float = 30, retries: int = 2, backoff: float = 0.3):
+        self.name = name
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Sessão do processo atual (recriada após fork do gunicorn)"""
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            status_forcelist=self.RETRY_STATUS,
+            backoff_factor=self.backoff,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        logger.info(f"Transporte HTTP '{self.name}' criado (pool={self.pool_size}, timeout={self.timeout})")
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Faz a requisição pelo pool (timeout padrão se não informado)
+
+        Raises:
+            requests.exceptions.RequestException: mesmas exceções do requests
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            metrics.incr(f"{self.name}.http.errors")
+            raise
+        finally:
+            metrics.observe(f"{self.name}.http.seconds", time.perf_counter() - started)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "retries": self.retries
+        }
+
+
+# Transporte usado por todas as chamadas ao UltraMsg
+ultramsg_transport = HttpTransport(
+    name="ultramsg",
+    pool_size=int(os.getenv('ULTRAMSG_POOL_SIZE', '10')),
+    connect_timeout=float(os.getenv('ULTRAMSG_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.getenv('ULTRAMSG_READ_TIMEOUT', '30')),
+    retries=int(os.getenv('ULTRAMSG_RETRIES', '2')),
+    backoff=float(os.getenv('ULTRAMSG_RETRY_BACKOFF', '0.3'))
+)
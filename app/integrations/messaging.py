@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Transporte de Mensagens do WhatsApp
+Interface única de envio com backends plugáveis (MESSAGING_BACKEND):
+- ultramsg: API real do UltraMsg
+- standin:  mesma implementação, apontando para o stand-in local
+            (app/integrations/ultramsg_standin.py)
+- fake:     em memória, sem rede (registra tudo o que foi enviado)
+"""
+import os
+import time
+import random
+import logging
+import threading
+from typing import Any, Dict, List
+
+from app.integrations.ultramsg_format import format_phone
+
+logger = logging.getLogger(__name__)
+
+
+class MessagingTransport:
+    """
+    Interface de envio (a UltraMsgAPI já segue esta interface)
+
+    Todos os métodos retornam {"success": bool, "data": ..., "error": str}
+    """
+
+    name = "base"
+
+    def send_text_message(self, phone: str, message: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def send_document(self, phone: str, document_url: str, filename: str, caption: str = "") -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def send_image(self, phone: str, image_url: str, caption: str = "") -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def send_audio(self, phone: str, audio_url: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_instance_status(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class FakeMessagingTransport(MessagingTransport):
+    """
+    Backend em memória para testes e benchmarks offline
+
+    Simula latência e falhas opcionais e guarda cada envio em `sent`.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _record(self, kind: str, phone: str, **fields) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            return {"success": False, "error": "HTTP 500: falha simulada"}
+
+        with self._lock:
+            entry = {"id": len(self.sent) + 1, "kind": kind, "to": format_phone(phone),
+                     "timestamp": time.time(), **fields}
+            self.sent.append(entry)
+        return {"success": True, "data": {"sent": "true", "message": "ok", "id": entry["id"]}}
+
+    def send_text_message(self, phone: str, message: str) -> Dict[str, Any]:
+        return self._record("chat", phone, body=message)
+
+    def send_document(self, phone: str, document_url: str, filename: str, caption: str = "") -> Dict[str, Any]:
+        if not os.path.exists(document_url):
+            return {"success": False, "error": f"Arquivo não encontrado: {document_url}"}
+        return self._record("document", phone, document=document_url, filename=filename, caption=caption)
+
+    def send_image(self, phone: str, image_url: str, caption: str = "") -> Dict[str, Any]:
+        return self._record("image", phone, image=image_url, caption=caption)
+
+    def send_audio(self, phone: str, audio_url: str) -> Dict[str, Any]:
+        return self._record("voice", phone, audio=audio_url)
+
+    def get_instance_status(self) -> Dict[str, Any]:
+        return {"success": True, "data": {"status": {"accountStatus": {"status": "authenticated"}}}}
+
+    def clear(self):
+        with self._lock:
+            self.sent.clear()
+
+
+def create_transport(backend: str) -> MessagingTransport:
+    """
+    Cria o transporte do backend informado
+
+    Args:
+        backend: "ultramsg", "standin" ou "fake"
+    """
+    backend = (backend or "ultramsg").lower()
+
+    if backend == "fake":
+        return FakeMessagingTransport(
+            latency=float(os.getenv('MESSAGING_FAKE_LATENCY', '0')),
+            failure_rate=float(os.getenv('MESSAGING_FAKE_FAILURE_RATE', '0'))
+        )
+
+    from app.integrations.ultramsg_api import UltraMsgAPI, ultramsg_api
+
+    if backend == "standin":
+        return UltraMsgAPI(api_url=os.getenv('ULTRAMSG_STANDIN_URL', 'http://127.0.0.1:5099'))
+
+    if backend != "ultramsg":
+        logger.warning(f"MESSAGING_BACKEND desconhecido '{backend}', usando ultramsg")
+    return ultramsg_api
+
+
+MESSAGING_BACKEND = os.getenv('MESSAGING_BACKEND', 'ultramsg')
+
+# Transporte usado por todos os caminhos de envio
+messaging_transport = create_transport(MESSAGING_BACKEND)
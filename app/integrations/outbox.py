@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+Fila de Saída (Outbox) do WhatsApp
+Envios são gravados em SQLite e entregues por um worker em background,
+respeitando o limite de taxa da instância UltraMsg
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.circuit_breaker import ultramsg_breaker
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    instance_id TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_phone ON outbox (phone, status, id);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    instance_id TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class MessageOutbox:
+    """
+    Outbox durável com token bucket por instância
+
+    - enqueue_* grava a mensagem como "queued" e retorna o id (não bloqueia na rede)
+    - `workers` threads pegam a mensagem mais antiga de cada telefone (ordem
+      por telefone preservada, inclusive durante retries), esperam um token do
+      bucket da instância e entregam; telefones diferentes são entregues em
+      paralelo, e a primeira thread só entrega textos, então uploads de
+      documentos lentos não seguram as respostas dos outros clientes
+    - o bucket fica no próprio SQLite, então o limite vale para todos os
+      processos do gunicorn que usam o mesmo arquivo
+    - falhas voltam para "queued" com backoff exponencial; depois de
+      max_attempts a mensagem fica "failed"
+    """
+
+    # Mensagem em "sending" há mais que isso é considerada abandonada (processo morto)
+    SENDING_LEASE = 120
+    PURGE_INTERVAL = 3600
+    MERGE_SEPARATOR = "\n\n"
+
+    def __init__(self, db_path: str, instance_id: str, deliver: Callable[[str, str, Dict], Dict],
+                 rate: float = 5.0, burst: int = 10, max_attempts: int = 5,
+                 backoff: float = 2.0, max_backoff: float = 300.0,
+                 retention_hours: float = 72, poll_interval: float = 0.5,
+                 merge_window: float = 0, merge_max_chars: int = 4000, workers: int = 4,
+                 is_available: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            db_path: Arquivo SQLite da fila
+            instance_id: Instância UltraMsg (chave do token bucket)
+            deliver: Função (kind, phone, payload) -> {"success": bool, "error": str, "permanent": bool}
+            rate: Envios por segundo permitidos para a instância
+            burst: Capacidade do bucket
+            merge_window: Textos para o mesmo telefone enfileirados dentro desta
+                janela (segundos) viram um único envio (0 desativa)
+            merge_max_chars: Tamanho máximo de um texto juntado
+            workers: Threads de entrega por processo
+            is_available: Se retornar False a entrega fica suspensa (circuit breaker)
+        """
+        self.db_path = db_path
+        self.instance_id = instance_id
+        self.deliver = deliver
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retention_hours = retention_hours
+        self.poll_interval = poll_interval
+        self.merge_window = merge_window
+        self.merge_max_chars = merge_max_chars
+        self.workers = max(1, workers)
+        self.is_available = is_available
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def enqueue_text(self, phone: str, message: str) -> int:
+        """Enfileira mensagem de texto e retorna o id"""
+        return self._enqueue(phone, "text", {"message": message})
+
+    def enqueue_document(self, phone: str, pdf_path: str, caption: str = "") -> int:
+        """Enfileira documento local e retorna o id"""
+        return self._enqueue(phone, "document", {"path": pdf_path, "caption": caption})
+
+    def get_status(self, message_id: int) -> Optional[Dict]:
+        """Status de uma mensagem (None se não existir)"""
+        row = self._conn().execute(
+            "SELECT id, phone, kind, status, attempts, created_at, updated_at, last_error "
+            "FROM outbox WHERE id = ?", (message_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "phone", "kind", "status", "attempts", "created_at", "updated_at", "last_error")
+        return dict(zip(keys, row))
+
+    def stats(self) -> Dict:
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+        ).fetchall()
+        counts = {QUEUED: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return {
+            "instance_id": self.instance_id,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "counts": counts
+        }
+
+    def start(self):
+        """Inicia os workers deste processo (idempotente, seguro após fork)"""
+        if self._running():
+            return
+        with self._start_lock:
+            if self._running():
+                return
+            # A primeira thread só entrega textos; as demais entregam qualquer tipo
+            self._threads = [
+                threading.Thread(target=self._run, args=("text" if i == 0 and self.workers > 1 else None,),
+                                 name=f"outbox-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._worker_pid = os.getpid()
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Outbox iniciado com {self.workers} workers ({self.db_path}, {self.rate}/s por instância)")
+
+    def _running(self) -> bool:
+        return bool(self._threads) and self._worker_pid == os.getpid() and all(t.is_alive() for t in self._threads)
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        """Conexão da thread atual (conexões herdadas de um fork não são reutilizadas)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _enqueue(self, phone: str, kind: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO outbox (instance_id, phone, kind, payload, status, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.instance_id, phone, kind, json.dumps(payload, ensure_ascii=False), QUEUED, now, now, now)
+        )
+        metrics.incr("outbox.enqueued")
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def _run(self, kind: Optional[str] = None):
+        while True:
+            try:
+                self._maybe_purge()
+                if self.is_available and not self.is_available():
+                    # Circuito do UltraMsg aberto: segura a fila sem gastar tentativas
+                    metrics.incr("outbox.held")
+                    time.sleep(self.poll_interval)
+                    continue
+                job = self._claim(kind)
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._wait_token()
+                self._send(job)
+            except Exception as e:
+                logger.error(f"Erro no worker do outbox: {str(e)}", exc_info=True)
+                time.sleep(self.poll_interval)
+
+    def _claim(self, kind: Optional[str] = None) -> Optional[Dict]:
+        """
+        Marca como "sending" a mensagem mais antiga pronta para envio cujo
+        telefone não tem mensagem anterior pendente (só do tipo `kind`, se informado)
+
+        Com merge_window, textos novos esperam a janela fechar e os textos
+        seguintes do mesmo telefone (até o próximo documento) são juntados
+        em um único envio
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Recupera envios abandonados por processos que morreram
+            conn.execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, SENDING, now - self.SENDING_LEASE)
+            )
+            row = conn.execute(
+                "SELECT o.id, o.phone, o.kind, o.payload, o.attempts, o.created_at FROM outbox o "
+                "WHERE o.instance_id = ? AND o.status = ? AND o.next_attempt_at <= ? "
+                "AND (o.kind != 'text' OR o.attempts > 0 OR o.created_at <= ?) "
+                "AND (? IS NULL OR o.kind = ?) "
+                "AND NOT EXISTS (SELECT 1 FROM outbox p WHERE p.phone = o.phone AND p.id < o.id "
+                "AND p.status IN (?, ?)) "
+                "ORDER BY o.id LIMIT 1",
+                (self.instance_id, QUEUED, now, now - self.merge_window, kind, kind, QUEUED, SENDING)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            ids = [row[0]]
+            payload = json.loads(row[3])
+            if row[2] == "text" and self.merge_window > 0:
+                ids, payload = self._merge_following(conn, row, payload)
+
+            conn.execute(
+                f"UPDATE outbox SET status = ?, updated_at = ? WHERE id IN ({','.join('?' * len(ids))})",
+                (SENDING, now, *ids)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return {
+            "id": row[0],
+            "ids": ids,
+            "phone": row[1],
+            "kind": row[2],
+            "payload": payload,
+            "attempts": row[4]
+        }
+
+    def _merge_following(self, conn: sqlite3.Connection, row: tuple, payload: Dict):
+        """Junta os textos enfileirados logo em seguida para o mesmo telefone"""
+        ids = [row[0]]
+        parts = [payload["message"]]
+        size = len(payload["message"])
+
+        following = conn.execute(
+            "SELECT id, kind, payload, created_at FROM outbox "
+            "WHERE instance_id = ? AND phone = ? AND id > ? AND status = ? ORDER BY id LIMIT 20",
+            (self.instance_id, row[1], row[0], QUEUED)
+        ).fetchall()
+
+        for next_id, kind, next_payload, created_at in following:
+            # Um documento no meio encerra o merge (a ordem é mantida)
+            if kind != "text" or created_at > row[5] + self.merge_window:
+                break
+            message = json.loads(next_payload)["message"]
+            if size + len(self.MERGE_SEPARATOR) + len(message) > self.merge_max_chars:
+                break
+            ids.append(next_id)
+            parts.append(message)
+            size += len(self.MERGE_SEPARATOR) + len(message)
+
+        if len(ids) > 1:
+            metrics.incr("outbox.merged", len(ids) - 1)
+        return ids, {"message": self.MERGE_SEPARATOR.join(parts)}
+
+    def _wait_token(self):
+        """Bloqueia até conseguir um token do bucket da instância"""
+        while True:
+            wait = self._take_token()
+            if wait <= 0:
+                return
+            metrics.incr("outbox.throttled")
+            time.sleep(min(wait, 1.0))
+
+    def _take_token(self) -> float:
+        """Tenta consumir um token; retorna 0 ou o tempo até o próximo token"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE instance_id = ?",
+                (self.instance_id,)
+            ).fetchone()
+            tokens = float(self.burst) if row is None else min(
+                float(self.burst), row[0] + max(0.0, now - row[1]) * self.rate
+            )
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (instance_id, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.instance_id, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _drain_bucket(self, seconds: float):
+        """Após um 429, esvazia o bucket para todos os processos recuarem"""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO rate_buckets (instance_id, tokens, updated_at) VALUES (?, ?, ?)",
+            (self.instance_id, -seconds * self.rate, time.time())
+        )
+
+    def _send(self, job: Dict):
+        started = time.perf_counter()
+        try:
+            result = self.deliver(job["kind"], job["phone"], job["payload"])
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        metrics.observe("outbox.send_seconds", time.perf_counter() - started)
+
+        now = time.time()
+
+        if result.get("circuit_open"):
+            self._update(job["ids"], "status = ?, next_attempt_at = ?, updated_at = ?",
+                         (QUEUED, now + self.poll_interval, now))
+            return
+
+        attempts = job["attempts"] + 1
+
+        if result.get("success"):
+            self._update(job["ids"], "status = ?, attempts = ?, updated_at = ?, last_error = NULL",
+                         (SENT, attempts, now))
+            metrics.incr("outbox.sent")
+            return
+
+        error = str(result.get("error", ""))[:500]
+        if error.startswith("HTTP 429"):
+            metrics.incr("outbox.rate_limited")
+            self._drain_bucket(self.backoff)
+
+        if result.get("permanent") or attempts >= self.max_attempts:
+            self._update(job["ids"], "status = ?, attempts = ?, updated_at = ?, last_error = ?",
+                         (FAILED, attempts, now, error))
+            metrics.incr("outbox.failed")
+            logger.error(f"Envio {job['id']} para {job['phone']} falhou definitivamente: {error}")
+            return
+
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempts - 1)))
+        self._update(job["ids"], "status = ?, attempts = ?, next_attempt_at = ?, updated_at = ?, last_error = ?",
+                     (QUEUED, attempts, now + delay, now, error))
+        metrics.incr("outbox.retried")
+        logger.warning(f"Envio {job['id']} para {job['phone']} falhou (tentativa {attempts}), "
+                       f"nova tentativa em {delay:.1f}s: {error}")
+
+    def _update(self, ids, assignments: str, params: tuple):
+        self._conn().execute(
+            f"UPDATE outbox SET {assignments} WHERE id IN ({','.join('?' * len(ids))})",
+            (*params, *ids)
+        )
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._conn().execute(
+            "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+            (SENT, FAILED, now - self.retention_hours * 3600)
+        )
+
+
+class OutboxAdapter:
+    """
+    Mesma interface do UltraMsgAdapter (send_message / send_document),
+    mas apenas enfileira no outbox
+    """
+
+    def __init__(self, outbox: MessageOutbox):
+        self.outbox = outbox
+
+    def send_message(self, phone: str, message: str) -> bool:
+        try:
+            self.outbox.enqueue_text(phone, message)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar mensagem: {str(e)}")
+            return False
+
+    def send_document(self, phone: str, pdf_path: str, caption: str = "") -> bool:
+        try:
+            self.outbox.enqueue_document(phone, pdf_path, caption)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar documento: {str(e)}")
+            return False
+
+
+def deliver_ultramsg(kind: str, phone: str, payload: Dict) -> Dict:
+    """Entrega uma mensagem do outbox pelo transporte de mensagens"""
+    from app.integrations.messaging import messaging_transport
+
+    if kind == "document":
+        path = payload["path"]
+        if not os.path.exists(path):
+            return {"success": False, "error": f"Arquivo não encontrado: {path}", "permanent": True}
+        return messaging_transport.send_document(phone, path, os.path.basename(path), payload.get("caption", ""))
+
+    return messaging_transport.send_text_message(phone, payload["message"])
+
+
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'False').lower() in ('true', '1', 'yes')
+
+# Instância global do outbox (None quando desativado)
+message_outbox = MessageOutbox(
+    db_path=os.getenv('OUTBOX_DB_PATH', 'outbox.sqlite3'),
+    instance_id=os.getenv('ULTRAMSG_INSTANCE_ID', ''),
+    deliver=deliver_ultramsg,
+    rate=float(os.getenv('ULTRAMSG_RATE_PER_SECOND', '5')),
+    burst=int(os.getenv('ULTRAMSG_RATE_BURST', '10')),
+    max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5')),
+    backoff=float(os.getenv('OUTBOX_RETRY_BACKOFF', '2')),
+    retention_hours=float(os.getenv('OUTBOX_RETENTION_HOURS', '72')),
+    merge_window=float(os.getenv('OUTBOX_MERGE_WINDOW', '0.15')),
+    merge_max_chars=int(os.getenv('OUTBOX_MERGE_MAX_CHARS', '4000')),
+    workers=int(os.getenv('OUTBOX_WORKERS', '4')),
+    is_available=lambda: ultramsg_breaker.available
+) if OUTBOX_ENABLED else None
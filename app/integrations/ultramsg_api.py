@@ -2,32 +2,53 @@
 """
 Integração com a API UltraMsg para WhatsApp
 """
-import base64
 import os
 import requests
 import logging
 from typing import Dict, Any, Optional
-from urllib.parse import quote
+
+from app.integrations.http_transport import ultramsg_transport
+from app.integrations.ultramsg_format import (  # noqa: F401 (reexportados)
+    ULTRAMSG_API_URL, encode_form_payload, format_phone, is_unavailable_status
+)
+from app.integrations.document_upload import document_form_body
+from app.utils.circuit_breaker import ultramsg_breaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+
 class UltraMsgAPI:
     """
-    Cliente para a API UltraMsg
+    Cliente para a API UltraMsg (backend "ultramsg"/"standin" do
+    transporte de mensagens, ver app/integrations/messaging.py)
     """
     
-    def __init__(self):
+    name = "ultramsg"
+
+    def __init__(self, api_url: Optional[str] = None):
+        """
+        Args:
+            api_url: Endereço da API (padrão ULTRAMSG_API_URL; ex: stand-in local)
+        """
         self.instance_id = os.getenv('ULTRAMSG_INSTANCE_ID')
         self.token = os.getenv('ULTRAMSG_TOKEN')
-        self.base_url = f"https://api.ultramsg.com/{self.instance_id}"
+        api_url = (api_url or ULTRAMSG_API_URL).rstrip('/')
+        self.base_url = f"{api_url}/{self.instance_id}"
         
         if not self.instance_id or not self.token:
             logger.error("ULTRAMSG_INSTANCE_ID e ULTRAMSG_TOKEN devem estar configurados")
             raise ValueError("Credenciais UltraMsg não configuradas")
     
-    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _make_request(self, endpoint: str, data: Dict[str, Any],
+                      document_path: Optional[str] = None) -> Dict[str, Any]:
         """
         Faz requisição para a API UltraMsg
+
+        Args:
+            endpoint: Endpoint da API (ex: messages/chat)
+            data: Campos do formulário
+            document_path: Arquivo local enviado no campo "document" (por URL
+                pública ou em streaming, sem carregar o arquivo em memória)
         """
         try:
             url = f"{self.base_url}/{endpoint}"
@@ -36,21 +57,34 @@ class UltraMsgAPI:
             data['token'] = self.token
             
             # Preparar payload
-            payload = "&".join([f"{k}={quote(str(v))}" for k, v in data.items()])
-            payload = payload.encode('utf8').decode('iso-8859-1')
+            if document_path:
+                payload = document_form_body(data, document_path)
+            else:
+                payload = encode_form_payload(data)
             
             headers = {'content-type': 'application/x-www-form-urlencoded'}
             
-            response = requests.post(url, data=payload, headers=headers, timeout=30)
+            # Sessão keep-alive compartilhada (pool, timeouts e retry de conexão)
+            response = ultramsg_breaker.call(
+                ultramsg_transport.post, url, data=payload, headers=headers,
+                failure_if=is_unavailable_status
+            )
             
             if response.status_code == 200:
                 result = response.json()
+                # O UltraMsg também responde 200 com {"error": ...} (ex: número inválido)
+                if isinstance(result, dict) and result.get("error") and not result.get("sent"):
+                    logger.error(f"Erro na requisição UltraMsg: {result.get('error')}")
+                    return {"success": False, "error": str(result.get("error")), "data": result}
                 logger.info(f"Requisição UltraMsg bem-sucedida: {endpoint}")
                 return {"success": True, "data": result}
             else:
                 logger.error(f"Erro na requisição UltraMsg: {response.status_code} - {response.text}")
                 return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
                 
+        except CircuitOpenError:
+            logger.warning(f"Circuito UltraMsg aberto, requisição não enviada: {endpoint}")
+            return {"success": False, "error": "Circuito UltraMsg aberto", "circuit_open": True}
         except requests.exceptions.Timeout:
             logger.error("Timeout na requisição UltraMsg")
             return {"success": False, "error": "Timeout na requisição"}
@@ -143,18 +177,15 @@ class UltraMsgAPI:
         """
         try:
             phone = self._format_phone(phone)
-            # Converter arquivo para base64
-            with open(document_url, "rb") as f:
-                encoded = base64.b64encode(f.read()).decode("utf-8")
 
             data = {
                 "to": phone,
-                "document": encoded,
                 "filename": filename,
                 "caption": caption
             }
             
-            result = self._make_request("messages/document", data)
+            # Documento por URL ou base64 em streaming (não carrega o PDF inteiro)
+            result = self._make_request("messages/document", data, document_path=document_url)
             
             if result["success"]:
                 logger.info(f"Documento enviado para {phone}: {filename}")
@@ -231,18 +262,7 @@ class UltraMsgAPI:
         Returns:
             Número formatado
         """
-        # Remover caracteres especiais
-        phone = ''.join(filter(str.isdigit, phone))
-        
-        # Adicionar código do país se não tiver
-        if not phone.startswith('55'):
-            phone = '55' + phone
-        
-        # Adicionar + no início
-        if not phone.startswith('+'):
-            phone = '+' + phone
-        
-        return phone
+        return format_phone(phone)
 
 # Instância global da API
 ultramsg_api = UltraMsgAPI()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente assíncrono da API UltraMsg (aiohttp)
+Usado pelo modo de serviço asyncio (async_main.py)
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict
+
+from app.integrations.ultramsg_format import ULTRAMSG_API_URL, encode_form_payload, format_phone, is_unavailable_status
+from app.utils.circuit_breaker import ultramsg_breaker, CircuitOpenError
+from app.integrations.document_upload import READ_CHUNK, StreamingFormBody, document_form_body
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncUltraMsgClient:
+    """
+    Cliente UltraMsg com a mesma interface do UltraMsgAdapter
+    (send_message / send_document), mas com métodos assíncronos
+    """
+
+    def __init__(self, session, instance_id: str = None, token: str = None, api_url: str = None):
+        """
+        Args:
+            session: aiohttp.ClientSession compartilhada (pool de conexões)
+            api_url: Endereço da API (padrão ULTRAMSG_API_URL; ex: stand-in local)
+        """
+        self.session = session
+        self.instance_id = instance_id or os.getenv('ULTRAMSG_INSTANCE_ID')
+        self.token = token or os.getenv('ULTRAMSG_TOKEN')
+        self.base_url = f"{(api_url or ULTRAMSG_API_URL).rstrip('/')}/{self.instance_id}"
+
+    async def _make_request(self, endpoint: str, data: Dict[str, Any],
+                            document_path: str = None) -> Dict[str, Any]:
+        """
+        Faz requisição para a API UltraMsg sem bloquear o event loop
+
+        Args:
+            document_path: Arquivo enviado no campo "document" (por URL ou streaming)
+        """
+        import aiohttp
+
+        if not ultramsg_breaker.available:
+            logger.warning(f"Circuito UltraMsg aberto, requisição não enviada: {endpoint}")
+            return {"success": False, "error": "Circuito UltraMsg aberto", "circuit_open": True}
+
+        try:
+            data['token'] = self.token
+            headers = {'content-type': 'application/x-www-form-urlencoded'}
+
+            if document_path:
+                body = await asyncio.to_thread(document_form_body, data, document_path)
+                if isinstance(body, StreamingFormBody):
+                    headers['content-length'] = str(await asyncio.to_thread(len, body))
+                    body = _stream_body(body)
+            else:
+                body = encode_form_payload(data)
+
+            response = await ultramsg_breaker.call_async(
+                self.session.post,
+                f"{self.base_url}/{endpoint}",
+                data=body,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=30),
+                failure_if=is_unavailable_status
+            )
+
+            async with response:
+                if response.status == 200:
+                    result = await response.json(content_type=None)
+                    logger.info(f"Requisição UltraMsg bem-sucedida: {endpoint}")
+                    return {"success": True, "data": result}
+
+                text = await response.text()
+                logger.error(f"Erro na requisição UltraMsg: {response.status} - {text}")
+                return {"success": False, "error": f"HTTP {response.status}: {text}"}
+
+        except CircuitOpenError:
+            logger.warning(f"Circuito UltraMsg aberto, requisição não enviada: {endpoint}")
+            return {"success": False, "error": "Circuito UltraMsg aberto", "circuit_open": True}
+        except asyncio.TimeoutError:
+            logger.error("Timeout na requisição UltraMsg")
+            return {"success": False, "error": "Timeout na requisição"}
+        except Exception as e:
+            logger.error(f"Erro na requisição UltraMsg: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    async def send_message(self, phone: str, message: str) -> bool:
+        """Envia mensagem de texto"""
+        result = await self._make_request("messages/chat", {
+            "to": format_phone(phone),
+            "body": message
+        })
+        return result["success"]
+
+    async def send_document(self, phone: str, pdf_path: str, caption: str = "") -> bool:
+        """Envia documento local (por URL pública ou base64 em streaming)"""
+        if not os.path.exists(pdf_path):
+            logger.error(f"Documento não encontrado: {pdf_path}")
+            return False
+
+        result = await self._make_request("messages/document", {
+            "to": format_phone(phone),
+            "filename": os.path.basename(pdf_path),
+            "caption": caption
+        }, document_path=pdf_path)
+        return result["success"]
+
+
+class AsyncTransportAdapter:
+    """
+    Usa um transporte síncrono de app/integrations/messaging.py (ex: fake)
+    com a interface assíncrona, executando os envios em thread
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def send_message(self, phone: str, message: str) -> bool:
+        result = await asyncio.to_thread(self.transport.send_text_message, phone, message)
+        return result.get("success", False)
+
+    async def send_document(self, phone: str, pdf_path: str, caption: str = "") -> bool:
+        result = await asyncio.to_thread(
+            self.transport.send_document, phone, pdf_path, os.path.basename(pdf_path), caption
+        )
+        return result.get("success", False)
+
+
+def create_async_client(session):
+    """Cliente assíncrono conforme MESSAGING_BACKEND"""
+    from app.integrations.messaging import MESSAGING_BACKEND, messaging_transport
+
+    backend = MESSAGING_BACKEND.lower()
+    if backend == "fake":
+        return AsyncTransportAdapter(messaging_transport)
+    if backend == "standin":
+        return AsyncUltraMsgClient(session, api_url=os.getenv('ULTRAMSG_STANDIN_URL', 'http://127.0.0.1:5099'))
+    return AsyncUltraMsgClient(session)
+
+
+async def _stream_body(body: StreamingFormBody):
+    """Gera o corpo em blocos (leitura do arquivo em thread)"""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(body.read, READ_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        body.close()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Formatos do UltraMsg (telefone, corpo dos formulários, status de falha)
+Sem credenciais nem cliente: usado pelos clientes síncrono/assíncrono e
+pelos backends de teste (fake) sem depender de ULTRAMSG_INSTANCE_ID/TOKEN
+"""
+import os
+from typing import Any, Dict
+from urllib.parse import quote
+
+ULTRAMSG_API_URL = os.getenv('ULTRAMSG_API_URL', 'https://api.ultramsg.com')
+
+
+def encode_form_payload(data: Dict[str, Any]) -> str:
+    """
+    Codifica o corpo x-www-form-urlencoded no formato aceito pelo UltraMsg
+    """
+    payload = "&".join([f"{k}={quote(str(v))}" for k, v in data.items()])
+    return payload.encode('utf8').decode('iso-8859-1')
+
+
+def format_phone(phone: str) -> str:
+    """
+    Formata número de telefone para o padrão UltraMsg (+55...)
+    """
+    # Remover caracteres especiais
+    phone = ''.join(filter(str.isdigit, phone))
+
+    # Adicionar código do país se não tiver
+    if not phone.startswith('55'):
+        phone = '55' + phone
+
+    # Adicionar + no início
+    if not phone.startswith('+'):
+        phone = '+' + phone
+
+    return phone
+
+
+def is_unavailable_status(response) -> bool:
+    """Respostas que contam como falha da dependência no circuit breaker"""
+    status = getattr(response, 'status_code', None) or getattr(response, 'status', 0)
+    return status >= 500 or status == 429
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in local da API UltraMsg
+Servidor HTTP que imita os endpoints de envio do UltraMsg (latência, 429
+por limite de taxa e falhas aleatórias) e registra tudo o que recebeu,
+para benchmarks e testes do bot sem WhatsApp real.
+
+Uso:
+    python -m app.integrations.ultramsg_standin --port 5099 --latency-ms 150 --rate-limit 10
+    MESSAGING_BACKEND=standin ULTRAMSG_STANDIN_URL=http://127.0.0.1:5099 python main.py
+
+Endpoints de inspeção:
+    GET    /_standin/sent[?phone=55...]   mensagens recebidas
+    DELETE /_standin/sent                 limpa o registro
+    GET    /_standin/stats                contadores
+"""
+import json
+import time
+import random
+import base64
+import hashlib
+import logging
+import argparse
+import binascii
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class UltraMsgStandin:
+    """
+    Stand-in do UltraMsg (pode rodar em thread dentro de um benchmark)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5099, latency: float = 0.0,
+                 jitter: float = 0.0, rate_limit: float = 0, failure_rate: float = 0.0,
+                 token: Optional[str] = None, record_path: Optional[str] = None):
+        """
+        Args:
+            latency: Latência média por requisição (segundos)
+            jitter: Variação máxima da latência (segundos, +/-)
+            rate_limit: Requisições por segundo por instância antes do 429 (0 desativa)
+            failure_rate: Fração de requisições respondidas com 500
+            token: Se informado, requisições com outro token recebem 401
+            record_path: Arquivo NDJSON onde cada envio também é gravado
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.token = token
+        self.record_path = record_path
+
+        self.sent: List[Dict] = []
+        self.counters = Counter()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "UltraMsgStandin":
+        """Inicia em thread (retorna self)"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ultramsg-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_forever(self):
+        logger.info(f"Stand-in UltraMsg em {self.url}")
+        self.server.serve_forever()
+
+    def clear(self):
+        with self._lock:
+            self.sent.clear()
+            self.counters.clear()
+
+    def messages_for(self, phone: str) -> List[Dict]:
+        digits = ''.join(filter(str.isdigit, phone))
+        with self._lock:
+            return [m for m in self.sent if ''.join(filter(str.isdigit, m["to"])) == digits]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"recorded": len(self.sent), **self.counters}
+
+    # ------------------------------------------------------------------
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _allow(self, instance: str) -> bool:
+        """Token bucket por instância (capacidade = 1 segundo de taxa)"""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(instance, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - updated) * self.rate_limit)
+            allowed = tokens >= 1
+            self._buckets[instance] = (tokens - 1 if allowed else tokens, now)
+            return allowed
+
+    def _handle_send(self, instance: str, kind: str, fields: Dict) -> Tuple[int, Dict]:
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if self.token and fields.get("token") != self.token:
+            self._count("unauthorized")
+            return 401, {"error": "Wrong token. Please provide token as a GET parameter."}
+
+        if not self._allow(instance):
+            self._count("rate_limited")
+            return 429, {"error": "Too Many Requests"}
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            self._count("failed")
+            return 500, {"error": "simulated failure"}
+
+        if not fields.get("to"):
+            self._count("invalid")
+            return 200, {"error": [{"to": "the to field is required"}]}
+
+        entry = {"instance": instance, "kind": kind, "to": fields.get("to"), "timestamp": time.time()}
+        for key in ("body", "caption", "filename", "image", "audio"):
+            if key in fields:
+                entry[key] = fields[key]
+        if "document" in fields:
+            entry.update(_describe_document(fields["document"]))
+
+        with self._lock:
+            self.sent.append(entry)
+            entry["id"] = len(self.sent)
+            self.counters["sent"] += 1
+            if self.record_path:
+                with open(self.record_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return 200, {"sent": "true", "message": "ok", "id": entry["id"]}
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _reply(self, status: int, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _fields(self) -> Dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                query = urlparse(self.path).query
+                fields = {k: v[0] for k, v in parse_qs(query).items()}
+                fields.update({k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()})
+                return fields
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                parts = [p for p in parsed.path.split("/") if p]
+                if parts == ["_standin", "sent"]:
+                    phone = parse_qs(parsed.query).get("phone", [None])[0]
+                    with standin._lock:
+                        sent = list(standin.sent)
+                    if phone:
+                        sent = standin.messages_for(phone)
+                    return self._reply(200, sent)
+                if parts == ["_standin", "stats"]:
+                    return self._reply(200, standin.stats())
+                if len(parts) == 3 and parts[1:] == ["instance", "status"]:
+                    return self._reply(200, {"status": {"accountStatus": {"status": "authenticated"}}})
+                return self._reply(404, {"error": "not found"})
+
+            def do_DELETE(self):
+                if urlparse(self.path).path.rstrip("/") == "/_standin/sent":
+                    standin.clear()
+                    return self._reply(200, {"cleared": True})
+                return self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                parts = [p for p in urlparse(self.path).path.split("/") if p]
+                fields = self._fields()
+                if len(parts) == 3 and parts[1] == "messages":
+                    status, body = standin._handle_send(parts[0], parts[2], fields)
+                    return self._reply(status, body)
+                if len(parts) == 3 and parts[1:] == ["instance", "status"]:
+                    return self._reply(200, {"status": {"accountStatus": {"status": "authenticated"}}})
+                return self._reply(404, {"error": "not found"})
+
+        return Handler
+
+
+def _describe_document(document: str) -> Dict:
+    """Registra URL ou tamanho/hash do base64 (sem guardar o arquivo)"""
+    if document.startswith(("http://", "https://")):
+        return {"document_url": document}
+    try:
+        content = base64.b64decode(document, validate=True)
+    except (binascii.Error, ValueError):
+        return {"document_error": "invalid base64"}
+    return {"document_bytes": len(content), "document_sha256": hashlib.sha256(content).hexdigest()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in local da API UltraMsg")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--latency-ms", type=float, default=150, help="Latência média (ms)")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Variação da latência (ms, +/-)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Req/s por instância antes do 429 (0 = sem limite)")
+    parser.add_argument("--failure-rate", type=float, default=0, help="Fração de respostas 500 (0-1)")
+    parser.add_argument("--token", help="Exige este token")
+    parser.add_argument("--record", help="Grava os envios em NDJSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    UltraMsgStandin(
+        host=args.host,
+        port=args.port,
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        rate_limit=args.rate_limit,
+        failure_rate=args.failure_rate,
+        token=args.token,
+        record_path=args.record
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Interpretação do payload de webhook do UltraMsg
+Compartilhado entre o servidor Flask (main.py) e o modo asyncio (async_main.py)
+"""
+from typing import Dict, Optional, Tuple
+
+ACCEPTED_EVENT_TYPES = ('message_create', 'message_received', '')
+
+
+def parse_webhook_event(data: Optional[Dict]) -> Tuple[Optional[Dict], Optional[Dict], int]:
+    """
+    Valida o evento e extrai telefone, texto e id da mensagem
+
+    Args:
+        data: JSON recebido no webhook
+
+    Returns:
+        Tuple (evento, resposta, status):
+        - evento com phone/message/message_id quando deve ser processado
+        - caso contrário, a resposta JSON e o status HTTP para o UltraMsg
+    """
+    data = data or {}
+
+    # Ignorar mensagens do próprio bot
+    data_field = data.get('data', {}) or {}
+    from_me = data_field.get('fromMe', False)
+    is_self = data_field.get('self', False)
+
+    if from_me or is_self:
+        return None, {"status": "ignored", "reason": "message_from_bot"}, 200
+
+    event_type = data.get('event_type', '')
+    if event_type not in ACCEPTED_EVENT_TYPES:
+        return None, {"status": "ignored", "reason": f"event_type_{event_type}"}, 200
+
+    phone = data_field.get('from', data.get('from', ''))
+    phone = phone.replace('@c.us', '').replace('@g.us', '')
+
+    if not phone:
+        return None, {"error": "Telefone não encontrado"}, 400
+
+    message = data_field.get('body', data.get('body', ''))
+    if not message:
+        return None, {"status": "ignored", "reason": "empty_message"}, 200
+
+    event = {
+        "phone": phone,
+        "message": message,
+        # Reentregas e pares message_create/message_received têm o mesmo id
+        "message_id": data_field.get('id', ''),
+        "event_type": event_type
+    }
+    return event, None, 200
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Autômato Aho-Corasick
+Procura muitos padrões de uma vez em uma única passada pelo texto: os
+padrões são compilados em uma trie com links de falha, e cada caractere
+do texto custa uma transição (amortizada), independentemente de quantos
+padrões existam
+"""
+
+from collections import deque
+from typing import Dict, Hashable, Iterator, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Conjunto de padrões -> valores
+
+    Uso:
+        automaton = AhoCorasick()
+        automaton.add("atendente", "handoff")
+        automaton.build()
+        automaton.find("quero um atendente")  # {"handoff"}
+
+    Padrões iguais acumulam valores; o mesmo valor em vários padrões
+    aparece uma vez em find().
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Hashable, ...]] = [()]
+        self._built = False
+        self.patterns = 0
+
+    def add(self, pattern: str, value: Hashable):
+        """Adiciona um padrão (padrão vazio é ignorado)"""
+        if not pattern:
+            return
+        if self._built:
+            raise RuntimeError("autômato já compilado")
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = next_node
+        self._out[node] += (value,)
+        self.patterns += 1
+
+    def build(self) -> "AhoCorasick":
+        """Calcula os links de falha (BFS) e junta as saídas dos sufixos"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+        self._built = True
+        return self
+
+    def iter(self, text: str) -> Iterator[Tuple[int, Hashable]]:
+        """(posição final, valor) de cada ocorrência, na ordem do texto"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for value in out[node]:
+                yield position, value
+
+    def find(self, text: str) -> Set[Hashable]:
+        """Valores de todos os padrões presentes no texto"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
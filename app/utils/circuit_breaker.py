@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit Breakers das Dependências Externas
+OpenAI, UltraMsg e SwissRe: com a dependência falhando ou lenta, o circuito
+abre e o bot vai direto para o comportamento degradado em vez de esperar
+o timeout a cada mensagem
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o circuito da dependência está aberto"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuito '{name}' aberto")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por taxa de erro em janela deslizante
+
+    - closed: chamadas passam; cada resultado entra na janela (as últimas
+      `window_size` chamadas). Chamadas mais lentas que `slow_call_seconds`
+      contam como falha. Com pelo menos `min_calls` na janela e taxa de
+      falha >= `failure_rate`, o circuito abre
+    - open: chamadas são recusadas até `open_seconds` passarem
+    - half_open: até `half_open_calls` chamadas de teste; se todas derem
+      certo o circuito fecha, qualquer falha reabre
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10,
+                 window_size: int = 20, slow_call_seconds: float = 0,
+                 open_seconds: float = 30, half_open_calls: int = 1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self._window = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    @property
+    def available(self) -> bool:
+        """True se uma chamada seria aceita agora (não consome vaga de teste)"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state == CLOSED or (
+                self._state == HALF_OPEN and self._probes < self.half_open_calls
+            )
+
+    def allow(self) -> bool:
+        """Reserva a chamada; quem recebe True deve chamar record() depois"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.rejected_count += 1
+        metrics.incr(f"breaker.{self.name}.rejected")
+        return False
+
+    def record(self, success: bool, duration: float = 0.0):
+        """Registra o resultado de uma chamada autorizada por allow()"""
+        if success and self.slow_call_seconds and duration > self.slow_call_seconds:
+            success = False
+            metrics.incr(f"breaker.{self.name}.slow_calls")
+
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if not success:
+                    self._open("falha na chamada de teste")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._close()
+                return
+
+            self._window.append(success)
+            if self._state == CLOSED and len(self._window) >= self.min_calls:
+                failures = self._window.count(False)
+                if failures / len(self._window) >= self.failure_rate:
+                    self._open(f"{failures}/{len(self._window)} falhas")
+
+    def call(self, func: Callable, *args, failure_if: Optional[Callable] = None, **kwargs):
+        """
+        Executa func pelo circuito
+
+        Args:
+            failure_if: Predicado opcional sobre o retorno (ex: status 5xx)
+
+        Raises:
+            CircuitOpenError: se o circuito estiver aberto
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(not (failure_if and failure_if(result)), time.monotonic() - started)
+        return result
+
+    async def call_async(self, func: Callable, *args, failure_if: Optional[Callable] = None, **kwargs):
+        """Mesmo que call() para corrotinas"""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(not (failure_if and failure_if(result)), time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return {
+                "state": self._state,
+                "window_calls": len(self._window),
+                "window_failures": self._window.count(False),
+                "opened_count": self.opened_count,
+                "rejected": self.rejected_count,
+                "retry_in": round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+                if self._state == OPEN else 0
+            }
+
+    # Chamados com o lock
+
+    def _refresh(self, now: float):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN)
+            self._opened_at = now
+            self._probes = 0
+            self._probe_successes = 0
+        elif self._state == HALF_OPEN and now - self._opened_at >= self.open_seconds:
+            # Chamada de teste que nunca registrou resultado: libera nova tentativa
+            self._opened_at = now
+            self._probes = 0
+
+    def _open(self, reason: str):
+        self._set_state(OPEN)
+        self._opened_at = time.monotonic()
+        self.opened_count += 1
+        metrics.incr(f"breaker.{self.name}.opened")
+        logger.warning(f"Circuito '{self.name}' aberto ({reason}) por {self.open_seconds}s")
+
+    def _close(self):
+        self._set_state(CLOSED)
+        self._window.clear()
+        logger.info(f"Circuito '{self.name}' fechado")
+
+    def _set_state(self, state: str):
+        self._state = state
+        metrics.set_gauge(f"breaker.{self.name}.state", STATE_GAUGE[state])
+
+
+def _breaker_from_env(name: str, slow_call_default: str) -> CircuitBreaker:
+    prefix = f"BREAKER_{name.upper()}_"
+    return CircuitBreaker(
+        name=name,
+        failure_rate=float(os.getenv(prefix + 'FAILURE_RATE', os.getenv('BREAKER_FAILURE_RATE', '0.5'))),
+        min_calls=int(os.getenv(prefix + 'MIN_CALLS', os.getenv('BREAKER_MIN_CALLS', '10'))),
+        window_size=int(os.getenv(prefix + 'WINDOW', os.getenv('BREAKER_WINDOW', '20'))),
+        slow_call_seconds=float(os.getenv(prefix + 'SLOW_CALL_SECONDS', slow_call_default)),
+        open_seconds=float(os.getenv(prefix + 'OPEN_SECONDS', os.getenv('BREAKER_OPEN_SECONDS', '30')))
+    )
+
+
+# Instâncias globais (uma por dependência)
+openai_breaker = _breaker_from_env("openai", "10")
+ultramsg_breaker = _breaker_from_env("ultramsg", "15")
+swissre_breaker = _breaker_from_env("swissre", "60")
+
+circuit_breakers = {
+    breaker.name: breaker for breaker in (openai_breaker, ultramsg_breaker, swissre_breaker)
+}
+
+
+def breakers_stats() -> Dict:
+    """Estado de todos os circuitos (para /health)"""
+    return {name: breaker.stats() for name, breaker in circuit_breakers.items()}
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Limite Adaptativo de Concorrência (AIMD)
+Controla quantas chamadas simultâneas vão para OpenAI e SwissRe: o limite
+cresce devagar enquanto a latência está saudável e cai pela metade em
+429/5xx/timeout ou quando a latência infla, em vez de mandar rajadas que
+estouram o rate limit do provedor
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LimiterTimeout(Exception):
+    """Nenhuma vaga liberada dentro do tempo de espera"""
+
+    def __init__(self, name: str, waited: float):
+        super().__init__(f"Limite de concorrência '{name}' atingido ({waited:.1f}s de espera)")
+        self.name = name
+
+
+class AdaptiveLimiter:
+    """
+    Limitador de chamadas simultâneas com ajuste AIMD
+
+    - aumento aditivo: cada chamada bem-sucedida com o limite em uso
+      (pelo menos metade das vagas ocupadas) soma `increase / limite`,
+      ou seja, cerca de +increase por "rodada" de chamadas
+    - redução multiplicativa: sobrecarga (429/5xx/timeout) ou latência
+      suavizada acima de `latency_tolerance` x a latência base multiplica
+      o limite por `backoff`, no máximo uma vez por latência observada
+      (várias falhas da mesma rajada contam como um único sinal)
+
+    A latência base é a média móvel longa (~1/baseline_alpha chamadas),
+    não o mínimo: a variação normal do provedor (ex: 0,8-4s na OpenAI)
+    não conta como inflação; só uma subida sustentada da latência recente
+    em relação à base, depois de `warmup` chamadas, corta o limite.
+    """
+
+    def __init__(self, name: str, initial_limit: int = 4, min_limit: int = 1,
+                 max_limit: int = 32, increase: float = 1.0, backoff: float = 0.5,
+                 latency_tolerance: float = 2.0, acquire_timeout: float = 10.0,
+                 baseline_alpha: float = 0.01, warmup: int = 20):
+        """
+        Args:
+            initial_limit: Chamadas simultâneas permitidas no início
+            min_limit / max_limit: Faixa do limite adaptativo
+            increase: Aumento aditivo por rodada saudável
+            backoff: Fator de redução na sobrecarga (0-1)
+            latency_tolerance: Inflação da latência (x base) tratada como sobrecarga
+            acquire_timeout: Espera máxima padrão por uma vaga (segundos)
+            baseline_alpha: Peso de cada chamada na latência base (média longa)
+            warmup: Chamadas medidas antes de a latência poder reduzir o limite
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.acquire_timeout = acquire_timeout
+        self.baseline_alpha = baseline_alpha
+        self.warmup = warmup
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._baseline = None
+        self._smoothed = None
+        self._samples = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = deque()
+        self.drops = 0
+        self.timeouts = 0
+
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Espera uma vaga (True) ou desiste após timeout (False)"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    metrics.incr(f"limiter.{self.name}.timeouts")
+                    return False
+                self._cond.wait(remaining)
+            self._in_flight += 1
+        self._publish()
+        return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """Mesmo que acquire() sem bloquear o event loop"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._in_flight < int(self._limit) and not self._async_waiters:
+                self._in_flight += 1
+                waiter = None
+            else:
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+
+        if waiter is not None:
+            try:
+                # A vaga é reservada por quem liberou (release) antes de acordar o waiter
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                        granted = False
+                    except ValueError:
+                        granted = True
+                if isinstance(e, asyncio.CancelledError):
+                    if granted:
+                        self.release()
+                    raise
+                if not granted:
+                    self.timeouts += 1
+                    metrics.incr(f"limiter.{self.name}.timeouts")
+                    return False
+
+        self._publish()
+        return True
+
+    def release(self, duration: Optional[float] = None, overloaded: bool = False):
+        """
+        Libera a vaga e ajusta o limite
+
+        Args:
+            duration: Latência da chamada (None não ajusta, ex: erro não relacionado à carga)
+            overloaded: 429/5xx/timeout do provedor
+        """
+        now = time.monotonic()
+        with self._cond:
+            busy = self._in_flight
+            self._in_flight -= 1
+            if overloaded or duration is not None:
+                self._adjust(now, busy, duration, overloaded)
+            self._wake()
+        self._publish()
+
+    def call(self, func: Callable, *args, overloaded_if: Optional[Callable] = None,
+             overload_error: Optional[Callable] = None, acquire_timeout: Optional[float] = None,
+             **kwargs):
+        """
+        Executa func ocupando uma vaga
+
+        Args:
+            overloaded_if: Predicado sobre o retorno que indica sobrecarga (ex: status 429)
+            overload_error: Predicado sobre a exceção que indica sobrecarga
+            acquire_timeout: Espera máxima por vaga (padrão do limitador)
+
+        Raises:
+            LimiterTimeout: se nenhuma vaga for liberada a tempo
+        """
+        started = time.monotonic()
+        if not self.acquire(acquire_timeout):
+            raise LimiterTimeout(self.name, time.monotonic() - started)
+
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            overloaded = bool(overload_error and overload_error(e))
+            self.release(time.monotonic() - started if overloaded else None, overloaded)
+            raise
+        self.release(time.monotonic() - started, bool(overloaded_if and overloaded_if(result)))
+        return result
+
+    async def call_async(self, func: Callable, *args, overloaded_if: Optional[Callable] = None,
+                         overload_error: Optional[Callable] = None,
+                         acquire_timeout: Optional[float] = None, **kwargs):
+        """Mesmo que call() para corrotinas"""
+        started = time.monotonic()
+        if not await self.acquire_async(acquire_timeout):
+            raise LimiterTimeout(self.name, time.monotonic() - started)
+
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            overloaded = isinstance(e, Exception) and bool(overload_error and overload_error(e))
+            self.release(time.monotonic() - started if overloaded else None, overloaded)
+            raise
+        self.release(time.monotonic() - started, bool(overloaded_if and overloaded_if(result)))
+        return result
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "waiting_async": len(self._async_waiters),
+                "baseline_ms": round(self._baseline * 1000, 1) if self._baseline else None,
+                "latency_ms": round(self._smoothed * 1000, 1) if self._smoothed else None,
+                "drops": self.drops,
+                "timeouts": self.timeouts
+            }
+
+    # Chamados com o lock
+
+    def _adjust(self, now: float, busy: int, duration: Optional[float], overloaded: bool):
+        inflated = False
+        if duration is not None:
+            self._samples += 1
+            if self._smoothed is None:
+                self._smoothed = self._baseline = duration
+            else:
+                self._smoothed = 0.8 * self._smoothed + 0.2 * duration
+                self._baseline += (duration - self._baseline) * self.baseline_alpha
+            inflated = (self._samples >= self.warmup
+                        and self._smoothed > self._baseline * self.latency_tolerance)
+
+        if overloaded or inflated:
+            # Uma redução por "rodada": respostas da mesma rajada chegam juntas
+            if now - self._last_decrease >= (self._smoothed or 0):
+                previous = int(self._limit)
+                self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                self._last_decrease = now
+                self.drops += 1
+                metrics.incr(f"limiter.{self.name}.drops")
+                if int(self._limit) != previous:
+                    reason = "sobrecarga" if overloaded else "latência inflada"
+                    logger.warning(f"Limite '{self.name}' reduzido {previous} -> {int(self._limit)} ({reason})")
+            return
+
+        if busy * 2 >= int(self._limit):
+            self._limit = min(float(self.max_limit), self._limit + self.increase / self._limit)
+
+    def _wake(self):
+        """Entrega vagas livres para waiters async (reservando) ou acorda uma thread"""
+        while self._async_waiters and self._in_flight < int(self._limit):
+            loop, waiter = self._async_waiters.popleft()
+            self._in_flight += 1
+            loop.call_soon_threadsafe(_resolve, waiter)
+        if self._in_flight < int(self._limit):
+            self._cond.notify(int(self._limit) - self._in_flight)
+
+    def _publish(self):
+        metrics.set_gauge(f"limiter.{self.name}.limit", int(self._limit))
+        metrics.set_gauge(f"limiter.{self.name}.in_flight", self._in_flight)
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(True)
+
+
+def is_overload_status(status_code: Optional[int]) -> bool:
+    """429 e 5xx indicam sobrecarga do provedor"""
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def _limiter_from_env(name: str, initial: str, maximum: str, acquire_timeout: str) -> AdaptiveLimiter:
+    """Limitador configurado por LIMITER_<NOME>_INITIAL/_MIN/_MAX/_ACQUIRE_TIMEOUT"""
+    prefix = f"LIMITER_{name.upper()}_"
+    return AdaptiveLimiter(
+        name=name,
+        initial_limit=int(os.getenv(prefix + 'INITIAL', initial)),
+        min_limit=int(os.getenv(prefix + 'MIN', '1')),
+        max_limit=int(os.getenv(prefix + 'MAX', maximum)),
+        latency_tolerance=float(os.getenv('LIMITER_LATENCY_TOLERANCE', '2.0')),
+        acquire_timeout=float(os.getenv(prefix + 'ACQUIRE_TIMEOUT', acquire_timeout))
+    )
+
+
+# Instâncias globais (uma por endpoint: perfis de latência diferentes não dividem a base)
+openai_limiter = _limiter_from_env("openai", "4", "32", "5")
+swissre_quotation_limiter = _limiter_from_env("swissre_quotation", "2", "8", "60")
+swissre_document_limiter = _limiter_from_env("swissre_document", "2", "8", "60")
+
+concurrency_limiters = {
+    limiter.name: limiter
+    for limiter in (openai_limiter, swissre_quotation_limiter, swissre_document_limiter)
+}
+
+
+def limiters_stats() -> Dict:
+    """Limites atuais (para /health)"""
+    return {name: limiter.stats() for name, limiter in concurrency_limiters.items()}
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas em memória do processo
+Contadores, gauges e amostras de tempo expostos em /metrics
+"""
+
+import threading
+from collections import deque
+from typing import Dict
+
+
+class MetricsRegistry:
+    """
+    Registro simples de métricas (thread-safe)
+
+    Cada worker do gunicorn tem o seu próprio registro; os valores
+    expostos são do processo que atendeu a requisição.
+    """
+
+    def __init__(self, sample_size: int = 1024):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._samples = {}
+        self._sample_size = sample_size
+
+    def incr(self, name: str, value: int = 1):
+        """Incrementa um contador"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Define o valor atual de um gauge"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Registra uma amostra (ex: latência em segundos)"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self._sample_size)
+            samples.append(value)
+
+    def counter(self, name: str) -> int:
+        """Valor atual de um contador"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict:
+        """Retorna todas as métricas com percentis das amostras"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+
+        summaries = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            summaries[name] = {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+                "max": values[-1]
+            }
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "samples": summaries
+        }
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Instância global de métricas
+metrics = MetricsRegistry()
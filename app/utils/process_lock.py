@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Lock de Arquivo entre Processos
+Garante um único dono por arquivo local entre os workers do gunicorn
+(ex: snapshot e diário das sessões do backend em memória, que só têm
+as sessões do próprio processo)
+"""
+
+import os
+import logging
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, vale um processo só
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def try_lock_file(path: str) -> Optional[IO]:
+    """
+    Tenta o lock exclusivo de `<path>.lock` sem esperar
+
+    O lock fica com o processo enquanto o arquivo retornado estiver aberto
+    (o sistema libera quando o processo termina).
+
+    Returns:
+        Arquivo do lock ou None se outro processo já é o dono
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    handle = open(lock_path, "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Locks Listrados por Chave
+Uma tabela fixa de locks indexada pelo hash da chave (ex: telefone):
+operações da mesma chave são serializadas, chaves diferentes quase sempre
+caem em locks diferentes, sem um lock global e sem criar/limpar um lock
+por chave
+"""
+
+import os
+import zlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StripedLock:
+    """
+    `stripes` RLocks; a chave vai para o lock crc32(chave) % stripes
+
+    Reentrante: quem já segura o lock da chave pode entrar de novo. Vale
+    só dentro do processo; entre workers do gunicorn a consistência fica
+    com a versão das sessões no store. Os contadores são por lock e só
+    mudam com o lock seguro (sem corrida entre threads).
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        Args:
+            stripes: Quantidade de locks na tabela
+        """
+        self.stripes = max(1, stripes)
+        self._locks = [threading.RLock() for _ in range(self.stripes)]
+        self._acquired = [0] * self.stripes
+        self._contended = [0] * self.stripes
+
+    def _stripe(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.stripes
+
+    def lock_for(self, key: str) -> threading.RLock:
+        """Lock da chave"""
+        return self._locks[self._stripe(key)]
+
+    @contextmanager
+    def hold(self, key: str) -> Iterator[None]:
+        """Segura o lock da chave durante o bloco `with`"""
+        stripe = self._stripe(key)
+        lock = self._locks[stripe]
+        contended = not lock.acquire(blocking=False)
+        if contended:
+            lock.acquire()
+        try:
+            self._acquired[stripe] += 1
+            self._contended[stripe] += contended
+            yield
+        finally:
+            lock.release()
+
+    @property
+    def acquired(self) -> int:
+        return sum(self._acquired)
+
+    @property
+    def contended(self) -> int:
+        return sum(self._contended)
+
+    def stats(self) -> Dict:
+        return {"stripes": self.stripes, "acquired": self.acquired, "contended": self.contended}
+
+
+# Instância global: leitura-extração-mescla-gravação dos dados de cada telefone
+session_locks = StripedLock(int(os.getenv('SESSION_LOCK_STRIPES', '64')))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Timer Wheel Hierárquico
+Agenda e cancela timers em O(1) por chave (ex: um timer por conversa),
+sem varrer todos os pendentes a cada tick: cada nível é uma roda de
+`slots` posições, e um timer distante fica num nível alto até faltar
+pouco, quando desce (cascata) para o nível de baixo
+"""
+
+import math
+import time
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class _Timer:
+    __slots__ = ("key", "expires", "payload", "level", "slot")
+
+    def __init__(self, key: Hashable, expires: int, payload: Any):
+        self.key = key
+        self.expires = expires
+        self.payload = payload
+        self.level = 0
+        self.slot = 0
+
+
+class TimerWheel:
+    """
+    Timers por chave com resolução de `tick` segundos
+
+    Com 64 posições e 4 níveis (padrão) e tick de 1s, o nível 0 cobre 64s,
+    o 1 cerca de 68 min, o 2 cerca de 72 h e o 3 cerca de 194 dias; prazos
+    maiores ficam no último nível e são reposicionados até vencer.
+
+    Agendar de novo a mesma chave substitui o timer anterior.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4, clock=time.monotonic):
+        """
+        Args:
+            tick: Resolução em segundos
+            slots: Posições por nível (potência de 2)
+            levels: Quantidade de níveis
+            clock: Relógio monotônico (segundos)
+        """
+        if slots & (slots - 1):
+            raise ValueError("slots deve ser potência de 2")
+        self.tick = tick
+        self.levels = levels
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        self._clock = clock
+        self._wheels: List[List[Dict[Hashable, _Timer]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._timers: Dict[Hashable, _Timer] = {}
+        self._current = self._tick_of(clock())
+        self._lock = threading.Lock()
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def schedule(self, key: Hashable, delay: float, payload: Any = None):
+        """Agenda (ou reagenda) o timer da chave para daqui a `delay` segundos"""
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self._lock:
+            self._remove(key)
+            timer = _Timer(key, self._current + ticks, payload)
+            self._timers[key] = timer
+            self._insert(timer)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancela o timer da chave (False se não havia)"""
+        with self._lock:
+            return self._remove(key) is not None
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[Hashable, Any]]:
+        """
+        Avança o relógio até `now` e retorna os timers vencidos
+
+        Returns:
+            [(chave, payload)] na ordem de vencimento
+        """
+        target = self._tick_of(self._clock() if now is None else now)
+        fired = []
+        with self._lock:
+            while self._current < target:
+                self._current += 1
+                self._cascade()
+                slot = self._current & self._mask
+                bucket = self._wheels[0][slot]
+                if not bucket:
+                    continue
+                self._wheels[0][slot] = {}
+                for timer in bucket.values():
+                    if timer.expires <= self._current:
+                        del self._timers[timer.key]
+                        fired.append((timer.key, timer.payload))
+                    else:
+                        self._insert(timer)
+        self.fired += len(fired)
+        return fired
+
+    def stats(self) -> Dict:
+        return {"pending": len(self._timers), "fired": self.fired, "tick": self.tick}
+
+    # Chamados com o lock
+
+    def _tick_of(self, seconds: float) -> int:
+        return int(seconds / self.tick)
+
+    def _insert(self, timer: _Timer):
+        # Já vencido (atraso no advance): entra na posição atual
+        position = max(timer.expires, self._current)
+        distance = position - self._current
+        level = 0
+        while level < self.levels - 1 and distance >> (self._bits * (level + 1)):
+            level += 1
+        if distance >> (self._bits * (level + 1)):
+            # Além do alcance do último nível: fica na última posição e é reposicionado ao descer
+            position = self._current + (1 << (self._bits * (level + 1))) - 1
+        timer.level = level
+        timer.slot = (position >> (self._bits * level)) & self._mask
+        self._wheels[level][timer.slot][timer.key] = timer
+
+    def _remove(self, key: Hashable) -> Optional[_Timer]:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            del self._wheels[timer.level][timer.slot][key]
+        return timer
+
+    def _cascade(self):
+        """Desce para os níveis de baixo os timers da posição que acabou de começar"""
+        aligned = 0
+        while aligned < self.levels - 1 and not self._current & ((1 << (self._bits * (aligned + 1))) - 1):
+            aligned += 1
+        for level in range(aligned, 0, -1):
+            slot = (self._current >> (self._bits * level)) & self._mask
+            bucket = self._wheels[level][slot]
+            if bucket:
+                self._wheels[level][slot] = {}
+                for timer in bucket.values():
+                    self._insert(timer)
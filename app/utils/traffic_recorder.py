@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Gravador de Tráfego do Webhook
+Grava os payloads recebidos (com dados pessoais mascarados) em arquivos NDJSON rotativos
+para reprodução com replay_webhooks.py
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Campos com nome do contato no payload do UltraMsg
+NAME_FIELDS = ('pushname', 'notifyName', 'sender_name', 'name')
+# Campos que nunca devem ser gravados
+SECRET_FIELDS = ('token',)
+
+LONG_DIGITS_RE = re.compile(r'\d{10,}')
+CPF_RE = re.compile(r'\b\d{3}\.\d{3}\.\d{3}-\d{2}\b')
+# Endereços do WhatsApp (5511...@c.us) não são e-mails
+EMAIL_RE = re.compile(r'[\w.+-]+@(?!(?:c|g)\.us(?![A-Za-z]))[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}')
+
+
+class TrafficRecorder:
+    """
+    Grava eventos do webhook em NDJSON ({"ts": epoch, "payload": {...}})
+
+    Cada processo escreve no seu próprio arquivo (pid no nome). Ao passar de
+    `max_bytes` um novo arquivo é aberto e os mais antigos além de
+    `max_files` são removidos.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024,
+                 max_files: int = 10, salt: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.salt = salt
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self.recorded = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            logger.info(f"Gravação de webhooks ativada em {self.directory}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def record(self, payload: Dict):
+        """Grava um payload recebido (falhas são apenas logadas)"""
+        if not self.enabled:
+            return
+
+        try:
+            line = json.dumps(
+                {"ts": time.time(), "payload": self.mask(payload)},
+                ensure_ascii=False,
+                separators=(',', ':')
+            ) + "\n"
+            data = line.encode('utf-8')
+
+            with self._lock:
+                if self._file is None or self._size + len(data) > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                self._size += len(data)
+                self.recorded += 1
+
+        except Exception as e:
+            logger.error(f"Erro ao gravar webhook: {str(e)}")
+
+    def mask(self, value: Any, key: str = "") -> Any:
+        """
+        Mascara dados pessoais mantendo o formato:
+        - sequências longas de dígitos (telefones) viram pseudônimos estáveis,
+          então a ordem por telefone continua igual na reprodução
+        - CPF e e-mail no texto são substituídos
+        - nomes de contato são removidos
+        """
+        if isinstance(value, dict):
+            return {
+                k: self.mask(v, k) for k, v in value.items()
+                if k not in SECRET_FIELDS
+            }
+        if isinstance(value, list):
+            return [self.mask(v, key) for v in value]
+        if not isinstance(value, str):
+            return value
+
+        if key in NAME_FIELDS:
+            return "***"
+
+        value = LONG_DIGITS_RE.sub(lambda m: self._pseudonym(m.group()), value)
+        value = CPF_RE.sub("000.000.000-00", value)
+        return EMAIL_RE.sub("email@mascarado", value)
+
+    def _pseudonym(self, digits: str) -> str:
+        digest = hashlib.sha256((self.salt + digits).encode('utf-8')).hexdigest()
+        fake = str(int(digest, 16))[:len(digits)]
+        # Mantém o DDI para o número continuar válido no formato UltraMsg
+        if digits.startswith('55') and len(digits) > 2:
+            fake = '55' + fake[2:]
+        return fake
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+
+        filename = f"webhooks-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{int(time.time() * 1000) % 1000:03d}.ndjson"
+        self._file = open(os.path.join(self.directory, filename), "ab")
+        self._size = 0
+
+        files = sorted(
+            f for f in os.listdir(self.directory)
+            if f.startswith("webhooks-") and f.endswith(".ndjson")
+        )
+        for old in files[:-self.max_files] if self.max_files > 0 else []:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+
+# Instância global do gravador (desativado sem WEBHOOK_RECORD_DIR)
+traffic_recorder = TrafficRecorder(
+    directory=os.getenv('WEBHOOK_RECORD_DIR', ''),
+    max_bytes=int(float(os.getenv('WEBHOOK_RECORD_MAX_MB', '50')) * 1024 * 1024),
+    max_files=int(os.getenv('WEBHOOK_RECORD_MAX_FILES', '10')),
+    salt=os.getenv('WEBHOOK_RECORD_SALT', '')
+)
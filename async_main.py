@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Bot de Cotação de Seguros - Modo de serviço asyncio
+Webhook do UltraMsg em um único event loop (aiohttp): extração (AsyncOpenAI),
+envio (UltraMsg via aiohttp) e persistência (AsyncMongoClient) como corrotinas.
+
+O portal e a API REST continuam no Flask (main.py). Exemplo:
+    gunicorn main:app ...        # portal
+    python async_main.py         # webhook /webhook/ultramsg
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime
+
+from aiohttp import web, ClientSession, TCPConnector
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+from database_manager import db_manager
+from database_adapter import DatabaseAdapter
+from app.bot.async_bot_handler import AsyncBotHandler
+from app.bot.conversation_flow import conversation_flow
+from app.bot.session_store import MongoSessionStore, SESSION_STORE
+from app.bot.message_dedup import message_deduplicator
+from app.bot.session_snapshot import session_snapshotter
+from app.bot.session_hibernation import session_hibernator
+from app.bot.session_journal import session_journal
+from app.bot.conversation_timers import conversation_timers
+from app.bot.swissre_automation import SwissReAutomation
+from app.integrations.ultramsg_async import create_async_client
+from app.integrations.ultramsg_webhook import parse_webhook_event
+from app.utils.metrics import metrics
+from app.utils.traffic_recorder import traffic_recorder
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv('MONGO_URI')
+DB_NAME = os.getenv('DB_NAME', 'equinos_seguros')
+
+# Conversas em andamento no event loop (acima disso o webhook é recusado)
+ASYNC_MAX_INFLIGHT = int(os.getenv('ASYNC_MAX_INFLIGHT', '500'))
+ASYNC_HTTP_POOL_SIZE = int(os.getenv('ASYNC_HTTP_POOL_SIZE', '100'))
+WEBHOOK_RETRY_AFTER = os.getenv('WEBHOOK_RETRY_AFTER', '5')
+
+
+class PhoneSerializer:
+    """
+    Garante ordem por telefone no event loop: um asyncio.Lock por
+    telefone, removido quando não há mais mensagens pendentes
+    """
+
+    def __init__(self):
+        self._locks = {}
+
+    async def run(self, phone: str, coro_factory):
+        entry = self._locks.get(phone)
+        if entry is None:
+            entry = self._locks[phone] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await coro_factory()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(phone, None)
+
+
+class AsyncBotServer:
+    """Estado do servidor asyncio (sessão HTTP, MongoDB, handler)"""
+
+    def __init__(self):
+        self.http_session = None
+        self.mongo_client = None
+        self.session_client = None
+        self.db = None
+        self.handler = None
+        self.loop = None
+        self.serializer = PhoneSerializer()
+        self.inflight = 0
+        self._tasks = set()
+
+    async def startup(self, app):
+        self.http_session = ClientSession(connector=TCPConnector(limit=ASYNC_HTTP_POOL_SIZE))
+        self.handler = AsyncBotHandler(
+            db_manager=DatabaseAdapter(db_manager),
+            ultramsg_api=create_async_client(self.http_session),
+            swissre_automation=SwissReAutomation()
+        )
+        self.loop = asyncio.get_running_loop()
+        await self._init_mongodb()
+        conversation_flow.start_sweeper()
+        if session_snapshotter:
+            session_snapshotter.start(conversation_flow.sessions)
+        if session_hibernator:
+            conversation_flow.use_hibernator(session_hibernator)
+        if session_journal:
+            conversation_flow.use_journal(session_journal)
+        if conversation_timers:
+            conversation_timers.start(release=self.handler.handle_agent_release, notify=self._notify)
+        logger.info(f"Servidor asyncio iniciado (max_inflight={ASYNC_MAX_INFLIGHT})")
+
+    def _notify(self, phone: str, message: str):
+        """Envio a partir da thread dos timers (lembretes): roda no event loop"""
+        asyncio.run_coroutine_threadsafe(self.handler._send_response_async(phone, message), self.loop)
+
+    async def cleanup(self, app):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.http_session:
+            await self.http_session.close()
+        if self.mongo_client:
+            await self.mongo_client.close()
+        if self.session_client:
+            self.session_client.close()
+
+    async def _init_mongodb(self):
+        if not MONGO_URI:
+            logger.warning("MONGO_URI não configurado - MongoDB desabilitado")
+            return
+
+        try:
+            from pymongo import AsyncMongoClient
+
+            self.mongo_client = AsyncMongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+            await self.mongo_client.admin.command('ping')
+            self.db = self.mongo_client[DB_NAME]
+            logger.info("MongoDB (async) conectado com sucesso")
+
+            if SESSION_STORE == 'mongo':
+                # O store de sessões é síncrono (pymongo) e roda nas threads do handler
+                from pymongo import MongoClient
+
+                self.session_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+                conversation_flow.use_store(MongoSessionStore(self.session_client[DB_NAME].conversation_sessions))
+        except Exception as e:
+            logger.warning(f"Erro ao conectar MongoDB: {str(e)} - Continuando sem MongoDB")
+            self.mongo_client = None
+            self.db = None
+
+    async def save_message_mongo(self, phone: str, sender: str, message: str):
+        """Mesmo formato de main.save_message_mongo"""
+        if self.db is None:
+            return
+
+        try:
+            conversation = await self.db.conversations.find_one({"phone_number": phone})
+            if not conversation:
+                inserted = await self.db.conversations.insert_one({
+                    "phone_number": phone,
+                    "status": "active",
+                    "created_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow()
+                })
+                conversation_id = inserted.inserted_id
+            else:
+                conversation_id = conversation["_id"]
+
+            await self.db.messages.insert_one({
+                "conversation_id": conversation_id,
+                "phone_number": phone,
+                "sender": sender,
+                "message": message,
+                "timestamp": datetime.utcnow()
+            })
+
+        except Exception as e:
+            logger.error(f"Erro ao salvar mensagem no MongoDB: {str(e)}")
+
+    async def process_incoming_message(self, phone: str, message: str):
+        """Salva a mensagem, processa com o bot e salva a resposta"""
+        started = asyncio.get_running_loop().time()
+        try:
+            await self.save_message_mongo(phone, "user", message)
+
+            result = await self.handler.process_message_async(phone, message)
+            logger.info(f"result: {result}")
+
+            if isinstance(result, dict) and "response" in result:
+                await self.save_message_mongo(phone, "bot", result["response"])
+        finally:
+            self.inflight -= 1
+            metrics.set_gauge("async.inflight", self.inflight)
+            metrics.observe("async.processing_seconds", asyncio.get_running_loop().time() - started)
+
+    async def webhook_ultramsg(self, request):
+        """Webhook principal (responde assim que a mensagem é aceita)"""
+        try:
+            data = await request.json()
+            logger.info(f"Webhook recebido - event_type: {data.get('event_type')}")
+
+            # Gravação opcional (escrita pequena e local, feita no próprio loop)
+            traffic_recorder.record(data)
+
+            event, ignored, status = parse_webhook_event(data)
+            if event is None:
+                return web.json_response(ignored, status=status)
+
+            phone = event["phone"]
+            message = event["message"]
+
+            if message_deduplicator.is_duplicate(event["message_id"]):
+                logger.info(f"Mensagem duplicada ignorada: {event['message_id']}")
+                return web.json_response({"status": "ignored", "reason": "duplicate"})
+
+            if self.inflight >= ASYNC_MAX_INFLIGHT:
+                message_deduplicator.forget(event["message_id"])
+                metrics.incr("webhook.shed")
+                return web.json_response(
+                    {"status": "busy", "reason": "overloaded"},
+                    status=503,
+                    headers={"Retry-After": WEBHOOK_RETRY_AFTER}
+                )
+
+            self.inflight += 1
+            metrics.set_gauge("async.inflight", self.inflight)
+
+            task = asyncio.create_task(self.serializer.run(
+                phone, lambda: self.process_incoming_message(phone, message)
+            ))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+            return web.json_response({"status": "queued"})
+
+        except Exception as e:
+            logger.error(f"Erro no webhook: {str(e)}", exc_info=True)
+            return web.json_response({"error": str(e)}, status=500)
+
+    async def health(self, request):
+        return web.json_response({
+            "status": "healthy",
+            "mode": "asyncio",
+            "timestamp": str(datetime.utcnow()),
+            "inflight": self.inflight,
+            "max_inflight": ASYNC_MAX_INFLIGHT,
+            "mongodb": "connected" if self.db is not None else "disconnected",
+            "dedup": message_deduplicator.stats(),
+            "session_snapshot": session_snapshotter.stats() if session_snapshotter else {"enabled": False},
+            "session_hibernation": session_hibernator.stats() if session_hibernator else {"enabled": False},
+            "session_journal": session_journal.stats() if session_journal else {"enabled": False},
+            "conversation_timers": conversation_timers.stats() if conversation_timers else {"enabled": False}
+        })
+
+    async def metrics_endpoint(self, request):
+        return web.json_response(metrics.snapshot())
+
+
+def create_app() -> web.Application:
+    server = AsyncBotServer()
+    app = web.Application()
+    app.on_startup.append(server.startup)
+    app.on_cleanup.append(server.cleanup)
+    app.router.add_post('/webhook/ultramsg', server.webhook_ultramsg)
+    app.router.add_get('/health', server.health)
+    app.router.add_get('/metrics', server.metrics_endpoint)
+    return app
+
+
+if __name__ == '__main__':
+    port = int(os.environ.get('ASYNC_PORT', 5006))
+    logger.info(f"Iniciando servidor asyncio na porta {port}")
+    web.run_app(create_app(), host='0.0.0.0', port=port)
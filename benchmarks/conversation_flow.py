@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do fluxo de conversa (ConversationFlow.process_user_input)
+
+Confere a tabela de transições (conversation_machine.verify_transitions) e
+mede mensagens/s só no fluxo: sem extração por IA, sem envio, com o store
+em memória. Cada telefone percorre um roteiro típico (saudação, menu,
+dúvida, dados, validação, edição, atendente).
+
+Uso:
+    python benchmarks/conversation_flow.py
+    python benchmarks/conversation_flow.py --phones 2000 --rounds 5
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bot.conversation_flow import ConversationFlow  # noqa: E402
+from app.bot.conversation_machine import verify_transitions  # noqa: E402
+from app.bot.session_store import MemorySessionStore  # noqa: E402
+
+DADOS = {
+    'nome_solicitante': 'Joao da Silva',
+    'nome_animal': 'Trovao',
+    'valor_animal': '50000',
+    'raca': 'Mangalarga Marchador',
+    'data_nascimento': '01/01/2015',
+    'sexo': 'inteiro',
+    'utilizacao': 'lazer',
+    'uf': 'SP',
+}
+
+# (mensagem, dados extraídos)
+ROTEIRO = [
+    ("oi", None),
+    ("2", None),
+    ("como funciona a carência?", None),
+    ("0", None),
+    ("1", None),
+    ("meu nome é Joao da Silva, o cavalo é o Trovao", {'nome_solicitante': DADOS['nome_solicitante'],
+                                                       'nome_animal': DADOS['nome_animal']}),
+    ("vale 50000, mangalarga, nasceu em 01/01/2015", {'valor_animal': '50000', 'raca': DADOS['raca'],
+                                                      'data_nascimento': DADOS['data_nascimento']}),
+    ("inteiro, lazer, SP", {'sexo': 'inteiro', 'utilizacao': 'lazer', 'uf': 'SP'}),
+    ("2", None),
+    ("3", None),
+    ("60000", None),
+    ("talvez", None),
+    ("quero falar com atendente", None),
+    ("ok", None),
+]
+
+
+def run(phones: int, rounds: int) -> float:
+    flow = ConversationFlow(None, MemorySessionStore(max_entries=0))
+    messages = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        flow.sessions.clear()
+        for message, extracted in ROTEIRO:
+            for i in range(phones):
+                flow.process_user_input(f"55119{i:08d}", message, extracted)
+        messages += phones * len(ROTEIRO)
+    return messages / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mensagens/s no ConversationFlow")
+    parser.add_argument("--phones", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    problems = verify_transitions(handler_owner=ConversationFlow)
+    print("Tabela de transições:", "ok" if not problems else f"{len(problems)} problema(s)")
+    for problem in problems:
+        print(f"  - {problem}")
+
+    rate = run(args.phones, args.rounds)
+    print(f"\n{args.phones} telefones x {len(ROTEIRO)} mensagens x {args.rounds} rodadas")
+    print(f"  {rate:,.0f} mensagens/s ({1e6 / rate:.0f} us/mensagem)")
+
+
+if __name__ == "__main__":
+    main()
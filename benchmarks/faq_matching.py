@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da busca de tópico do FAQ (find_topic_by_message)
+
+Compara o índice compilado (Aho-Corasick, uma passada pela mensagem) com a
+busca anterior, que normalizava cada palavra-chave de todos os tópicos a
+cada mensagem e procurava uma por uma. Antes de medir, confere que as duas
+retornam o mesmo tópico para todas as mensagens do corpus.
+
+Uso:
+    python benchmarks/faq_matching.py
+    python benchmarks/faq_matching.py --messages 5000 --repeat 3
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bot.faq_knowledge import FAQ_KEYWORD_WEIGHTS, FAQ_TOPICS, find_topic_by_message, normalizar_texto  # noqa: E402
+
+FRASES = [
+    "oi, tudo bem?",
+    "quero fazer uma cotação",
+    "como funciona a carência?",
+    "meu cavalo morreu, e agora?",
+    "o seguro cobre cólica?",
+    "quanto custa o seguro de uma égua de 50 mil",
+    "meu nome é Joao da Silva, o cavalo é o Trovao",
+    "vale 50000, mangalarga, nasceu em 01/01/2015",
+    "inteiro, lazer, SP",
+    "quero falar com atendente",
+    "tem cobertura para transporte do animal?",
+    "qual o prazo para pagar a indenização",
+    "ok obrigado",
+]
+
+PALAVRAS = ["o", "meu", "de", "que", "cavalo", "égua", "seguro", "animal", "?", "!", "sim", "não", "1"]
+
+
+def find_topic_by_message_scan(message: str):
+    """Busca anterior: normaliza e procura cada palavra-chave a cada mensagem"""
+    message_normalized = normalizar_texto(message)
+
+    best_match = None
+    best_score = 0
+
+    for topic in FAQ_TOPICS.values():
+        score = 0
+
+        for kw in topic["palavras_chave"]:
+            kw_normalized = normalizar_texto(kw)
+
+            if kw_normalized and kw_normalized in message_normalized:
+                score += len(kw_normalized.split())
+
+        if score > best_score:
+            best_score = score
+            best_match = topic
+
+    if best_score >= 1:
+        return best_match
+
+    return None
+
+
+def build_corpus(size: int, seed: int = 7):
+    """Frases típicas mais combinações de palavras-chave reais com ruído"""
+    rng = random.Random(seed)
+    keywords = [kw for topic in FAQ_TOPICS.values() for kw in topic["palavras_chave"]]
+    corpus = list(FRASES)
+    while len(corpus) < size:
+        parts = rng.sample(keywords, rng.randint(0, 3)) + rng.choices(PALAVRAS, k=rng.randint(1, 8))
+        rng.shuffle(parts)
+        message = rng.choice([" ", ", ", "  "]).join(parts)
+        corpus.append(message.upper() if rng.random() < 0.2 else message)
+    return corpus
+
+
+def measure(func, corpus, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in corpus:
+            func(message)
+    return len(corpus) * repeat / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mensagens/s na busca de tópico do FAQ")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.messages)
+    different = [m for m in corpus if find_topic_by_message(m) is not find_topic_by_message_scan(m)]
+    print(f"{len(FAQ_TOPICS)} tópicos, {len(FAQ_KEYWORD_WEIGHTS)} palavras-chave normalizadas")
+    print(f"Mesmo resultado: {len(corpus) - len(different)}/{len(corpus)} mensagens")
+    for message in different[:5]:
+        print(f"  - diferente: {message!r}")
+
+    scan = measure(find_topic_by_message_scan, corpus, args.repeat)
+    index = measure(find_topic_by_message, corpus, args.repeat)
+    print(f"\n{len(corpus)} mensagens x {args.repeat} rodadas")
+    print(f"  busca anterior:    {scan:>10,.0f} mensagens/s ({1e6 / scan:.0f} us/mensagem)")
+    print(f"  índice compilado:  {index:>10,.0f} mensagens/s ({1e6 / index:.0f} us/mensagem)")
+    print(f"  {index / scan:.1f}x")
+
+    sys.exit(1 if different else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de memória e acesso das sessões de conversa
+
+Compara a sessão em dicionários (formato anterior: Enum + dict de dados +
+datetimes + lista) com o ConversationSession compacto (__slots__, campos
+fixos, epoch int), na mesma quantidade de telefones.
+
+Uso:
+    python benchmarks/session_footprint.py
+    python benchmarks/session_footprint.py --sessions 100000 --repeat 200000
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bot.conversation_session import ConversationSession, ConversationState  # noqa: E402
+from app.bot.session_store import MemorySessionStore  # noqa: E402
+
+SAMPLE_DATA = {
+    'nome_solicitante': 'Joao da Silva',
+    'nome_animal': 'Trovao',
+    'valor_animal': '50000',
+    'raca': 'Mangalarga Marchador',
+    'data_nascimento': '01/01/2015',
+    'sexo': 'inteiro',
+}
+
+
+def phone_for(i: int) -> str:
+    return f"55119{i:08d}"
+
+
+def legacy_session(i: int) -> dict:
+    """Sessão como era guardada antes (dicionários aninhados)"""
+    now = datetime.now()
+    return {
+        'state': ConversationState.COTACAO_COLETANDO,
+        'data': {k: f"{v}{i % 7}" for k, v in SAMPLE_DATA.items()},
+        'created_at': now,
+        'last_interaction': now,
+        'message_count': 3,
+        'cotacoes_realizadas': []
+    }
+
+
+def compact_session(i: int) -> ConversationSession:
+    session = ConversationSession(ConversationState.COTACAO_COLETANDO)
+    session.data.update({k: f"{v}{i % 7}" for k, v in SAMPLE_DATA.items()})
+    session.message_count = 3
+    return session
+
+
+def measure_memory(factory, count: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = {phone_for(i): factory(i) for i in range(count)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Telefones (chaves) e o dicionário externo são iguais nos dois formatos
+    keys = sum(sys.getsizeof(phone) for phone in sessions) + sys.getsizeof(sessions)
+    return sessions, (after - before - keys) / count
+
+
+def timed(label: str, func, repeat: int) -> float:
+    started = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    elapsed = (time.perf_counter() - started) / repeat * 1e9
+    print(f"  {label:<38} {elapsed:8.0f} ns/op")
+    return elapsed
+
+
+def bench_access(sessions: dict, legacy: bool, repeat: int):
+    phones = list(sessions)
+    n = len(phones)
+
+    if legacy:
+        def read_state(i):
+            return sessions[phones[i % n]]['state']
+
+        def read_field(i):
+            return sessions[phones[i % n]]['data'].get('uf')
+
+        def write_field(i):
+            sessions[phones[i % n]]['data']['uf'] = 'SP'
+
+        def touch(i):
+            sessions[phones[i % n]]['last_interaction'] = datetime.now()
+
+        def expired(i):
+            return (datetime.now() - sessions[phones[i % n]]['last_interaction']).total_seconds() > 600
+    else:
+        def read_state(i):
+            return sessions[phones[i % n]].state
+
+        def read_field(i):
+            return sessions[phones[i % n]].data.get('uf')
+
+        def write_field(i):
+            sessions[phones[i % n]].data['uf'] = 'SP'
+
+        def touch(i):
+            sessions[phones[i % n]].touch()
+
+        def expired(i):
+            return time.time() - sessions[phones[i % n]].last_interaction > 600
+
+    timed("ler estado", read_state, repeat)
+    timed("ler campo (uf)", read_field, repeat)
+    timed("gravar campo (uf)", write_field, repeat)
+    timed("atualizar last_interaction", touch, repeat)
+    timed("verificar expiração", expired, repeat)
+
+
+def bench_store(count: int, repeat: int):
+    store = MemorySessionStore()
+    for i in range(count):
+        store.save(phone_for(i), compact_session(i), 0)
+
+    def load(i):
+        return store.load(phone_for(i % count))
+
+    def load_save(i):
+        phone = phone_for(i % count)
+        session, version = store.load(phone)
+        session.touch()
+        store.save(phone, session, version)
+
+    print("\nMemorySessionStore (cópia por leitura + versão):")
+    timed("load", load, repeat)
+    timed("load + touch + save", load_save, repeat)
+    print(f"  {'bytes estimados por sessão':<38} {store.estimated_bytes() / count:8.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memória e acesso das sessões de conversa")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=200000, help="Operações por medição de acesso")
+    args = parser.parse_args(argv)
+
+    print(f"Sessões: {args.sessions}")
+
+    legacy, legacy_bytes = measure_memory(legacy_session, args.sessions)
+    print(f"\nAntes (dicionários): {legacy_bytes:.0f} bytes/sessão")
+    bench_access(legacy, True, args.repeat)
+    del legacy
+
+    compact, compact_bytes = measure_memory(compact_session, args.sessions)
+    print(f"\nDepois (ConversationSession): {compact_bytes:.0f} bytes/sessão")
+    bench_access(compact, False, args.repeat)
+    del compact
+
+    print(f"\nRedução de memória: {(1 - compact_bytes / legacy_bytes) * 100:.0f}%")
+
+    bench_store(args.sessions, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,7 @@ Portal com API REST para front-end React + Nova conversação com FAQ
 # cloudflared-windows-amd64 tunnel --url http://localhost:5005
 import re
 import os
-import base64
 import logging
-import requests
-import urllib.parse
 import uuid
 import hashlib
 from datetime import timedelta, datetime
@@ -26,9 +23,29 @@ db_adapter = DatabaseAdapter(db_manager)
 
 from app.bot.bot_handler import BotHandler
 from ultramsg_adapter import UltraMsgAdapter
-from app.integrations.ultramsg_api import ultramsg_api
+from app.integrations.http_transport import ultramsg_transport
+from app.integrations.outbox import message_outbox, OutboxAdapter
+from app.integrations.document_upload import document_publisher
+from app.integrations.messaging import messaging_transport
+from app.integrations.ultramsg_webhook import parse_webhook_event
 from app.bot.swissre_automation import SwissReAutomation
 from app.bot.faq_knowledge import FAQ_TOPICS
+from app.bot.message_dispatcher import message_dispatcher, ADMIT, DEGRADE, REJECT
+from app.bot.message_dedup import message_deduplicator
+from app.bot.quotation_backlog import quotation_backlog
+from app.bot.conversation_flow import conversation_flow
+from app.bot.intent_classifier import intent_classifier
+from app.utils.striped_lock import session_locks
+from app.bot.session_store import MongoSessionStore, SESSION_STORE
+from app.bot.session_snapshot import session_snapshotter
+from app.bot.session_hibernation import session_hibernator
+from app.bot.session_journal import session_journal
+from app.bot.conversation_timers import conversation_timers
+from app.bot.message_coalescer import MessageCoalescer, COALESCE_WINDOW, COALESCE_MAX_WAIT
+from app.utils.metrics import metrics
+from app.utils.circuit_breaker import breakers_stats
+from app.utils.concurrency_limiter import limiters_stats
+from app.utils.traffic_recorder import traffic_recorder
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -46,7 +63,12 @@ app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-12345')
 # Configurações UltraMsg
 ULTRAMSG_INSTANCE_ID = os.getenv('ULTRAMSG_INSTANCE_ID', 'instance135696')
 ULTRAMSG_TOKEN = os.getenv('ULTRAMSG_TOKEN', 'token_padrao')
-ULTRAMSG_BASE_URL = f"https://api.ultramsg.com/{ULTRAMSG_INSTANCE_ID}"
+
+# Processamento do webhook em background (responde 200 imediatamente)
+WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'False').lower() in ('true', '1', 'yes')
+WEBHOOK_REJECT_STATUS = int(os.getenv('WEBHOOK_REJECT_STATUS', '503'))
+WEBHOOK_RETRY_AFTER = os.getenv('WEBHOOK_RETRY_AFTER', '5')
+WEBHOOK_DEDUP_SHARED = os.getenv('WEBHOOK_DEDUP_SHARED', 'False').lower() in ('true', '1', 'yes')
 
 # Configuração MongoDB
 MONGO_URI = os.getenv('MONGO_URI')
@@ -64,15 +86,45 @@ messages_collection = None
 
 # Criar adaptadores
 db_adapter = DatabaseAdapter(db_manager)
-ultramsg_adapter = UltraMsgAdapter(ultramsg_api)
+ultramsg_adapter = UltraMsgAdapter(messaging_transport)
+
+# Com o outbox, as respostas do bot são enfileiradas e enviadas em background
+if message_outbox:
+    message_outbox.start()
 
 # Usar adaptadores
 bot_handler = BotHandler(
     db_manager=db_adapter,
-    ultramsg_api=ultramsg_adapter,
+    ultramsg_api=OutboxAdapter(message_outbox) if message_outbox else ultramsg_adapter,
     swissre_automation=SwissReAutomation()
 )
 
+# Cotações adiadas (SwissRe fora) voltam pelo shard do telefone
+quotation_backlog.set_executor(message_dispatcher.submit)
+
+# Sessões inativas saem da memória em background
+conversation_flow.start_sweeper()
+
+# Backend memory: sessões sobrevivem a deploy/restart via snapshot (SESSION_SNAPSHOT_PATH)
+if session_snapshotter:
+    session_snapshotter.start(conversation_flow.sessions)
+
+# Backend memory: sessões ociosas vão para o disco (SESSION_HIBERNATE_PATH)
+if session_hibernator:
+    conversation_flow.use_hibernator(session_hibernator)
+
+# Backend memory: cada mudança de sessão vai para o diário local (SESSION_JOURNAL_PATH)
+if session_journal:
+    conversation_flow.use_journal(session_journal)
+
+# Prazos das conversas (timeout, AGENT_TIMEOUT, lembrete) disparados no shard do telefone
+if conversation_timers:
+    conversation_timers.start(
+        release=bot_handler.handle_agent_release,
+        notify=bot_handler._send_response,
+        executor=message_dispatcher.submit
+    )
+
 
 # =========================================================================
 # FUNÇÕES AUXILIARES
@@ -134,6 +186,12 @@ def init_mongodb():
         mongodb_connected = True
         logger.info("MongoDB conectado com sucesso")
 
+        if WEBHOOK_DEDUP_SHARED:
+            message_deduplicator.attach_shared(db.webhook_message_ids)
+
+        if SESSION_STORE == 'mongo':
+            conversation_flow.use_store(MongoSessionStore(db.conversation_sessions))
+
         init_agents_from_env()
         return True
 
@@ -221,28 +279,10 @@ def clean_text_for_whatsapp(text):
 
 
 def send_ultramsg_message(phone, message):
+    """Envia texto pelo transporte de mensagens (MESSAGING_BACKEND)"""
     try:
-        clean_phone = phone.replace('@c.us', '').replace('+', '').replace('-', '').replace(' ', '')
-        if not clean_phone.startswith('55') and len(clean_phone) >= 10:
-            clean_phone = '55' + clean_phone
-
-        url = f"{ULTRAMSG_BASE_URL}/messages/chat"
-        clean_message = clean_text_for_whatsapp(message)
-
-        data = {
-            'token': ULTRAMSG_TOKEN,
-            'to': clean_phone,
-            'body': clean_message
-        }
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-
-        response = requests.post(url, data=data, headers=headers, timeout=15)
-
-        if response.status_code == 200:
-            response_json = response.json()
-            if response_json.get('sent'):
-                return True
-        return False
+        result = messaging_transport.send_text_message(phone, clean_text_for_whatsapp(message))
+        return result.get("success", False)
 
     except Exception as e:
         logger.error(f"Erro ao enviar: {str(e)}")
@@ -250,27 +290,12 @@ def send_ultramsg_message(phone, message):
 
 
 def send_ultramsg_document(phone, file_path, caption=""):
+    """Envia documento pelo transporte de mensagens (MESSAGING_BACKEND)"""
     try:
-        url = f"{ULTRAMSG_BASE_URL}/messages/document"
-        clean_phone = phone.replace('@c.us', '').replace('+', '')
-
-        with open(file_path, "rb") as f:
-            encoded_file = base64.b64encode(f.read()).decode("utf-8")
-
-        filename = os.path.basename(file_path)
-        data = {
-            "token": ULTRAMSG_TOKEN,
-            "to": clean_phone,
-            "document": encoded_file,
-            "filename": filename,
-            "caption": clean_text_for_whatsapp(caption),
-        }
-
-        payload = urllib.parse.urlencode(data, encoding='utf-8')
-        headers = {'content-type': 'application/x-www-form-urlencoded; charset=utf-8'}
-
-        response = requests.post(url, data=payload, headers=headers, timeout=30)
-        return response.status_code == 200
+        result = messaging_transport.send_document(
+            phone, file_path, os.path.basename(file_path), clean_text_for_whatsapp(caption)
+        )
+        return result.get("success", False)
 
     except Exception as e:
         logger.error(f"Erro ao enviar documento: {str(e)}")
@@ -618,6 +643,18 @@ def api_send_message(phone):
         if not message:
             return jsonify({"error": "Mensagem é obrigatória"}), 400
 
+        if message_outbox:
+            outbox_id = message_outbox.enqueue_text(phone, clean_text_for_whatsapp(message))
+            save_conversation_to_db(phone, "", message, 'human', session['agent_email'])
+            save_message_mongo(phone, "agent", message)
+
+            return jsonify({
+                "success": True,
+                "message": "Mensagem enfileirada para envio",
+                "outbox_id": outbox_id,
+                "status": "queued"
+            })
+
         success = send_ultramsg_message(phone, message)
 
         if success:
@@ -636,6 +673,21 @@ def api_send_message(phone):
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/outbox/<int:outbox_id>')
+def api_outbox_status(outbox_id):
+    """Status de uma mensagem enfileirada (queued/sending/sent/failed)"""
+    if 'agent_email' not in session:
+        return jsonify({"error": "Não autenticado"}), 401
+
+    if not message_outbox:
+        return jsonify({"error": "Outbox desativado"}), 404
+
+    status = message_outbox.get_status(outbox_id)
+    if status is None:
+        return jsonify({"error": "Mensagem não encontrada"}), 404
+    return jsonify(status)
+
+
 @app.route('/api/conversations/<phone>/complete', methods=['POST'])
 def api_complete_quotation(phone):
     """Finalizar cotação manualmente"""
@@ -737,12 +789,108 @@ def health_check():
         "components": {
             "flask": "ok",
             "ultramsg": "configured" if ULTRAMSG_TOKEN != 'token_padrao' else "not_configured",
-            "mongodb": "connected" if mongodb_connected else "disconnected"
+            "mongodb": "connected" if mongodb_connected else "disconnected",
+            "messaging_backend": messaging_transport.name,
+            "ultramsg_transport": ultramsg_transport.stats()
+        },
+        "outbox": message_outbox.stats() if message_outbox else {"enabled": False},
+        "circuit_breakers": breakers_stats(),
+        "concurrency_limits": limiters_stats(),
+        "quotation_backlog": quotation_backlog.stats(),
+        "sessions": conversation_flow.sessions.stats(),
+        "session_locks": session_locks.stats(),
+        "session_snapshot": session_snapshotter.stats() if session_snapshotter else {"enabled": False},
+        "session_hibernation": session_hibernator.stats() if session_hibernator else {"enabled": False},
+        "session_journal": session_journal.stats() if session_journal else {"enabled": False},
+        "conversation_timers": conversation_timers.stats() if conversation_timers else {"enabled": False},
+        "intent_classifier": intent_classifier.stats(),
+        "webhook": {
+            "mode": "async" if WEBHOOK_ASYNC else "inline",
+            "dispatcher": message_dispatcher.stats(),
+            "dedup": message_deduplicator.stats(),
+            "coalescer": message_coalescer.stats(),
+            "recorder": {"enabled": traffic_recorder.enabled, "recorded": traffic_recorder.recorded}
         },
         "stats": stats
     }), 200
 
 
+def process_incoming_message(phone, message, degraded=False):
+    """Salva a mensagem, processa com o bot e salva a resposta"""
+    return process_incoming_messages(phone, [message], degraded)
+
+
+def process_incoming_messages(phone, messages, degraded=False):
+    """Processa uma rajada de mensagens do mesmo telefone como uma só"""
+    # Salvar mensagens do usuário
+    for item in messages:
+        save_message_mongo(phone, "user", item)
+
+    message = "\n".join(messages)
+
+    # Processar com bot handler
+    result = bot_handler.process_message(phone, message, degraded=degraded)
+
+    logger.info(f"result: {result}")
+
+    # Salvar resposta do bot
+    if isinstance(result, dict) and "response" in result:
+        save_message_mongo(phone, "bot", result["response"])
+
+    return result
+
+
+def enqueue_messages(phone, messages):
+    """
+    Callback do agrupador: envia a rajada para o shard do telefone
+
+    A admissão já foi feita no webhook (antes do 200); aqui a sobrecarga só
+    degrada a extração. Retorna False com o shard cheio (o agrupador tenta de novo).
+    """
+    decision = message_dispatcher.admission(phone)
+    future = message_dispatcher.submit(
+        phone, process_incoming_messages, phone, messages, decision != ADMIT
+    )
+    return future is not None
+
+
+def forget_messages(phone, message_ids):
+    """Rajada descartada pelo agrupador: um reenvio dos ids volta a ser processado"""
+    for message_id in message_ids:
+        message_deduplicator.forget(message_id)
+
+
+def overload_response():
+    """Resposta de sobrecarga: o UltraMsg tenta novamente mais tarde"""
+    response = jsonify({"status": "busy", "reason": "overloaded"})
+    response.headers['Retry-After'] = WEBHOOK_RETRY_AFTER
+    return response, WEBHOOK_REJECT_STATUS
+
+
+# Agrupamento de rajadas (apenas no modo assíncrono)
+message_coalescer = MessageCoalescer(
+    flush_callback=enqueue_messages,
+    window=COALESCE_WINDOW if WEBHOOK_ASYNC else 0,
+    max_wait=COALESCE_MAX_WAIT,
+    on_drop=forget_messages
+)
+
+
+@app.route('/media/documents/<name>')
+def media_document(name):
+    """Documentos publicados por hash do conteúdo (baixados pelo UltraMsg)"""
+    if not document_publisher.enabled or not re.fullmatch(r'[0-9a-f]{64}\.pdf', name):
+        return jsonify({"error": "Não encontrado"}), 404
+    return send_from_directory(os.path.abspath(document_publisher.media_dir), name,
+                               mimetype='application/pdf', max_age=86400)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas do processo (fila, deduplicação, etc.)"""
+    return jsonify(metrics.snapshot())
+
+
 @app.route('/webhook/ultramsg', methods=['POST'])
 def webhook_ultramsg():
     """Webhook principal"""
@@ -751,41 +899,52 @@ def webhook_ultramsg():
 
         logger.info(f"Webhook recebido - event_type: {data.get('event_type')}")
 
-        # Ignorar mensagens do próprio bot
-        data_field = data.get('data', {})
-        from_me = data_field.get('fromMe', False)
-        is_self = data_field.get('self', False)
+        # Gravação opcional para reprodução (replay_webhooks.py)
+        traffic_recorder.record(data)
 
-        if from_me or is_self:
-            return jsonify({"status": "ignored", "reason": "message_from_bot"}), 200
+        event, ignored, status = parse_webhook_event(data)
+        if event is None:
+            return jsonify(ignored), status
 
-        event_type = data.get('event_type', '')
-        if event_type not in ['message_create', 'message_received', '']:
-            return jsonify({"status": "ignored", "reason": f"event_type_{event_type}"}), 200
+        phone = event["phone"]
+        message = event["message"]
+        message_id = event["message_id"]
 
-        phone = data_field.get('from', data.get('from', ''))
-        phone = phone.replace('@c.us', '').replace('@g.us', '')
-
-        if not phone:
-            return jsonify({"error": "Telefone não encontrado"}), 400
-
-        message = data_field.get('body', data.get('body', ''))
-        if not message:
-            return jsonify({"status": "ignored", "reason": "empty_message"}), 200
+        if message_deduplicator.is_duplicate(message_id):
+            logger.info(f"Mensagem duplicada ignorada: {message_id}")
+            return jsonify({"status": "ignored", "reason": "duplicate"}), 200
 
         logger.info(f"Mensagem de {phone}: {message[:100]}...")
 
-        # Salvar mensagem do usuário
-        save_message_mongo(phone, "user", message)
+        # Controle de admissão: recusa (UltraMsg reenvia) ou degrada sob sobrecarga
+        decision = message_dispatcher.admission(phone)
+        if decision == REJECT:
+            message_deduplicator.forget(message_id)
+            return overload_response()
+
+        if message_coalescer.enabled:
+            # Rajadas durante a coleta viram uma única extração e uma única resposta
+            message_coalescer.add(phone, message, bot_handler.can_coalesce(phone, message), message_id)
+            return jsonify({"status": "queued"}), 200
 
-        # Processar com bot handler
-        result = bot_handler.process_message(phone, message)
+        # Mesmo telefone sempre cai no mesmo shard: processamento em ordem
+        future = message_dispatcher.submit(
+            phone, process_incoming_message, phone, message, decision == DEGRADE
+        )
+        if future is None:
+            message_deduplicator.forget(message_id)
+            return overload_response()
 
-        logger.info(f"result: {result}")
+        if WEBHOOK_ASYNC:
+            # Responde imediatamente; o worker do shard faz o resto
+            return jsonify({"status": "queued"}), 200
 
-        # Salvar resposta do bot
-        if isinstance(result, dict) and "response" in result:
-            save_message_mongo(phone, "bot", result["response"])
+        try:
+            result = future.result()
+        except Exception:
+            # Sem o id no cache, o reenvio do UltraMsg é processado de novo
+            message_deduplicator.forget(message_id)
+            raise
 
         return jsonify(result)
 
@@ -830,6 +989,11 @@ def agent_send_message():
         if not phone or not message:
             return jsonify({"error": "Telefone e mensagem são obrigatórios"}), 400
 
+        if message_outbox:
+            outbox_id = message_outbox.enqueue_text(phone, clean_text_for_whatsapp(message))
+            save_conversation_to_db(phone, "", message, 'human', session['agent_email'])
+            return jsonify({"success": True, "message": "Mensagem enfileirada para envio", "outbox_id": outbox_id})
+
         success = send_ultramsg_message(phone, message)
 
         if success:
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Reprodução de tráfego gravado do webhook (ver app/utils/traffic_recorder.py)
+
+Envia os payloads gravados para um servidor (Flask ou asyncio) e mede latência.
+
+Exemplos:
+    python replay_webhooks.py gravacoes/                       # tempo original
+    python replay_webhooks.py gravacoes/ --speed 10            # 10x mais rápido
+    python replay_webhooks.py gravacoes/*.ndjson --rps 50      # taxa fixa
+    python replay_webhooks.py gravacoes/ --url http://localhost:5006/webhook/ultramsg
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_URL = "http://localhost:5005/webhook/ultramsg"
+
+
+def load_events(paths):
+    """Lê os arquivos NDJSON (ou diretórios) e ordena por horário de gravação"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, f) for f in sorted(os.listdir(path))
+                if f.endswith(".ndjson")
+            )
+        else:
+            files.append(path)
+
+    events = []
+    for filename in files:
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                events.append((record.get("ts", 0), record.get("payload", {})))
+
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def schedule(events, speed=None, rps=None):
+    """Retorna o deslocamento (segundos desde o início) de cada envio"""
+    if rps:
+        return [i / rps for i in range(len(events))]
+
+    factor = speed or 1.0
+    start = events[0][0] if events else 0
+    return [(ts - start) / factor for ts, _ in events]
+
+
+def fresh_ids(payload, tag):
+    """Troca o id da mensagem para a deduplicação não descartar a reprodução"""
+    data = payload.get("data")
+    if isinstance(data, dict) and data.get("id"):
+        payload = dict(payload, data=dict(data, id=f"{data['id']}_{tag}"))
+    return payload
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def replay(events, url, offsets, concurrency, timeout):
+    """Envia os eventos nos horários previstos e coleta status e latência"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    errors = Counter()
+    lag = []
+
+    def send(payload):
+        started = time.perf_counter()
+        try:
+            response = session.post(url, json=payload, timeout=timeout)
+            key = str(response.status_code)
+        except requests.RequestException as e:
+            key = None
+            with lock:
+                errors[type(e).__name__] += 1
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if key:
+                statuses[key] += 1
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for (ts, payload), offset in zip(events, offsets):
+            delay = begin + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag.append(-delay)
+            pool.submit(send, payload)
+
+    duration = time.perf_counter() - begin
+    return {
+        "sent": len(events),
+        "duration": duration,
+        "latencies": sorted(latencies),
+        "statuses": statuses,
+        "errors": errors,
+        "max_lag": max(lag) if lag else 0.0,
+    }
+
+
+def print_report(report):
+    latencies = report["latencies"]
+    duration = report["duration"] or 1e-9
+
+    print(f"Eventos enviados: {report['sent']} em {report['duration']:.2f}s "
+          f"({report['sent'] / duration:.1f} req/s)")
+    print("Status HTTP: " + (", ".join(
+        f"{code}={count}" for code, count in sorted(report["statuses"].items())
+    ) or "-"))
+    if report["errors"]:
+        print("Erros: " + ", ".join(f"{name}={count}" for name, count in report["errors"].items()))
+    print("Latência (ms): " + ", ".join(
+        f"{name}={percentile(latencies, p) * 1000:.1f}"
+        for name, p in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100))
+    ))
+    if report["max_lag"] > 0.05:
+        print(f"Aviso: o cliente atrasou até {report['max_lag']:.2f}s em relação ao agendamento "
+              f"(aumente --concurrency)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduz tráfego gravado do webhook UltraMsg")
+    parser.add_argument("paths", nargs="+", help="Arquivos .ndjson ou diretórios de gravação")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"Webhook de destino (padrão: {DEFAULT_URL})")
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--speed", type=float, help="Multiplicador do tempo original (ex: 10 = 10x mais rápido)")
+    rate.add_argument("--rps", type=float, help="Taxa fixa de requisições por segundo")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requisições simultâneas (padrão: 32)")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout por requisição em segundos")
+    parser.add_argument("--limit", type=int, help="Envia apenas os primeiros N eventos")
+    parser.add_argument("--keep-ids", action="store_true",
+                        help="Mantém os ids originais (o servidor vai tratá-los como duplicados)")
+    args = parser.parse_args(argv)
+
+    events = load_events(args.paths)
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        print("Nenhum evento encontrado")
+        return 1
+
+    if not args.keep_ids:
+        tag = uuid.uuid4().hex[:8]
+        events = [(ts, fresh_ids(payload, tag)) for ts, payload in events]
+
+    offsets = schedule(events, speed=args.speed, rps=args.rps)
+    print(f"Reproduzindo {len(events)} eventos para {args.url} "
+          f"(duração prevista: {offsets[-1]:.1f}s)")
+
+    print_report(replay(events, args.url, offsets, args.concurrency, args.timeout))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
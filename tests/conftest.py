@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""Configuração comum dos testes (rodar da raiz: python -m pytest -q)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
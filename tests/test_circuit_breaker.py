@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Circuit breaker: abertura por taxa de falha e chamadas de teste (half-open)"""
+import time
+
+import pytest
+
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def opened(open_seconds=0.05, half_open_calls=2, **kwargs):
+    breaker = CircuitBreaker("teste", failure_rate=0.5, min_calls=4, window_size=4,
+                             open_seconds=open_seconds, half_open_calls=half_open_calls, **kwargs)
+    for success in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_at_failure_rate_and_rejects():
+    breaker = opened(open_seconds=60)
+
+    assert not breaker.available
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "nunca")
+    assert breaker.stats()["rejected"] == 2
+    assert breaker.stats()["retry_in"] > 0
+
+
+def test_half_open_limits_probes_and_closes_after_successes():
+    breaker = opened()
+    time.sleep(0.06)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and breaker.allow()
+    # Só half_open_calls chamadas de teste ao mesmo tempo
+    assert not breaker.available
+    assert not breaker.allow()
+
+    breaker.record(True)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_failed_probe_reopens():
+    breaker = opened()
+    time.sleep(0.06)
+
+    def fails():
+        raise ValueError("fora do ar")
+
+    with pytest.raises(ValueError):
+        breaker.call(fails)
+    assert breaker.state == OPEN
+    assert breaker.opened_count == 2
+    assert not breaker.allow()
+
+
+def test_lost_probe_frees_a_new_attempt():
+    breaker = opened(half_open_calls=1)
+    time.sleep(0.06)
+    assert breaker.allow()            # chamada de teste que nunca registra resultado
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_slow_probe_counts_as_failure():
+    breaker = opened(slow_call_seconds=0.01)
+    time.sleep(0.06)
+
+    assert breaker.call(lambda: time.sleep(0.02) or "ok") == "ok"
+    assert breaker.state == OPEN
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Limite adaptativo: estável com a variação normal, corta em inflação real e sobrecarga"""
+import random
+
+from app.utils.concurrency_limiter import AdaptiveLimiter, concurrency_limiters
+
+
+def feed(limiter, latencies, overloaded=False):
+    """Uma chamada por latência, com o limite em uso (aumento aditivo ligado)"""
+    for duration in latencies:
+        held = max(1, limiter.limit)
+        for _ in range(held):
+            assert limiter.acquire(timeout=0)
+        limiter.release(duration, overloaded)
+        for _ in range(held - 1):
+            limiter.release()
+
+
+def test_normal_variance_does_not_cut_the_limit():
+    rng = random.Random(5)
+    limiter = AdaptiveLimiter("teste", initial_limit=4, max_limit=32)
+    feed(limiter, [rng.uniform(0.8, 4.0) for _ in range(3000)])
+
+    assert limiter.drops == 0
+    assert limiter.limit >= 4
+
+
+def test_sustained_inflation_cuts_the_limit():
+    rng = random.Random(5)
+    limiter = AdaptiveLimiter("teste", initial_limit=16, max_limit=16)
+    feed(limiter, [rng.uniform(0.8, 1.2) for _ in range(200)])
+    assert limiter.drops == 0
+
+    limiter._last_decrease = -1e9
+    feed(limiter, [rng.uniform(4.0, 5.0) for _ in range(20)])
+    assert limiter.drops >= 1
+    assert limiter.limit < 16
+
+
+def test_overload_halves_once_per_round():
+    limiter = AdaptiveLimiter("teste", initial_limit=8)
+    limiter._last_decrease = -1e9
+    for _ in range(8):
+        assert limiter.acquire(timeout=0)
+    for _ in range(8):
+        limiter.release(0.5, overloaded=True)     # respostas da mesma rajada
+
+    assert limiter.limit == 4
+    assert limiter.drops == 1
+
+
+def test_acquire_times_out_at_limit():
+    limiter = AdaptiveLimiter("teste", initial_limit=1, max_limit=1)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+    assert limiter.timeouts == 1
+    limiter.release()
+    assert limiter.acquire(timeout=0)
+
+
+def test_swissre_endpoints_have_their_own_limiter():
+    assert {"openai", "swissre_quotation", "swissre_document"} <= set(concurrency_limiters)
+    assert concurrency_limiters["swissre_quotation"] is not concurrency_limiters["swissre_document"]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Tabela de transições: conferência e mesmo roteamento do process_user_input anterior"""
+import json
+import os
+
+import pytest
+
+from app.bot.conversation_flow import ConversationFlow
+from app.bot.conversation_machine import (
+    TRANSITIONS, Intent, ROUTES, S, _t, compile_transitions, verify_transitions
+)
+from app.bot.conversation_session import ConversationState
+from app.bot.session_store import MemorySessionStore
+
+# Gerado com o process_user_input anterior à tabela (if/elif por estado):
+# estado, dados antes, dados extraídos, mensagem -> estado seguinte, resposta, dados depois
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "data", "routing_baseline.json")
+
+with open(BASELINE_PATH, encoding="utf-8") as f:
+    BASELINE = json.load(f)
+
+
+def test_table_is_consistent():
+    # pos_cotacao só é alcançado por sessões antigas (nenhuma rota leva a ele)
+    assert verify_transitions(handler_owner=ConversationFlow) == ["inalcançável: pos_cotacao"]
+
+
+def test_every_state_has_a_default_route():
+    assert set(ROUTES) == set(ConversationState)
+    assert all(route.default for route in ROUTES.values())
+
+
+def test_verify_reports_conflicts_and_shadowed_options():
+    transitions = TRANSITIONS + (
+        _t(S.COTACAO_VALIDANDO, Intent.OPTION, "_route_start_edit", [S.COTACAO_EDITANDO], ['sim']),
+        _t(S.MENU_PRINCIPAL, Intent.OPTION, "_route_handoff", [S.AGUARDANDO_ATENDENTE], ['atendente']),
+        _t(S.MENU_PRINCIPAL, Intent.DEFAULT, "_nao_existe", [S.MENU_PRINCIPAL]),
+    )
+    problems = verify_transitions(transitions, handler_owner=ConversationFlow)
+
+    assert "conflito: 'sim' em cotacao_validando -> _route_confirm_data e _route_start_edit" in problems
+    assert "sombreada: 'atendente' em menu_principal (handoff)" in problems
+    assert "handler inexistente: _nao_existe" in problems
+
+
+def test_options_follow_intent_order():
+    routes = compile_transitions()
+    intents = [intent for intent, _ in routes[S.MENU_PRINCIPAL].intents]
+    assert intents == [i for i in Intent.ORDER if i in intents]
+    assert routes[S.COTACAO_VALIDANDO].options["sim"] == "_route_confirm_data"
+    assert routes[S.COTACAO_VALIDANDO].intents == ()
+
+
+@pytest.mark.parametrize("state", [state.value for state in ConversationState])
+def test_routing_matches_baseline(state):
+    flow = ConversationFlow(store=MemorySessionStore())
+    phone = "5511"
+    cases = [case for case in BASELINE["cases"] if case[0] == state]
+    assert cases
+
+    for _, pre, extracted, message, next_state, response, data, campo_edicao in cases:
+        flow.sessions.clear()
+        flow.update_conversation_data(phone, BASELINE["pre"][pre])
+        flow.set_conversation_state(phone, ConversationState(state))
+        if state == S.COTACAO_EDITANDO.value:
+            flow._update_session(phone, lambda session: setattr(session, "campo_edicao", "raca"))
+
+        extracted_data = BASELINE["extracted"][extracted]
+        result = flow.process_user_input(phone, message, dict(extracted_data) if extracted_data else None)
+
+        session = flow.sessions.load(phone)[0]
+        case = (state, pre, extracted, message)
+        assert result == (ConversationState(next_state), BASELINE["responses"][response]), case
+        assert session.data.to_dict() == BASELINE["data"][data], case
+        assert session.campo_edicao == campo_edicao, case
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Índice Aho-Corasick do FAQ: mesmo resultado da busca palavra-chave por palavra-chave"""
+import random
+
+import pytest
+
+from app.bot.conversation_machine import HANDOFF_KEYWORDS, Intent
+from app.bot.data_extractor import UPDATE_KEYWORDS
+from app.bot.faq_knowledge import FAQ_TOPICS, find_topic_by_message, normalizar_texto
+from app.bot.intent_classifier import IntentClassifier
+from app.utils.aho_corasick import AhoCorasick
+from benchmarks.faq_matching import build_corpus, find_topic_by_message_scan
+
+CORPUS = build_corpus(1000, seed=11)
+
+# Palavras-chave normalizadas uma vez só (a busca anterior refazia a cada mensagem)
+SCAN_KEYWORDS = [(topic_id, normalizar_texto(kw)) for topic_id, topic in FAQ_TOPICS.items()
+                 for kw in topic["palavras_chave"]]
+
+
+def scan_scores(message):
+    """Pontuação por tópico como na busca anterior"""
+    normalized = normalizar_texto(message)
+    scores = {}
+    for topic_id, kw_normalized in SCAN_KEYWORDS:
+        if kw_normalized and kw_normalized in normalized:
+            scores[topic_id] = scores.get(topic_id, 0) + len(kw_normalized.split())
+    return scores
+
+
+def test_automaton_matches_substring_search():
+    rng = random.Random(3)
+    for _ in range(200):
+        patterns = {"".join(rng.choices("abc", k=rng.randint(1, 4))) for _ in range(rng.randint(1, 12))}
+        automaton = AhoCorasick()
+        for pattern in patterns:
+            automaton.add(pattern, pattern)
+        automaton.build()
+        text = "".join(rng.choices("abcd", k=rng.randint(0, 30)))
+
+        assert automaton.find(text) == {pattern for pattern in patterns if pattern in text}
+        expected = sorted((start + len(pattern) - 1, pattern) for pattern in patterns
+                          for start in range(len(text)) if text.startswith(pattern, start))
+        assert sorted(automaton.iter(text)) == expected
+
+
+def test_automaton_rejects_patterns_after_build():
+    automaton = AhoCorasick()
+    automaton.add("", "vazio")
+    automaton.add("a", 1)
+    automaton.add("a", 2)
+    automaton.build()
+    assert automaton.patterns == 2
+    assert automaton.find("banana") == {1, 2}
+    with pytest.raises(RuntimeError):
+        automaton.add("b", 3)
+
+
+def test_find_topic_matches_previous_scan():
+    different = [message for message in CORPUS
+                 if find_topic_by_message(message) is not find_topic_by_message_scan(message)]
+    assert different == []
+
+
+def test_classifier_scores_match_previous_scan():
+    classifier = IntentClassifier(cache_size=0)
+    handoff = [normalizar_texto(kw) for kw in HANDOFF_KEYWORDS]
+    update = [normalizar_texto(kw) for kw in UPDATE_KEYWORDS]
+
+    for message in CORPUS:
+        intents = classifier.classify(message)
+        normalized = normalizar_texto(message)
+
+        scores = scan_scores(message)
+        assert dict(intents.faq_scores) == scores, message
+        # Maior pontuação; no empate, o primeiro tópico do FAQ_TOPICS
+        best = max(scores.values(), default=0)
+        expected = next((topic for topic_id, topic in FAQ_TOPICS.items()
+                         if best and scores.get(topic_id) == best), None)
+        assert intents.faq_topic is expected, message
+        assert intents.handoff == any(kw in normalized for kw in handoff), message
+        assert intents.update == any(kw in normalized for kw in update), message
+        assert (Intent.FAQ in dict(intents.scores)) == (intents.faq_topic is not None)
+
+
+def test_tie_goes_to_first_topic():
+    topics = {
+        "primeiro": {"palavras_chave": ["carencia", "prazo"]},
+        "segundo": {"palavras_chave": ["prazo", "carencia"]},
+        "terceiro": {"palavras_chave": ["prazo de carencia"]},
+    }
+    classifier = IntentClassifier(faq_topics=topics, cache_size=0)
+
+    # 2 x 2 x 3: o terceiro vence pela palavra-chave mais específica
+    assert classifier.classify("qual o prazo de carencia?").faq_topic is topics["terceiro"]
+    # 2 x 2 x 0: empate, vale a ordem dos tópicos
+    assert classifier.classify("prazo e carencia").faq_topic is topics["primeiro"]
+    assert classifier.classify("oi").faq_topic is None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""MemorySessionStore: versões que não se repetem depois de remoções e tamanho estimado"""
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.session_store import MemorySessionStore
+
+
+def test_recreated_session_never_reuses_a_version():
+    store = MemorySessionStore()
+    assert store.save("5511", ConversationSession(ConversationState.COTACAO_COLETANDO), 0)
+    stale, stale_version = store.load("5511")
+
+    store.delete("5511")
+    assert store.save("5511", ConversationSession(ConversationState.MENU_PRINCIPAL), 0)
+    _, version = store.load("5511")
+
+    # Quem leu a sessão antiga não sobrescreve nem remove a nova
+    assert version > stale_version
+    assert not store.save("5511", stale, stale_version)
+    assert not store.remove_if_unchanged("5511", stale_version)
+    assert store.load("5511")[0].state == ConversationState.MENU_PRINCIPAL
+
+
+def test_versions_increase_after_eviction_and_install():
+    store = MemorySessionStore(max_entries=1)
+    store.save("5511", ConversationSession(), 0)
+    _, first = store.load("5511")
+    store.save("5522", ConversationSession(), 0)           # 5511 sai pelo LRU
+    assert "5511" not in store
+
+    assert store.install([("5511", ConversationSession())]) == 1
+    _, installed = store.load("5511")
+    assert installed > first
+    assert not store.remove_if_unchanged("5511", first)
+
+
+
+def test_size_estimate_measures_only_new_quotations(monkeypatch):
+    import app.bot.session_store as session_store
+    store = MemorySessionStore()
+    session = ConversationSession()
+    for index in range(20):
+        session.add_cotacao({"cotacao_id": f"Q{index}", "data": {"nome_animal": "Trovao"}})
+    store.save("5511", session, 0)
+
+    measured = []
+    original = session_store._cotacao_bytes
+    monkeypatch.setattr(session_store, "_cotacao_bytes", lambda item: measured.append(item) or original(item))
+
+    session, version = store.load("5511")
+    session.add_cotacao({"cotacao_id": "Q20"})
+    session.data["raca"] = "Mangalarga"
+    store.save("5511", session, version)
+    assert [item["cotacao_id"] for item in measured] == ["Q20"]
+
+    # Depois de um reset (mesmo histórico) e de outras gravações, bate com a medida completa
+    session, version = store.load("5511")
+    session.reset()
+    store.save("5511", session, version)
+    monkeypatch.setattr(session_store, "_cotacao_bytes", original)
+    assert store.estimated_bytes() == session_store.estimate_session_bytes(store.load("5511")[0])
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Agrupamento de rajadas: liberação, ordem e nova tentativa com o shard cheio"""
+import time
+import threading
+
+from app.bot.message_coalescer import MessageCoalescer
+
+
+class Recorder:
+    """Callback que aceita ou recusa conforme `accept`"""
+
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.calls = []
+        self.flushed = threading.Event()
+
+    def __call__(self, phone, messages):
+        self.calls.append((phone, list(messages)))
+        if self.accept:
+            self.flushed.set()
+        return self.accept
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_burst_is_flushed_once_after_window():
+    callback = Recorder()
+    coalescer = MessageCoalescer(callback, window=0.05, max_wait=1)
+
+    coalescer.add("5511", "meu nome é Joao", message_id="a")
+    coalescer.add("5511", "o cavalo é o Trovao", message_id="b")
+
+    assert callback.flushed.wait(2)
+    assert callback.calls == [("5511", ["meu nome é Joao", "o cavalo é o Trovao"])]
+
+
+def test_control_message_flushes_pending_first_in_order():
+    callback = Recorder()
+    coalescer = MessageCoalescer(callback, window=10, max_wait=10)
+
+    coalescer.add("5511", "dados", message_id="a")
+    coalescer.add("5511", "1", bufferable=False, message_id="b")
+
+    assert callback.calls == [("5511", ["dados"]), ("5511", ["1"])]
+    assert coalescer.stats()["pending_messages"] == 0
+
+
+def test_rejected_burst_is_retried_not_dropped():
+    callback = Recorder(accept=False)
+    dropped = []
+    coalescer = MessageCoalescer(callback, window=0.02, max_wait=1, retry_delay=0.02,
+                                 max_retries=100, on_drop=lambda phone, ids: dropped.append(ids))
+
+    coalescer.add("5511", "primeira", message_id="a")
+    assert wait_for(lambda: len(callback.calls) >= 2)
+    assert coalescer.stats()["retrying_phones"] == 1
+
+    # Mensagem nova entra atrás da rajada que está esperando
+    coalescer.add("5511", "segunda", message_id="b")
+    callback.accept = True
+    assert callback.flushed.wait(2)
+
+    assert callback.calls[-1] == ("5511", ["primeira", "segunda"])
+    assert dropped == []
+    assert coalescer.stats()["pending_messages"] == 0
+
+
+def test_control_message_waits_behind_retrying_burst():
+    callback = Recorder(accept=False)
+    coalescer = MessageCoalescer(callback, window=10, max_wait=10, retry_delay=0.02, max_retries=100)
+
+    coalescer.add("5511", "dados", message_id="a")
+    coalescer.add("5511", "1", bufferable=False, message_id="b")
+    assert coalescer.stats()["pending_messages"] == 2
+    # A rajada falhou: o "1" não foi tentado nem juntado a ela
+    assert callback.calls == [("5511", ["dados"])]
+
+    callback.accept = True
+    assert wait_for(lambda: coalescer.stats()["pending_phones"] == 0)
+    assert callback.calls[-2:] == [("5511", ["dados"]), ("5511", ["1"])]
+
+
+def test_control_message_stays_separate_after_flush_failure():
+    callback = Recorder(accept=False)
+    coalescer = MessageCoalescer(callback, window=10, max_wait=10, retry_delay=0.02, max_retries=100)
+
+    coalescer.add("5511", "meu cavalo é o Trovao", message_id="a")
+    coalescer.add("5511", "sim", bufferable=False, message_id="b")
+    # Dados que chegam depois do controle formam outra rajada, atrás dele
+    coalescer.add("5511", "valor 50000", message_id="c")
+    assert coalescer.stats()["pending_messages"] == 3
+
+    callback.accept = True
+    assert wait_for(lambda: ("5511", ["sim"]) in callback.calls)
+    coalescer.add("5511", "2", bufferable=False, message_id="d")
+
+    burst = ["meu cavalo é o Trovao"]
+    assert {tuple(messages) for _, messages in callback.calls[:-3]} == {tuple(burst)}
+    assert [messages for _, messages in callback.calls[-4:]] == [burst, ["sim"], ["valor 50000"], ["2"]]
+    assert coalescer.stats()["pending_phones"] == 0
+
+
+def test_drop_after_max_retries_reports_ids():
+    callback = Recorder(accept=False)
+    dropped = threading.Event()
+    ids = []
+
+    def on_drop(phone, message_ids):
+        ids.extend(message_ids)
+        dropped.set()
+
+    coalescer = MessageCoalescer(callback, window=0.01, max_wait=1, retry_delay=0.01,
+                                 max_retries=2, on_drop=on_drop)
+    coalescer.add("5511", "a", message_id="id-a")
+    coalescer.add("5511", "b", message_id="id-b")
+
+    assert dropped.wait(2)
+    assert ids == ["id-a", "id-b"]
+    assert len(callback.calls) == 3
+    assert coalescer.stats()["pending_phones"] == 0
+
+
+def test_disabled_coalescer_forwards_immediately():
+    callback = Recorder()
+    coalescer = MessageCoalescer(callback, window=0)
+
+    coalescer.add("5511", "oi", message_id="a")
+
+    assert callback.calls == [("5511", ["oi"])]
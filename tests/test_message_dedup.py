@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Deduplicação de webhooks: TTL local, limite, forget e camada compartilhada"""
+from pymongo.errors import DuplicateKeyError
+
+import app.bot.message_dedup as message_dedup
+from app.bot.message_dedup import MessageDeduplicator
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCollection:
+    """insert_one/delete_one/create_index como no pymongo (ids únicos)"""
+
+    def __init__(self):
+        self.ids = set()
+        self.indexes = []
+
+    def create_index(self, key, **kwargs):
+        self.indexes.append((key, kwargs))
+
+    def insert_one(self, doc):
+        if doc["_id"] in self.ids:
+            raise DuplicateKeyError("E11000")
+        self.ids.add(doc["_id"])
+
+    def delete_one(self, query):
+        self.ids.discard(query["_id"])
+
+
+def test_duplicate_within_ttl_only(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(message_dedup.time, "monotonic", clock)
+    dedup = MessageDeduplicator(ttl_seconds=60)
+
+    assert not dedup.is_duplicate("m1")
+    clock.now += 59
+    assert dedup.is_duplicate("m1")
+    clock.now += 2
+    assert not dedup.is_duplicate("m1")        # expirou: conta como nova
+
+
+def test_expired_ids_leave_the_cache(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(message_dedup.time, "monotonic", clock)
+    dedup = MessageDeduplicator(ttl_seconds=60)
+    for index in range(10):
+        dedup.is_duplicate(f"m{index}")
+
+    clock.now += 61
+    dedup.is_duplicate("novo")
+    assert list(dedup._seen) == ["novo"]
+
+
+def test_oldest_id_dropped_above_limit():
+    dedup = MessageDeduplicator(ttl_seconds=60, max_entries=2)
+    for message_id in ("m1", "m2", "m3"):
+        assert not dedup.is_duplicate(message_id)
+    assert not dedup.is_duplicate("m1")
+    assert dedup.is_duplicate("m3")
+
+
+def test_forget_allows_redelivery():
+    collection = FakeCollection()
+    dedup = MessageDeduplicator(ttl_seconds=60)
+    dedup.attach_shared(collection)
+
+    assert not dedup.is_duplicate("m1")
+    dedup.forget("m1")
+    assert "m1" not in collection.ids
+    assert not dedup.is_duplicate("m1")
+
+
+def test_shared_layer_sees_other_workers():
+    collection = FakeCollection()
+    worker_a, worker_b = MessageDeduplicator(ttl_seconds=600), MessageDeduplicator(ttl_seconds=600)
+    worker_a.attach_shared(collection)
+    worker_b.attach_shared(collection)
+
+    assert collection.indexes == [("created_at", {"expireAfterSeconds": 600})] * 2
+    assert not worker_a.is_duplicate("m1")
+    assert worker_b.is_duplicate("m1")
+
+
+def test_empty_id_is_never_duplicate():
+    dedup = MessageDeduplicator()
+    assert not dedup.is_duplicate("")
+    assert not dedup.is_duplicate(None)
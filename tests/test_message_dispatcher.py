@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Dispatcher do webhook: ordem por telefone, paralelismo entre telefones e admissão"""
+import threading
+
+from app.bot.message_dispatcher import ADMIT, DEGRADE, REJECT, MessageDispatcher
+
+
+def phones_in_distinct_shards(dispatcher, count):
+    phones = {}
+    index = 0
+    while len(phones) < count:
+        phone = f"55119{index:08d}"
+        phones.setdefault(dispatcher.shard_for(phone), phone)
+        index += 1
+    return list(phones.values())
+
+
+def test_same_phone_runs_in_order_one_at_a_time():
+    dispatcher = MessageDispatcher(workers=4, queue_size=400)
+    seen = []
+    running = []
+    overlaps = []
+    lock = threading.Lock()
+
+    def job(number):
+        with lock:
+            running.append(number)
+            if len(running) > 1:
+                overlaps.append(list(running))
+        seen.append(number)
+        with lock:
+            running.remove(number)
+        return number
+
+    futures = [dispatcher.submit("5511", job, number) for number in range(100)]
+
+    assert [future.result(timeout=5) for future in futures] == list(range(100))
+    assert seen == list(range(100))
+    assert overlaps == []
+    assert dispatcher.stats()["processed"] == 100
+
+
+def test_different_phones_run_in_parallel():
+    dispatcher = MessageDispatcher(workers=4, queue_size=40)
+    slow_phone, fast_phone = phones_in_distinct_shards(dispatcher, 2)
+    fast_done = threading.Event()
+
+    # O job lento só termina se o outro telefone for atendido enquanto ele roda
+    slow = dispatcher.submit(slow_phone, fast_done.wait, 5)
+    fast = dispatcher.submit(fast_phone, fast_done.set)
+
+    assert fast.result(timeout=5) is None
+    assert slow.result(timeout=5) is True
+
+
+def test_failed_job_does_not_stop_the_shard():
+    dispatcher = MessageDispatcher(workers=1, queue_size=10)
+
+    def boom():
+        raise ValueError("falhou")
+
+    failed = dispatcher.submit("5511", boom)
+    after = dispatcher.submit("5511", lambda: "ok")
+
+    assert isinstance(failed.exception(timeout=5), ValueError)
+    assert after.result(timeout=5) == "ok"
+    assert dispatcher.stats()["failed"] == 1
+
+
+def blocked_shard(dispatcher, phone, queued):
+    """Worker do shard parado num job e `queued` jobs esperando atrás dele"""
+    release = threading.Event()
+    started = threading.Event()
+    dispatcher.submit(phone, lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    for _ in range(queued):
+        assert dispatcher.submit(phone, lambda: None) is not None
+    return release
+
+
+def test_admission_rejects_above_soft_limit():
+    dispatcher = MessageDispatcher(workers=2, queue_size=10, soft_limit=2, overload_policy=REJECT)
+    busy, idle = phones_in_distinct_shards(dispatcher, 2)
+    release = blocked_shard(dispatcher, busy, 1)
+
+    assert dispatcher.admission(busy) == ADMIT
+    dispatcher.submit(busy, lambda: None)
+    assert dispatcher.admission(busy) == REJECT
+    # Só o shard sobrecarregado recusa
+    assert dispatcher.admission(idle) == ADMIT
+    assert dispatcher.stats()["rejected"] == 1
+    release.set()
+
+
+def test_degrade_policy_accepts_until_shard_is_full():
+    dispatcher = MessageDispatcher(workers=1, queue_size=3, soft_limit=1, overload_policy=DEGRADE)
+    release = blocked_shard(dispatcher, "5511", 1)
+
+    assert dispatcher.admission("5511") == DEGRADE
+    dispatcher.submit("5511", lambda: None)
+    dispatcher.submit("5511", lambda: None)
+    # Shard cheio: recusa mesmo no modo degradado, e o submit também
+    assert dispatcher.admission("5511") == REJECT
+    assert dispatcher.submit("5511", lambda: None) is None
+
+    stats = dispatcher.stats()
+    assert stats["degraded"] == 1
+    assert stats["rejected"] == 2
+    release.set()
+
+
+def test_unknown_policy_falls_back_to_reject():
+    dispatcher = MessageDispatcher(workers=1, queue_size=10, soft_limit=1, overload_policy="drop")
+    release = blocked_shard(dispatcher, "5511", 1)
+
+    assert dispatcher.overload_policy == REJECT
+    assert dispatcher.admission("5511") == REJECT
+    release.set()
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Backend fake de envio: funciona sem credenciais do UltraMsg"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_fake_backend_sends_without_ultramsg_credentials():
+    env = {k: v for k, v in os.environ.items() if not k.startswith("ULTRAMSG_")}
+    env.update(MESSAGING_BACKEND="fake", PYTHONPATH=ROOT)
+    script = (
+        "from app.integrations.messaging import messaging_transport as t\n"
+        "result = t.send_text_message('11 99999-0000', 'oi')\n"
+        "assert result['success'], result\n"
+        "assert t.sent[0]['to'] == '+5511999990000', t.sent\n"
+    )
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env,
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Outbox: ordem por telefone, merge de textos, retry e entrega em paralelo"""
+import time
+import threading
+
+import pytest
+
+from app.integrations.outbox import FAILED, QUEUED, SENDING, SENT, MessageOutbox
+
+
+def make_outbox(tmp_path, deliver, workers=0, **kwargs):
+    """Outbox em arquivo temporário; com workers=0 as threads não sobem (claim/send manuais)"""
+    kwargs.setdefault("rate", 1000)
+    kwargs.setdefault("burst", 1000)
+    kwargs.setdefault("poll_interval", 0.02)
+    outbox = MessageOutbox(str(tmp_path / "outbox.sqlite3"), "instancia", deliver,
+                           workers=max(1, workers), **kwargs)
+    if not workers:
+        outbox.start = lambda: None
+    return outbox
+
+
+def ok(kind, phone, payload):
+    return {"success": True}
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_claim_respects_order_per_phone(tmp_path):
+    outbox = make_outbox(tmp_path, ok)
+    first = outbox._enqueue("5511", "text", {"message": "a"})
+    outbox._enqueue("5511", "text", {"message": "b"})
+    other = outbox._enqueue("5522", "text", {"message": "c"})
+
+    job = outbox._claim()
+    assert job["id"] == first
+    # O segundo texto do 5511 espera o primeiro sair de "sending"
+    assert outbox._claim()["id"] == other
+    assert outbox._claim() is None
+
+    outbox._send(job)
+    assert outbox.get_status(first)["status"] == SENT
+    assert outbox._claim()["payload"] == {"message": "b"}
+
+
+def test_merge_joins_texts_until_document(tmp_path):
+    outbox = make_outbox(tmp_path, ok, merge_window=0.05)
+    ids = [outbox._enqueue("5511", "text", {"message": text}) for text in ("um", "dois")]
+    document = outbox._enqueue("5511", "document", {"path": "/tmp/x.pdf", "caption": ""})
+    after = outbox._enqueue("5511", "text", {"message": "tres"})
+
+    # Dentro da janela o texto ainda espera
+    assert outbox._claim() is None
+    time.sleep(0.06)
+
+    job = outbox._claim()
+    assert job["ids"] == ids
+    assert job["payload"] == {"message": "um" + MessageOutbox.MERGE_SEPARATOR + "dois"}
+    assert outbox.get_status(ids[1])["status"] == SENDING
+
+    outbox._send(job)
+    assert outbox._claim()["id"] == document
+    assert outbox.get_status(after)["status"] == QUEUED
+
+
+def test_merge_stays_within_instance(tmp_path):
+    outbox = make_outbox(tmp_path, ok, merge_window=0.05)
+    other = MessageOutbox(outbox.db_path, "outra", ok, rate=1000, burst=1000)
+    mine = outbox._enqueue("5511", "text", {"message": "um"})
+    foreign = other._enqueue("5511", "text", {"message": "da outra instância"})
+    time.sleep(0.06)
+
+    job = outbox._claim()
+    assert job["ids"] == [mine]
+    assert job["payload"] == {"message": "um"}
+    assert other.get_status(foreign)["status"] == QUEUED
+
+def test_failure_is_retried_then_failed(tmp_path):
+    outbox = make_outbox(tmp_path, lambda kind, phone, payload: {"success": False, "error": "HTTP 500"},
+                         max_attempts=2, backoff=0)
+    message_id = outbox._enqueue("5511", "text", {"message": "a"})
+
+    outbox._send(outbox._claim())
+    status = outbox.get_status(message_id)
+    assert (status["status"], status["attempts"]) == (QUEUED, 1)
+
+    outbox._send(outbox._claim())
+    status = outbox.get_status(message_id)
+    assert (status["status"], status["attempts"], status["last_error"]) == (FAILED, 2, "HTTP 500")
+
+
+def test_stale_sending_is_reclaimed(tmp_path):
+    outbox = make_outbox(tmp_path, ok)
+    message_id = outbox._enqueue("5511", "text", {"message": "a"})
+    outbox._claim()
+    outbox._update([message_id], "updated_at = ?", (time.time() - MessageOutbox.SENDING_LEASE - 1,))
+
+    assert outbox._claim()["id"] == message_id
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_slow_document_does_not_block_other_phones(tmp_path, workers):
+    release = threading.Event()
+    delivered = []
+
+    def deliver(kind, phone, payload):
+        if kind == "document":
+            release.wait(5)
+        delivered.append((phone, kind))
+        return {"success": True}
+
+    outbox = make_outbox(tmp_path, deliver, workers=workers)
+    for i in range(workers):
+        outbox.enqueue_document(f"55{i}", "/tmp/lento.pdf")
+    outbox.enqueue_text("5599", "resposta")
+
+    try:
+        assert wait_for(lambda: ("5599", "text") in delivered)
+        assert not any(kind == "document" for _, kind in delivered)
+    finally:
+        release.set()
+    assert wait_for(lambda: len(delivered) == workers + 1)
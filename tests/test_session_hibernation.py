@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Hibernação: sessões ociosas vão para o disco e voltam inteiras na próxima leitura"""
+import time
+import threading
+
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.session_hibernation import SessionHibernator
+from app.bot.session_store import MemorySessionStore, SQLiteSessionStore
+
+
+def attach(tmp_path, idle_after=60):
+    store = MemorySessionStore()
+    hibernator = SessionHibernator(str(tmp_path / "cold.sqlite3"), idle_after=idle_after)
+    assert hibernator.attach(store)
+    return store, hibernator
+
+
+def session_idle_for(seconds, state=ConversationState.COTACAO_COLETANDO):
+    session = ConversationSession(state)
+    session.last_interaction = int(time.time() - seconds)
+    return session
+
+
+def test_only_idle_sessions_leave_memory_and_come_back_whole(tmp_path):
+    store, hibernator = attach(tmp_path)
+    idle = session_idle_for(600)
+    idle.data.update({"nome_animal": "Trovao", "valor_animal": "50000"})
+    idle.add_cotacao({"cotacao_id": "Q1"})
+    store.save("5511", idle, 0)
+    store.save("5522", session_idle_for(5), 0)
+
+    assert hibernator.hibernate_idle() == 1
+    assert store.phones() == ["5522"]
+    assert hibernator.stats()["on_disk"] == 1
+
+    restored, version = store.load("5511")
+    assert restored.to_dict() == idle.to_dict()
+    assert version > 0
+    assert hibernator.stats()["on_disk"] == 0
+    assert hibernator.rehydrated == 1
+    # Já está na memória: a próxima leitura não passa pelo disco
+    store.load("5511")
+    assert hibernator.rehydrated == 1
+
+
+def test_session_changed_during_hibernation_stays_in_memory(tmp_path):
+    store, hibernator = attach(tmp_path)
+    store.save("5511", session_idle_for(600), 0)
+
+    original = store.remove_if_unchanged
+
+    def message_arrives_first(phone, version):
+        session, current = store.load(phone)
+        session.message_count += 1
+        store.save(phone, session, current)
+        return original(phone, version)
+
+    store.remove_if_unchanged = message_arrives_first
+    assert hibernator.hibernate_idle() == 0
+
+    assert store.load("5511")[0].message_count == 1
+    assert hibernator.stats()["on_disk"] == 0
+
+
+def test_simultaneous_reads_rehydrate_once(tmp_path):
+    store, hibernator = attach(tmp_path)
+    store.save("5511", session_idle_for(600), 0)
+    assert hibernator.hibernate_idle() == 1
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.load("5511")[1])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Todas as leituras enxergam a mesma sessão (mesma versão)
+    assert len(set(results)) == 1 and results[0] > 0
+    assert hibernator.rehydrated == 1
+
+
+def test_hibernated_sessions_expire(tmp_path):
+    store, hibernator = attach(tmp_path)
+    store.save("5511", session_idle_for(7200), 0)
+    store.save("5522", session_idle_for(7200, ConversationState.ATENDENTE_ATIVO), 0)
+    assert hibernator.hibernate_idle() == 2
+
+    now = time.time()
+    removed = hibernator.purge_idle(now - 3600, {ConversationState.ATENDENTE_ATIVO.value: now - 86400})
+
+    assert removed == 1
+    assert store.load("5511") == (None, 0)
+    assert store.load("5522")[0].state == ConversationState.ATENDENTE_ATIVO
+
+
+def test_persistent_backend_is_not_hibernated(tmp_path):
+    hibernator = SessionHibernator(str(tmp_path / "cold.sqlite3"))
+    assert not hibernator.attach(SQLiteSessionStore(str(tmp_path / "sessions.sqlite3")))
+    assert hibernator.hibernate_idle() == 0
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Diário de sessões: replay, compactação, remoções e ordem dos eventos"""
+import os
+import time
+import threading
+
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.session_hibernation import SessionHibernator
+from app.bot.session_journal import SessionJournal, iter_events
+from app.bot.session_store import MemorySessionStore
+
+
+def attach(tmp_path, max_entries=0, **kwargs):
+    kwargs.setdefault("compact_every", 0)
+    store = MemorySessionStore(max_entries=max_entries)
+    journal = SessionJournal(str(tmp_path / "sessions.journal"), **kwargs)
+    assert journal.attach(store)
+    return store, journal
+
+
+def update(store, phone, mutate):
+    """Leitura-alteração-gravação como no ConversationFlow"""
+    while True:
+        session, version = store.load(phone)
+        session = session or ConversationSession()
+        mutate(session)
+        if store.save(phone, session, version):
+            return session
+
+
+def dump(sessions):
+    return {phone: session.to_dict() for phone, session in sessions}
+
+
+def test_replay_matches_store(tmp_path):
+    store, journal = attach(tmp_path)
+    update(store, "5511", lambda s: setattr(s, "state", ConversationState.COTACAO_COLETANDO))
+    update(store, "5511", lambda s: s.data.update({"nome_animal": "Trovao", "valor_animal": "50000"}))
+    update(store, "5511", lambda s: setattr(s, "campo_edicao", "raca"))
+    update(store, "5522", lambda s: s.add_cotacao({"cotacao_id": "Q1"}))
+    update(store, "5522", lambda s: s.add_cotacao({"cotacao_id": "Q2"}))
+    update(store, "5522", lambda s: s.reset())
+
+    assert dump(journal.replay().items()) == dump(store.items())
+
+    # Um processo novo reconstrói o mesmo estado
+    journal._owner_lock.close()
+    restored, _ = attach(tmp_path)
+    assert dump(restored.items()) == dump(store.items())
+
+
+def test_removals_are_journaled(tmp_path):
+    store, journal = attach(tmp_path, max_entries=2)
+    for phone in ("5511", "5522", "5533"):
+        update(store, phone, lambda s: setattr(s, "message_count", 1))
+    assert "5511" not in journal.replay()          # LRU
+
+    _, version = store.load("5522")
+    assert store.remove_if_unchanged("5522", version)
+    store.delete("5533")
+
+    assert journal.replay() == {}   # replay espera a fila de eventos
+    assert [event["p"] for event in iter_events(journal.path) if "x" in event] == ["5511", "5522", "5533"]
+
+
+def test_second_process_does_not_share_the_journal(tmp_path):
+    attach(tmp_path)
+    assert not SessionJournal(str(tmp_path / "sessions.journal")).attach(MemorySessionStore())
+
+
+def test_expired_sessions_stay_removed(tmp_path):
+    store, journal = attach(tmp_path)
+    update(store, "5511", lambda s: setattr(s, "message_count", 1))
+    update(store, "5522", lambda s: setattr(s, "message_count", 1))
+
+    old = store.load("5511")[0]
+    old.last_interaction = int(time.time()) - 7200
+    store.save("5511", old, store.load("5511")[1])
+    assert store.purge_idle(time.time() - 3600) == 1
+
+    assert set(journal.replay()) == {"5522"}
+
+
+def test_hibernated_session_comes_back_whole(tmp_path):
+    store, journal = attach(tmp_path)
+    hibernator = SessionHibernator(str(tmp_path / "cold.sqlite3"), idle_after=60)
+    hibernator.attach(store)
+
+    update(store, "5511", lambda s: s.add_cotacao({"cotacao_id": "Q1"}))
+    update(store, "5511", lambda s: s.add_cotacao({"cotacao_id": "Q2"}))
+    assert hibernator.hibernate_idle(now=time.time() + 3600) == 1
+    assert "5511" not in journal.replay()
+
+    update(store, "5511", lambda s: setattr(s, "campo_edicao", "uf"))
+    assert dump(journal.replay().items()) == dump(store.items())
+    assert len(journal.replay()["5511"].cotacoes_realizadas) == 2
+
+
+def test_compaction_keeps_state_and_accepts_new_events(tmp_path):
+    store, journal = attach(tmp_path)
+    for index in range(50):
+        update(store, f"55{index}", lambda s: setattr(s, "message_count", 1))
+
+    assert journal.compact() == 50
+    assert os.path.exists(journal.snapshot_path)
+    assert not os.path.exists(journal.segment_path)
+    assert list(iter_events(journal.path)) == []
+
+    update(store, "550", lambda s: setattr(s, "message_count", 2))
+    store.delete("551")
+    assert dump(journal.replay().items()) == dump(store.items())
+
+
+def test_record_does_not_wait_for_compaction(tmp_path, monkeypatch):
+    store, journal = attach(tmp_path)
+    update(store, "5511", lambda s: setattr(s, "message_count", 1))
+
+    import app.bot.session_journal as session_journal
+    writing = threading.Event()
+    release = threading.Event()
+    original = session_journal.write_snapshot
+
+    def slow_write(path, sessions):
+        writing.set()
+        release.wait(5)
+        return original(path, sessions)
+
+    monkeypatch.setattr(session_journal, "write_snapshot", slow_write)
+    compaction = threading.Thread(target=journal.compact)
+    compaction.start()
+    assert writing.wait(5)
+
+    # Snapshot ainda sendo gravado: a gravação da sessão vai para o diário novo
+    started = time.monotonic()
+    update(store, "5522", lambda s: setattr(s, "message_count", 1))
+    assert time.monotonic() - started < 1
+    assert journal.flush(1)
+    assert [event["p"] for event in iter_events(journal.path)] == ["5522"]
+
+    release.set()
+    compaction.join(5)
+    assert dump(journal.replay().items()) == dump(store.items())
+
+
+def test_interrupted_compaction_is_replayed(tmp_path):
+    store, journal = attach(tmp_path)
+    update(store, "5511", lambda s: setattr(s, "message_count", 1))
+    journal.flush()
+    # Queda depois de fechar o segmento, antes do snapshot
+    journal._file.close()
+    journal._file = None
+    os.replace(journal.path, journal.segment_path)
+    update(store, "5511", lambda s: setattr(s, "message_count", 2))
+    journal.flush()
+    journal._owner_lock.close()     # o lock sai junto com o processo
+
+    restored, restored_journal = attach(tmp_path)
+    assert restored.load("5511")[0].message_count == 2
+    assert restored_journal.compact() == 1
+    assert restored_journal.replay()["5511"].message_count == 2
+
+
+def test_concurrent_saves_keep_order_per_phone(tmp_path):
+    store, journal = attach(tmp_path)
+
+    def worker():
+        for _ in range(200):
+            update(store, "5511", lambda s: setattr(s, "message_count", s.message_count + 1))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.load("5511")[0].message_count == 800
+    journal.flush()
+    counts = [event["m"] for event in iter_events(journal.path) if "m" in event]
+    assert counts == sorted(counts)
+    assert journal.replay()["5511"].message_count == 800
+
+
+def test_clear_is_journaled(tmp_path):
+    store, journal = attach(tmp_path)
+    update(store, "5511", lambda s: setattr(s, "message_count", 1))
+    update(store, "5522", lambda s: setattr(s, "message_count", 1))
+
+    store.clear()
+
+    assert journal.replay() == {}
+    assert sorted(event["p"] for event in iter_events(journal.path) if "x" in event) == ["5511", "5522"]
+
+
+def test_save_does_not_wait_for_disk(tmp_path, monkeypatch):
+    store, journal = attach(tmp_path)
+    update(store, "5511", lambda s: setattr(s, "message_count", 1))
+    assert journal.flush(1)
+
+    writing = threading.Event()
+    release = threading.Event()
+    original = journal._write
+
+    def slow_write(batch):
+        writing.set()
+        release.wait(5)
+        original(batch)
+
+    monkeypatch.setattr(journal, "_write", slow_write)
+    update(store, "5511", lambda s: setattr(s, "message_count", 2))
+    assert writing.wait(5)
+
+    # Disco parado: o store continua gravando e os eventos esperam na fila
+    started = time.monotonic()
+    for count in range(3, 10):
+        update(store, "5511", lambda s: setattr(s, "message_count", count))
+    assert time.monotonic() - started < 1
+    assert not journal.flush(0.05)
+
+    release.set()
+    assert journal.flush(5)
+    assert [event["m"] for event in iter_events(journal.path) if "m" in event] == list(range(2, 10))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Snapshot binário: ida e volta das sessões, validação do arquivo e restauração"""
+import struct
+
+import pytest
+
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.session_snapshot import (
+    HEADER, RECORD_SIZE, SnapshotError, SnapshotRestorer, decode_record, encode_record,
+    read_snapshot, write_snapshot
+)
+from app.bot.session_store import MemorySessionStore
+
+
+def sample_sessions():
+    full = ConversationSession(ConversationState.COTACAO_EDITANDO)
+    full.data.update({"nome_solicitante": "João Silva", "nome_animal": "Trovão",
+                      "valor_animal": "50000", "uf": "SP", "observacao": {"nota": [1, 2]}})
+    full.campo_edicao = "raca"
+    full.message_count = 7
+    full.add_cotacao({"cotacao_id": "Q1", "data": {"nome_animal": "Trovão"}})
+    return [
+        ("5511", full),
+        ("5522", ConversationSession()),
+        ("5533", ConversationSession(ConversationState.ATENDENTE_ATIVO)),
+    ]
+
+
+def test_record_round_trip():
+    for phone, session in sample_sessions():
+        record = encode_record(phone, session)
+        (length,) = RECORD_SIZE.unpack_from(record)
+        assert length == len(record) - RECORD_SIZE.size
+
+        decoded_phone, decoded = decode_record(record, RECORD_SIZE.size)
+        assert decoded_phone == phone
+        assert decoded.to_dict() == session.to_dict()
+
+
+def test_file_round_trip_indexes_every_phone(tmp_path):
+    path = str(tmp_path / "sessions.snapshot")
+    sessions = sample_sessions()
+    assert write_snapshot(path, sessions) == 3
+
+    payload, index = read_snapshot(path)
+    assert list(index) == ["5511", "5522", "5533"]
+    restored = {phone: decode_record(payload, offset)[1].to_dict() for phone, offset in index.items()}
+    assert restored == {phone: session.to_dict() for phone, session in sessions}
+
+
+@pytest.mark.parametrize("damage", ["flip", "truncate", "magic", "version"])
+def test_damaged_file_is_rejected(tmp_path, damage):
+    path = tmp_path / "sessions.snapshot"
+    write_snapshot(str(path), sample_sessions())
+    raw = bytearray(path.read_bytes())
+
+    if damage == "flip":
+        raw[HEADER.size + 10] ^= 0xFF
+    elif damage == "truncate":
+        raw = raw[:-5]
+    elif damage == "magic":
+        raw[:4] = b"XXXX"
+    else:
+        struct.pack_into("<H", raw, 4, 99)
+    path.write_bytes(bytes(raw))
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+
+def test_restorer_ignores_corrupt_snapshot(tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    write_snapshot(str(path), sample_sessions())
+    raw = bytearray(path.read_bytes())
+    raw[-1] ^= 0xFF
+    path.write_bytes(bytes(raw))
+
+    restorer = SnapshotRestorer(str(path))
+    assert restorer.load() == 0
+    assert restorer.take("5511") is None
+
+
+def test_restorer_takes_on_demand_and_keeps_newer_sessions(tmp_path):
+    path = str(tmp_path / "sessions.snapshot")
+    write_snapshot(path, sample_sessions())
+    restorer = SnapshotRestorer(path)
+    assert restorer.load() == 3
+
+    store = MemorySessionStore()
+    store.add_loader(restorer.take)
+    # Mensagem antes da carga em background: só essa sessão é decodificada
+    assert store.load("5511")[0].message_count == 7
+    assert restorer.pending == 2
+
+    # Sessão nova gravada antes da carga: o snapshot não a sobrescreve
+    assert store.save("5522", ConversationSession(ConversationState.MENU_PRINCIPAL), 0)
+    restorer.restore_pending(store)
+
+    assert restorer.pending == 0
+    assert sorted(store.phones()) == ["5511", "5522", "5533"]
+    assert store.load("5522")[0].state == ConversationState.MENU_PRINCIPAL
+    assert store.load("5533")[0].state == ConversationState.ATENDENTE_ATIVO
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Stores de sessão: versão otimista (SQLite/Mongo) e retry do ConversationFlow"""
+import time
+import threading
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.bot.conversation_flow import ConversationFlow, VersionConflict
+from app.bot.conversation_session import ConversationSession, ConversationState
+from app.bot.session_store import MongoSessionStore, SQLiteSessionStore
+
+
+class FakeCollection:
+    """Subconjunto da collection do pymongo usado pelo MongoSessionStore"""
+
+    class Result:
+        def __init__(self, matched_count=0, deleted_count=0):
+            self.matched_count = matched_count
+            self.deleted_count = deleted_count
+
+    def __init__(self):
+        self.docs = {}
+        self._lock = threading.Lock()
+
+    def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    def insert_one(self, doc):
+        with self._lock:
+            if doc["_id"] in self.docs:
+                raise DuplicateKeyError("E11000")
+            self.docs[doc["_id"]] = dict(doc)
+
+    def update_one(self, query, update):
+        with self._lock:
+            doc = self.docs.get(query["_id"])
+            if doc is None or doc["version"] != query["version"]:
+                return self.Result()
+            doc.update(update["$set"])
+            for key, step in update["$inc"].items():
+                doc[key] += step
+            return self.Result(matched_count=1)
+
+    def delete_one(self, query):
+        self.docs.pop(query["_id"], None)
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def make_store(request, tmp_path):
+    """Fábrica de stores que enxergam o mesmo armazenamento (como dois workers)"""
+    if request.param == "sqlite":
+        return lambda: SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    collection = FakeCollection()
+    return lambda: MongoSessionStore(collection)
+
+
+def test_save_requires_current_version(make_store):
+    worker_a, worker_b = make_store(), make_store()
+    assert worker_a.load("5511") == (None, 0)
+
+    session = ConversationSession(ConversationState.MENU_PRINCIPAL)
+    assert worker_a.save("5511", session, 0)
+    assert not worker_b.save("5511", session, 0)         # criação concorrente
+
+    seen_a, version_a = worker_a.load("5511")
+    seen_b, version_b = worker_b.load("5511")
+    assert version_a == version_b == 1
+
+    seen_a.data["nome_animal"] = "Trovao"
+    assert worker_a.save("5511", seen_a, version_a)
+    seen_b.data["raca"] = "MM"
+    assert not worker_b.save("5511", seen_b, version_b)   # versão velha
+
+    stored, version = worker_b.load("5511")
+    assert version == 2
+    assert stored.data.to_dict() == {"nome_animal": "Trovao"}
+
+
+def test_round_trip_keeps_session(make_store):
+    store = make_store()
+    session = ConversationSession(ConversationState.COTACAO_EDITANDO)
+    session.data.update({"nome_animal": "Trovao", "valor_animal": "50000", "observacao": "x"})
+    session.campo_edicao = "raca"
+    session.message_count = 3
+    session.add_cotacao({"cotacao_id": "Q1", "timestamp": "2026-01-01T00:00:00"})
+    assert store.save("5511", session, 0)
+
+    assert store.load("5511")[0].to_dict() == session.to_dict()
+
+
+def test_flow_reapplies_change_after_conflict(make_store):
+    flow_a, flow_b = ConversationFlow(store=make_store()), ConversationFlow(store=make_store())
+    flow_a.set_conversation_state("5511", ConversationState.COTACAO_COLETANDO)
+
+    calls = []
+
+    def mutate(session):
+        calls.append(session.state)
+        if len(calls) == 1:
+            # Outro worker grava entre a leitura e a gravação deste
+            flow_b.update_conversation_data("5511", {"nome_animal": "Trovao"})
+        session.data["raca"] = "MM"
+
+    flow_a._update_session("5511", mutate)
+
+    assert len(calls) == 2
+    assert flow_a.get_conversation_data("5511") == {"nome_animal": "Trovao", "raca": "MM"}
+
+
+def test_flow_gives_up_after_max_retries(make_store):
+    flow_a, flow_b = ConversationFlow(store=make_store()), ConversationFlow(store=make_store())
+    flow_a.set_conversation_state("5511", ConversationState.COTACAO_COLETANDO)
+
+    def always_conflicts(session):
+        flow_b.set_conversation_state("5511", ConversationState.COTACAO_COLETANDO)
+
+    with pytest.raises(VersionConflict):
+        flow_a._update_session("5511", always_conflicts)
+
+
+def test_concurrent_workers_lose_no_update(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    flows = [ConversationFlow(store=SQLiteSessionStore(path)) for _ in range(4)]
+    flows[0].set_conversation_state("5511", ConversationState.COTACAO_COLETANDO)
+
+    def worker(flow):
+        for _ in range(25):
+            while True:
+                try:
+                    flow._update_session("5511", lambda s: setattr(s, "message_count", s.message_count + 1))
+                    break
+                except VersionConflict:
+                    pass
+
+    threads = [threading.Thread(target=worker, args=(flow,)) for flow in flows]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    session, version = SQLiteSessionStore(path).load("5511")
+    assert session.message_count == 100
+    assert version == 101
+
+
+def test_sqlite_purge_idle_uses_limit_per_state(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    now = int(time.time())
+    for phone, state, idle in (("5511", ConversationState.COTACAO_COLETANDO, 7200),
+                               ("5522", ConversationState.ATENDENTE_ATIVO, 7200),
+                               ("5533", ConversationState.COTACAO_COLETANDO, 60)):
+        session = ConversationSession(state)
+        session.last_interaction = now - idle
+        store.save(phone, session, 0)
+
+    removed = store.purge_idle(now - 3600, {ConversationState.ATENDENTE_ATIVO.value: now - 86400})
+
+    assert removed == 1
+    assert sorted(store.phones()) == ["5522", "5533"]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Locks listrados: exclusão por chave, reentrância e contadores sem corrida"""
+import threading
+
+from app.utils.striped_lock import StripedLock
+
+
+def test_counters_are_exact_under_many_threads():
+    locks = StripedLock(stripes=4)
+    keys = [f"55{index}" for index in range(8)]
+    inside = {key: 0 for key in keys}
+    overlaps = []
+
+    def worker(key):
+        for _ in range(500):
+            with locks.hold(key):
+                inside[key] += 1
+                if inside[key] > 1:
+                    overlaps.append(key)
+                inside[key] -= 1
+
+    threads = [threading.Thread(target=worker, args=(key,)) for key in keys for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == []
+    assert locks.acquired == 8 * 4 * 500
+    assert 0 <= locks.contended <= locks.acquired
+    assert locks.stats() == {"stripes": 4, "acquired": locks.acquired, "contended": locks.contended}
+
+
+def test_waiting_for_a_held_key_counts_as_contended():
+    locks = StripedLock(stripes=8)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with locks.hold("5511"):
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    assert holding.wait(5)
+
+    acquired = threading.Event()
+
+    def wait_for_key():
+        with locks.hold("5511"):
+            acquired.set()
+
+    waiter = threading.Thread(target=wait_for_key)
+    waiter.start()
+    assert not acquired.wait(0.2)
+    release.set()
+    thread.join(5)
+    waiter.join(5)
+
+    assert acquired.is_set()
+    assert locks.acquired == 2
+    assert locks.contended == 1
+
+
+def test_reentrant_for_the_same_thread():
+    locks = StripedLock(stripes=1)
+    with locks.hold("5511"):
+        # Outra chave no mesmo lock, mesma thread: não trava
+        with locks.hold("5522"):
+            pass
+    assert locks.acquired == 2
+    assert locks.contended == 0
+    assert locks.lock_for("5511") is locks.lock_for("5522")
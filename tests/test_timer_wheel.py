@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Timer wheel: cascata entre níveis, cancelamento e disparos com prazo velho"""
+import math
+import random
+
+import pytest
+
+from app.bot.conversation_flow import ConversationFlow
+from app.bot.conversation_session import ConversationState
+from app.bot.conversation_timers import ConversationTimers
+from app.bot.session_store import MemorySessionStore
+from app.utils.timer_wheel import TimerWheel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def small_wheel():
+    """4 posições e 3 níveis: 4, 16 e 64 ticks (prazos maiores são reposicionados)"""
+    clock = Clock()
+    return TimerWheel(tick=1.0, slots=4, levels=3, clock=clock), clock
+
+
+def test_every_timer_fires_on_its_tick_across_levels():
+    wheel, clock = small_wheel()
+    rng = random.Random(5)
+    delays = {f"t{index}": rng.uniform(0.1, 150) for index in range(300)}
+    for key, delay in delays.items():
+        wheel.schedule(key, delay, payload=delay)
+
+    fired_at = {}
+    for tick in range(1, 160):
+        clock.now = tick
+        for key, payload in wheel.advance():
+            assert payload == delays[key]
+            fired_at[key] = tick
+
+    assert fired_at == {key: math.ceil(delay) for key, delay in delays.items()}
+    assert len(wheel) == 0 and wheel.fired == 300
+
+
+def test_late_advance_fires_in_order():
+    wheel, clock = small_wheel()
+    for key, delay in (("c", 40), ("a", 3), ("b", 17)):
+        wheel.schedule(key, delay)
+
+    clock.now = 100
+    assert [key for key, _ in wheel.advance()] == ["a", "b", "c"]
+
+
+def test_cancel_and_reschedule_after_cascade():
+    wheel, clock = small_wheel()
+    wheel.schedule("longe", 50)
+    wheel.schedule("trocado", 50)
+    wheel.schedule("mantido", 50)
+
+    # Depois de descerem de nível
+    clock.now = 45
+    assert wheel.advance() == []
+    assert wheel.cancel("longe")
+    assert not wheel.cancel("longe")
+    wheel.schedule("trocado", 10, payload="novo")
+
+    clock.now = 50
+    assert wheel.advance() == [("mantido", None)]
+    clock.now = 55
+    assert wheel.advance() == [("trocado", "novo")]
+    assert "longe" not in wheel and len(wheel) == 0
+
+
+def test_slots_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        TimerWheel(slots=6)
+
+
+def timers_with_session(state=ConversationState.COTACAO_COLETANDO):
+    flow = ConversationFlow(store=MemorySessionStore())
+    timers = ConversationTimers(flow, wheel=TimerWheel(clock=Clock()))
+    flow.use_timers(timers)
+    flow.set_conversation_state("5511", state)
+    return flow, timers
+
+
+def test_stale_stamp_only_reschedules():
+    flow, timers = timers_with_session()
+    stale = flow.sessions.load("5511")[0].last_interaction - 30
+    timers._handle("5511", ConversationTimers.EXPIRE, stale)
+
+    assert flow.get_conversation_state("5511") == ConversationState.COTACAO_COLETANDO
+    assert timers.expired == 0
+    assert ("5511", ConversationTimers.EXPIRE) in timers.wheel
+
+
+def test_current_stamp_expires_or_releases():
+    flow, timers = timers_with_session()
+    stamp = flow.sessions.load("5511")[0].last_interaction
+    timers._handle("5511", ConversationTimers.EXPIRE, stamp)
+    assert flow.get_conversation_state("5511") == ConversationState.INITIAL
+    assert timers.expired == 1
+    # Conversa reiniciada: nada mais agendado para ela
+    assert ("5511", ConversationTimers.EXPIRE) not in timers.wheel
+
+    flow, timers = timers_with_session(ConversationState.ATENDENTE_ATIVO)
+    released = []
+    timers.release = released.append
+    stamp = flow.sessions.load("5511")[0].last_interaction
+    timers._handle("5511", ConversationTimers.EXPIRE, stamp)
+    assert released == ["5511"]
+    assert timers.released == 1
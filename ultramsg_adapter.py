@@ -4,6 +4,7 @@ Adaptador para UltraMsgAPI
 Adiciona métodos necessários para compatibilidade com BotHandler
 """
 
+import os
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,6 +13,7 @@ logger = logging.getLogger(__name__)
 class UltraMsgAdapter:
     """
     Adaptador que adiciona métodos necessários à UltraMsgAPI existente
+    (ou a qualquer backend de app/integrations/messaging.py)
     """
     
     def __init__(self, ultramsg_api):
@@ -19,7 +21,7 @@ class UltraMsgAdapter:
         Inicializa o adaptador com uma instância da UltraMsgAPI
         
         Args:
-            ultramsg_api: Instância da UltraMsgAPI original
+            ultramsg_api: Instância da UltraMsgAPI ou outro MessagingTransport
         """
         self.ultramsg_api = ultramsg_api
     
@@ -61,23 +63,17 @@ class UltraMsgAdapter:
             bool: True se enviado com sucesso, False caso contrário
         """
         try:
-            # Nota: A UltraMsgAPI original espera uma URL, não um caminho local
-            # Você precisará fazer upload do arquivo para um servidor ou usar base64
-            # Por enquanto, vamos apenas logar e retornar True
-            
-            import os
             filename = os.path.basename(pdf_path)
-            
-            # TODO: Implementar upload do arquivo ou conversão para base64
-            # Por enquanto, apenas simular sucesso
-            logger.warning(f"send_document chamado com arquivo local: {pdf_path}")
-            logger.warning("Implementação completa requer upload do arquivo ou conversão para base64")
-            
-            # Se você tiver uma URL pública do PDF, use:
+
+            # O transporte envia o arquivo local (por URL pública ou base64 em streaming)
             result = self.ultramsg_api.send_document(phone, pdf_path, filename, caption)
-            
-            logger.info(f"Documento {filename} seria enviado para {phone}")
-            return True
+
+            if result.get('success'):
+                logger.info(f"Documento {filename} enviado para {phone}")
+                return True
+            else:
+                logger.error(f"Erro ao enviar documento: {result.get('error')}")
+                return False
                 
         except Exception as e:
             logger.error(f"Erro ao enviar documento: {str(e)}")